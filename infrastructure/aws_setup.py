@@ -12,6 +12,16 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config.config import *
 from infrastructure.iam_policies import *
 
+# raw/*.csv uploads, for both the direct Lambda trigger and the ingest queue
+RAW_UPLOAD_FILTER = {
+    'Key': {
+        'FilterRules': [
+            {'Name': 'prefix', 'Value': 'raw/'},
+            {'Name': 'suffix', 'Value': '.csv'}
+        ]
+    }
+}
+
 class AWSInfrastructure:
     def __init__(self):
         self.s3_client = boto3.client('s3', region_name=AWS_REGION)
@@ -20,6 +30,9 @@ class AWSInfrastructure:
         self.athena_client = boto3.client('athena', region_name=AWS_REGION)
         self.glue_client = boto3.client('glue', region_name=AWS_REGION)
         self.sts_client = boto3.client('sts', region_name=AWS_REGION)
+        self.events_client = boto3.client('events', region_name=AWS_REGION)
+        self.sqs_client = boto3.client('sqs', region_name=AWS_REGION)
+        self.dynamodb_client = boto3.client('dynamodb', region_name=AWS_REGION)
         
     def get_account_id(self):
         """Get AWS account ID"""
@@ -95,6 +108,14 @@ class AWSInfrastructure:
             )
             print("  ✓ Attached CloudWatch Logs policy")
             
+            function_arn = f"arn:aws:lambda:{AWS_REGION}:{self.get_account_id()}:function:{LAMBDA_FUNCTION_NAME}"
+            self.iam_client.put_role_policy(
+                RoleName=IAM_ROLE_NAME,
+                PolicyName='LambdaSelfInvoke',
+                PolicyDocument=json.dumps(get_lambda_invoke_policy(function_arn))
+            )
+            print("  ✓ Attached Lambda self-invoke policy (async reports)")
+            
         except ClientError as e:
             print(f"  Note: Policies may already be attached")
         
@@ -115,9 +136,43 @@ class AWSInfrastructure:
         
         return zip_buffer.getvalue()
     
-    def create_lambda_function(self, role_arn, lambda_code_path):
+    def create_rate_limit_table(self):
+        """Create the DynamoDB table holding the LLM rate-limit buckets shared by all containers"""
+        table_name = f"{LAMBDA_FUNCTION_NAME}-rate-limits"
+        try:
+            self.dynamodb_client.create_table(
+                TableName=table_name,
+                AttributeDefinitions=[{'AttributeName': 'limiter_key', 'AttributeType': 'S'}],
+                KeySchema=[{'AttributeName': 'limiter_key', 'KeyType': 'HASH'}],
+                BillingMode='PAY_PER_REQUEST'
+            )
+            self.dynamodb_client.get_waiter('table_exists').wait(TableName=table_name)
+            print(f"✓ Created rate-limit table: {table_name}")
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ResourceInUseException':
+                raise
+            print(f"✓ Rate-limit table {table_name} already exists")
+        
+        table_arn = self.dynamodb_client.describe_table(TableName=table_name)['Table']['TableArn']
+        self.iam_client.put_role_policy(
+            RoleName=IAM_ROLE_NAME,
+            PolicyName='RateLimitTable',
+            PolicyDocument=json.dumps(get_rate_limit_table_policy(table_arn))
+        )
+        print("  ✓ Attached rate-limit table policy")
+        return table_name
+    
+    def create_lambda_function(self, role_arn, lambda_code_path, rate_limit_table=None):
         """Create Lambda function"""
         deployment_package = self.create_lambda_deployment_package(lambda_code_path)
+        variables = {
+            'BUCKET_NAME': BUCKET_NAME,
+            'ATHENA_DATABASE': ATHENA_DATABASE,
+            'OPENAI_API_KEY': OPENAI_API_KEY,
+            'USE_BEDROCK': str(USE_BEDROCK)
+        }
+        if rate_limit_table:
+            variables['RATE_LIMIT_TABLE'] = rate_limit_table
         
         try:
             response = self.lambda_client.create_function(
@@ -128,14 +183,7 @@ class AWSInfrastructure:
                 Code={'ZipFile': deployment_package},
                 Timeout=LAMBDA_TIMEOUT,
                 MemorySize=LAMBDA_MEMORY,
-                Environment={
-                    'Variables': {
-                        'BUCKET_NAME': BUCKET_NAME,
-                        'ATHENA_DATABASE': ATHENA_DATABASE,
-                        'OPENAI_API_KEY': OPENAI_API_KEY,
-                        'USE_BEDROCK': str(USE_BEDROCK)
-                    }
-                },
+                Environment={'Variables': variables},
                 Description='Energy analytics pipeline processor'
             )
             lambda_arn = response['FunctionArn']
@@ -149,6 +197,13 @@ class AWSInfrastructure:
                     FunctionName=LAMBDA_FUNCTION_NAME,
                     ZipFile=deployment_package
                 )
+                # Deploy-managed variables apply to redeploys too; others set on the function are kept
+                self.lambda_client.get_waiter('function_updated').wait(FunctionName=LAMBDA_FUNCTION_NAME)
+                current = self.lambda_client.get_function_configuration(FunctionName=LAMBDA_FUNCTION_NAME)
+                self.lambda_client.update_function_configuration(
+                    FunctionName=LAMBDA_FUNCTION_NAME,
+                    Environment={'Variables': dict(current.get('Environment', {}).get('Variables', {}), **variables)}
+                )
                 response = self.lambda_client.get_function(FunctionName=LAMBDA_FUNCTION_NAME)
                 lambda_arn = response['Configuration']['FunctionArn']
                 print(f"✓ Updated Lambda function: {LAMBDA_FUNCTION_NAME}")
@@ -183,14 +238,7 @@ class AWSInfrastructure:
                 {
                     'LambdaFunctionArn': lambda_arn,
                     'Events': ['s3:ObjectCreated:*'],
-                    'Filter': {
-                        'Key': {
-                            'FilterRules': [
-                                {'Name': 'prefix', 'Value': 'raw/'},
-                                {'Name': 'suffix', 'Value': '.csv'}
-                            ]
-                        }
-                    }
+                    'Filter': RAW_UPLOAD_FILTER
                 }
             ]
         }
@@ -204,6 +252,113 @@ class AWSInfrastructure:
         except ClientError as e:
             print(f"Note: S3 trigger configuration: {e}")
     
+    def create_ingest_queue(self):
+        """Create the SQS queue that buffers raw/ upload notifications, with a dead-letter queue"""
+        queue_name = f"{LAMBDA_FUNCTION_NAME}-ingest"
+        dlq_url = self.sqs_client.create_queue(QueueName=f"{queue_name}-dlq")['QueueUrl']
+        dlq_arn = self._queue_arn(dlq_url)
+        
+        queue_url = self.sqs_client.create_queue(QueueName=queue_name)['QueueUrl']
+        queue_arn = self._queue_arn(queue_url)
+        self.sqs_client.set_queue_attributes(
+            QueueUrl=queue_url,
+            Attributes={
+                # Six times the function timeout, so a batch in progress is not redelivered
+                'VisibilityTimeout': str(6 * LAMBDA_TIMEOUT),
+                # Files that keep failing end up in the dead-letter queue instead of retrying forever
+                'RedrivePolicy': json.dumps({'deadLetterTargetArn': dlq_arn, 'maxReceiveCount': '5'}),
+                'Policy': json.dumps(get_ingest_queue_policy(queue_arn, BUCKET_NAME, self.get_account_id()))
+            }
+        )
+        print(f"✓ Created ingest queue: {queue_name} (dead letters: {queue_name}-dlq)")
+        return queue_arn
+    
+    def _queue_arn(self, queue_url):
+        """ARN of a queue from its URL"""
+        return self.sqs_client.get_queue_attributes(
+            QueueUrl=queue_url, AttributeNames=['QueueArn']
+        )['Attributes']['QueueArn']
+    
+    def configure_s3_queue_trigger(self, queue_arn):
+        """Send raw/ upload notifications to the ingest queue instead of invoking Lambda per file"""
+        # Replaces the whole notification configuration, including a direct Lambda trigger
+        notification_config = {
+            'QueueConfigurations': [
+                {
+                    'QueueArn': queue_arn,
+                    'Events': ['s3:ObjectCreated:*'],
+                    'Filter': RAW_UPLOAD_FILTER
+                }
+            ]
+        }
+        
+        try:
+            self.s3_client.put_bucket_notification_configuration(
+                Bucket=BUCKET_NAME,
+                NotificationConfiguration=notification_config
+            )
+            print("✓ Configured S3 notifications to the ingest queue")
+        except ClientError as e:
+            print(f"Note: S3 queue notification configuration: {e}")
+    
+    def create_ingest_event_source(self, queue_arn, batch_size=100, max_batching_window_seconds=30):
+        """Invoke Lambda with micro-batches of up to batch_size files, waiting at most the batching window"""
+        self.iam_client.put_role_policy(
+            RoleName=IAM_ROLE_NAME,
+            PolicyName='IngestQueueConsumer',
+            PolicyDocument=json.dumps(get_ingest_consumer_policy(queue_arn))
+        )
+        
+        settings = {
+            'BatchSize': batch_size,
+            'MaximumBatchingWindowInSeconds': max_batching_window_seconds,
+            # The handler reports failed messages, so only those are redelivered
+            'FunctionResponseTypes': ['ReportBatchItemFailures']
+        }
+        try:
+            self.lambda_client.create_event_source_mapping(
+                EventSourceArn=queue_arn,
+                FunctionName=LAMBDA_FUNCTION_NAME,
+                **settings
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ResourceConflictException':
+                raise
+            mapping = self.lambda_client.list_event_source_mappings(
+                EventSourceArn=queue_arn,
+                FunctionName=LAMBDA_FUNCTION_NAME
+            )['EventSourceMappings'][0]
+            self.lambda_client.update_event_source_mapping(UUID=mapping['UUID'], **settings)
+        print(f"✓ Ingest micro-batches: up to {batch_size} file(s) or {max_batching_window_seconds}s")
+    
+    def create_warmup_schedule(self, lambda_arn, schedule='rate(5 minutes)'):
+        """Invoke Lambda with a warm-up event on a schedule to keep a container hot"""
+        rule_name = f"{LAMBDA_FUNCTION_NAME}-warmup"
+        rule_arn = self.events_client.put_rule(
+            Name=rule_name,
+            ScheduleExpression=schedule,
+            State='ENABLED',
+            Description='Keeps the energy pipeline warm for inline requests'
+        )['RuleArn']
+        
+        try:
+            self.lambda_client.add_permission(
+                FunctionName=LAMBDA_FUNCTION_NAME,
+                StatementId='EventBridgeWarmupPermission',
+                Action='lambda:InvokeFunction',
+                Principal='events.amazonaws.com',
+                SourceArn=rule_arn
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ResourceConflictException':
+                raise
+        
+        self.events_client.put_targets(
+            Rule=rule_name,
+            Targets=[{'Id': 'warmup', 'Arn': lambda_arn, 'Input': json.dumps({'warmup': True})}]
+        )
+        print(f"✓ Scheduled warm-up invocations: {schedule}")
+    
     def setup_athena(self):
         """Setup Athena database and tables"""
         # Create database
@@ -227,6 +382,12 @@ class AWSInfrastructure:
         self._execute_athena_query(raw_table_query)
         print("  ✓ Created raw_energy_data table")
         
+        # Outputs sit under runs/<run_id>/ (or type folders), so the output tables read
+        # the per-run symlink manifests under athena/ instead of a data folder
+        for table in ('processed_energy_data', 'forecast_data'):
+            # Replaces tables created by earlier deploys with a data-folder location
+            self._execute_athena_query(f"DROP TABLE IF EXISTS {ATHENA_DATABASE}.{table}")
+        
         # Create processed data table
         processed_table_query = f"""
         CREATE EXTERNAL TABLE IF NOT EXISTS {ATHENA_DATABASE}.processed_energy_data (
@@ -237,8 +398,9 @@ class AWSInfrastructure:
         )
         ROW FORMAT DELIMITED
         FIELDS TERMINATED BY ','
-        STORED AS TEXTFILE
-        LOCATION 's3://{BUCKET_NAME}/processed/'
+        STORED AS INPUTFORMAT 'org.apache.hadoop.hive.ql.io.SymlinkTextInputFormat'
+        OUTPUTFORMAT 'org.apache.hadoop.hive.ql.io.HiveIgnoreKeyTextOutputFormat'
+        LOCATION 's3://{BUCKET_NAME}/athena/processed/'
         TBLPROPERTIES ('skip.header.line.count'='1')
         """
         self._execute_athena_query(processed_table_query)
@@ -254,8 +416,9 @@ class AWSInfrastructure:
         )
         ROW FORMAT DELIMITED
         FIELDS TERMINATED BY ','
-        STORED AS TEXTFILE
-        LOCATION 's3://{BUCKET_NAME}/forecast/'
+        STORED AS INPUTFORMAT 'org.apache.hadoop.hive.ql.io.SymlinkTextInputFormat'
+        OUTPUTFORMAT 'org.apache.hadoop.hive.ql.io.HiveIgnoreKeyTextOutputFormat'
+        LOCATION 's3://{BUCKET_NAME}/athena/forecast/'
         TBLPROPERTIES ('skip.header.line.count'='1')
         """
         self._execute_athena_query(forecast_table_query)
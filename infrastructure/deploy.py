@@ -31,6 +31,10 @@ def main():
         print(f"Role ARN: {role_arn}")
         print()
         
+        # Rate-limit buckets shared by all containers (RATE_LIMIT_TABLE)
+        rate_limit_table = aws.create_rate_limit_table()
+        print()
+        
         # Wait for IAM role propagation
         print("Waiting for IAM role propagation (10 seconds)...")
         time.sleep(10)
@@ -42,13 +46,24 @@ def main():
             'lambda',
             'lambda_function.py'
         )
-        lambda_arn = aws.create_lambda_function(role_arn, lambda_code_path)
+        lambda_arn = aws.create_lambda_function(role_arn, lambda_code_path, rate_limit_table)
         print(f"Lambda ARN: {lambda_arn}")
         print()
         
         print("Step 4: Configuring S3 Trigger")
         print("-"*70)
-        aws.configure_s3_trigger(lambda_arn)
+        if os.environ.get('INGEST_MODE', 'direct') == 'queue':
+            # Uploads are buffered in SQS and processed in micro-batches
+            queue_arn = aws.create_ingest_queue()
+            aws.configure_s3_queue_trigger(queue_arn)
+            aws.create_ingest_event_source(
+                queue_arn,
+                batch_size=int(os.environ.get('INGEST_BATCH_FILES', '100')),
+                max_batching_window_seconds=int(os.environ.get('INGEST_MAX_DELAY_SECONDS', '30'))
+            )
+        else:
+            aws.configure_s3_trigger(lambda_arn)
+        aws.create_warmup_schedule(lambda_arn)
         print()
         
         print("Step 5: Setting up Athena Database and Tables")
@@ -67,6 +82,7 @@ def main():
         print(f"Lambda Function:  {LAMBDA_FUNCTION_NAME}")
         print(f"Lambda ARN:       {lambda_arn}")
         print(f"IAM Role:         {IAM_ROLE_NAME}")
+        print(f"Rate-limit Table: {rate_limit_table}")
         print(f"Athena Database:  {ATHENA_DATABASE}")
         print(f"AWS Region:       {AWS_REGION}")
         print()
@@ -112,3 +112,73 @@ def get_cloudwatch_logs_policy():
             }
         ]
     }
+
+def get_lambda_invoke_policy(function_arn):
+    """Lets the function invoke itself asynchronously for report jobs"""
+    return {
+        "Version": "2012-10-17",
+        "Statement": [
+            {
+                "Effect": "Allow",
+                "Action": [
+                    "lambda:InvokeFunction"
+                ],
+                "Resource": function_arn
+            }
+        ]
+    }
+
+def get_ingest_queue_policy(queue_arn, bucket_name, account_id):
+    """Queue policy letting the bucket's notifications into the ingest queue"""
+    return {
+        "Version": "2012-10-17",
+        "Statement": [
+            {
+                "Effect": "Allow",
+                "Principal": {
+                    "Service": "s3.amazonaws.com"
+                },
+                "Action": "sqs:SendMessage",
+                "Resource": queue_arn,
+                "Condition": {
+                    "ArnLike": {"aws:SourceArn": f"arn:aws:s3:::{bucket_name}"},
+                    "StringEquals": {"aws:SourceAccount": account_id}
+                }
+            }
+        ]
+    }
+
+def get_ingest_consumer_policy(queue_arn):
+    """Lets the function's event source mapping read and delete ingest messages"""
+    return {
+        "Version": "2012-10-17",
+        "Statement": [
+            {
+                "Effect": "Allow",
+                "Action": [
+                    "sqs:ReceiveMessage",
+                    "sqs:DeleteMessage",
+                    "sqs:ChangeMessageVisibility",
+                    "sqs:GetQueueAttributes"
+                ],
+                "Resource": queue_arn
+            }
+        ]
+    }
+
+def get_rate_limit_table_policy(table_arn):
+    """Read and conditionally update the shared LLM rate-limit buckets"""
+    return {
+        "Version": "2012-10-17",
+        "Statement": [
+            {
+                "Effect": "Allow",
+                "Action": [
+                    "dynamodb:GetItem",
+                    "dynamodb:PutItem",
+                    "dynamodb:UpdateItem"
+                ],
+                "Resource": table_arn
+            }
+        ]
+    }
@@ -0,0 +1,135 @@
+"""Rolling-origin backtesting for forecast engines"""
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+from forecasting import EnergyForecaster
+
+# Engine configurations evaluated when none are given
+DEFAULT_ENGINES = {
+    'prophet': {'engine': 'prophet', 'changepoint_prior_scale': 0.05},
+    'simple': {'engine': 'simple'},
+    'seasonal_naive': {'engine': 'seasonal_naive'},
+    'ets': {'engine': 'ets'}
+}
+
+
+def _run_fold(task):
+    """Fit one engine on one training window and score every horizon"""
+    engine_name, engine_kwargs, cutoff, train_df, test_df, horizons = task
+    
+    forecaster = EnergyForecaster(forecast_days=max(horizons), **engine_kwargs)
+    
+    start = time.perf_counter()
+    forecaster.fit(train_df)
+    fit_seconds = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    forecast_df = forecaster.predict()
+    predict_seconds = time.perf_counter() - start
+    
+    merged = test_df.merge(forecast_df, on='ds', how='inner').sort_values('ds')
+    actual = merged['y'].to_numpy(dtype=float)
+    predicted = merged['yhat'].to_numpy(dtype=float)
+    lower = merged['yhat_lower'].to_numpy(dtype=float)
+    upper = merged['yhat_upper'].to_numpy(dtype=float)
+    
+    # A fallback engine is scored under its own label, never as the requested one
+    label = engine_name
+    fallback = forecaster.engine_used != engine_kwargs['engine']
+    if fallback:
+        label = f"{engine_name} ({forecaster.engine_used} fallback)"
+    
+    rows = []
+    for horizon in horizons:
+        if len(actual) < horizon:
+            continue
+        
+        y = actual[:horizon]
+        nonzero = y != 0
+        ape = np.abs(y[nonzero] - predicted[:horizon][nonzero]) / np.abs(y[nonzero])
+        covered = (y >= lower[:horizon]) & (y <= upper[:horizon])
+        
+        rows.append({
+            'engine': label,
+            'engine_used': forecaster.engine_used,
+            'fallback': fallback,
+            'cutoff': cutoff,
+            'horizon': horizon,
+            'mape': float(ape.mean() * 100) if len(ape) else float('nan'),
+            'coverage': float(covered.mean()),
+            'fit_seconds': fit_seconds,
+            'predict_seconds': predict_seconds
+        })
+    
+    return rows
+
+
+class ForecastBacktester:
+    def __init__(self, engines=None, horizons=(1, 3, 7), min_train_days=14, step_days=1, max_workers=None):
+        self.engines = engines or DEFAULT_ENGINES
+        self.horizons = tuple(sorted(horizons))
+        self.min_train_days = min_train_days
+        self.step_days = step_days
+        self.max_workers = max_workers
+    
+    def make_cutoffs(self, daily_df):
+        """Rolling origins leaving room for the longest horizon"""
+        dates = daily_df['ds'].sort_values().reset_index(drop=True)
+        last_index = len(dates) - max(self.horizons)
+        
+        return [dates[i - 1] for i in range(self.min_train_days, last_index + 1, self.step_days)]
+    
+    def run(self, daily_df):
+        """Evaluate all engines at all cutoffs in a process pool"""
+        daily_df = daily_df.sort_values('ds').reset_index(drop=True)
+        horizon_end = pd.Timedelta(days=max(self.horizons))
+        
+        tasks = []
+        for cutoff in self.make_cutoffs(daily_df):
+            train_df = daily_df[daily_df['ds'] <= cutoff]
+            test_df = daily_df[(daily_df['ds'] > cutoff) & (daily_df['ds'] <= cutoff + horizon_end)]
+            
+            for engine_name, engine_kwargs in self.engines.items():
+                tasks.append((engine_name, engine_kwargs, cutoff, train_df, test_df, self.horizons))
+        
+        if not tasks:
+            raise ValueError(
+                f"Series too short for backtesting: need at least "
+                f"{self.min_train_days + max(self.horizons)} days"
+            )
+        
+        rows = []
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            for fold_rows in executor.map(_run_fold, tasks):
+                rows.extend(fold_rows)
+        
+        return pd.DataFrame(rows)
+    
+    def summarize(self, results_df):
+        """Accuracy and latency percentiles per engine and horizon"""
+        grouped = results_df.groupby(['engine', 'horizon'])
+        
+        summary = grouped.agg(
+            folds=('cutoff', 'count'),
+            fallback=('fallback', 'any'),
+            mape=('mape', 'mean'),
+            coverage=('coverage', 'mean'),
+            fit_p50_ms=('fit_seconds', lambda x: np.percentile(x, 50) * 1000),
+            fit_p95_ms=('fit_seconds', lambda x: np.percentile(x, 95) * 1000),
+            predict_p50_ms=('predict_seconds', lambda x: np.percentile(x, 50) * 1000),
+            predict_p95_ms=('predict_seconds', lambda x: np.percentile(x, 95) * 1000)
+        ).reset_index()
+        
+        return summary.sort_values(['horizon', 'mape'])
+    
+    def best_engine(self, summary_df, horizon=None):
+        """Engine with the lowest MAPE at the given (default: longest) horizon; None if every engine fell back"""
+        horizon = horizon or max(self.horizons)
+        # A fallback row scores the engine that actually ran, not the one that would be picked
+        at_horizon = summary_df[(summary_df['horizon'] == horizon) & ~summary_df['fallback']]
+        if at_horizon.empty:
+            return None
+        
+        return at_horizon.sort_values('mape').iloc[0]['engine']
@@ -0,0 +1,185 @@
+"""Checkpoints of pipeline stage outputs so interrupted runs can resume"""
+import datetime
+import hashlib
+import io
+import json
+import os
+import shutil
+import threading
+
+import numpy as np
+import pandas as pd
+
+
+def make_run_id(records):
+    """Deterministic run id from the bucket, key, ETag and event time of each record"""
+    # A redelivered or continued event maps to the same id, and so to the same checkpoints
+    parts = sorted(
+        f"{record['bucket']}/{record['key']}|{record.get('etag', '')}|{record.get('event_time', '')}"
+        for record in records
+    )
+    return hashlib.sha256('\n'.join(parts).encode('utf-8')).hexdigest()[:32]
+
+
+def _encode(value):
+    """JSON-compatible form of a stage output; frames, timestamps and numpy values are tagged"""
+    if value is None or isinstance(value, (bool, str)):
+        return value
+    if isinstance(value, (int, float)):
+        return {'__float__': repr(value)} if isinstance(value, float) and not np.isfinite(value) else value
+    if isinstance(value, np.generic):
+        return _encode(value.item())
+    if isinstance(value, pd.DataFrame):
+        return {'__frame__': value.to_json(orient='table', date_format='iso')}
+    if isinstance(value, pd.Series):
+        frame = value.to_frame(name=value.name or '__values__')
+        return {'__series__': frame.to_json(orient='table', date_format='iso'), 'name': value.name}
+    if isinstance(value, pd.Timestamp):
+        return {'__timestamp__': value.isoformat()}
+    if isinstance(value, datetime.datetime):
+        return {'__datetime__': value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {'__date__': value.isoformat()}
+    if isinstance(value, np.ndarray):
+        return {'__ndarray__': [_encode(item) for item in value.tolist()], 'dtype': str(value.dtype)}
+    if isinstance(value, (list, tuple)):
+        return [_encode(item) for item in value]
+    if isinstance(value, dict):
+        if all(isinstance(key, str) for key in value):
+            return {key: _encode(item) for key, item in value.items()}
+        return {'__items__': [[_encode(key), _encode(item)] for key, item in value.items()]}
+    raise TypeError(f"Cannot checkpoint a {type(value).__name__}")
+
+
+def _decode(value):
+    """Stage output from its _encode form"""
+    if isinstance(value, list):
+        return [_decode(item) for item in value]
+    if not isinstance(value, dict):
+        return value
+    if '__frame__' in value:
+        return pd.read_json(io.StringIO(value['__frame__']), orient='table')
+    if '__series__' in value:
+        frame = pd.read_json(io.StringIO(value['__series__']), orient='table')
+        return frame.iloc[:, 0].rename(value['name'])
+    if '__timestamp__' in value:
+        return pd.Timestamp(value['__timestamp__'])
+    if '__datetime__' in value:
+        return datetime.datetime.fromisoformat(value['__datetime__'])
+    if '__date__' in value:
+        return datetime.date.fromisoformat(value['__date__'])
+    if '__float__' in value:
+        return float(value['__float__'])
+    if '__ndarray__' in value:
+        return np.array(_decode(value['__ndarray__']), dtype=value['dtype'])
+    if '__items__' in value:
+        return {_decode(key): _decode(item) for key, item in value['__items__']}
+    return {key: _decode(item) for key, item in value.items()}
+
+
+def dumps(value):
+    """Serialize a stage output to JSON bytes; TypeError for values with no JSON form"""
+    return json.dumps(_encode(value), allow_nan=False).encode('utf-8')
+
+
+def loads(data):
+    """Stage output from dumps() bytes"""
+    return _decode(json.loads(data))
+
+
+class S3CheckpointStore:
+    """Stage outputs as JSON under a per-run S3 prefix"""
+    
+    def __init__(self, s3_client, bucket, prefix='checkpoints/'):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.prefix = prefix
+    
+    def stages(self, run_id):
+        """Names of the stages checkpointed for a run"""
+        paginator = self.s3_client.get_paginator('list_objects_v2')
+        names = []
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=f"{self.prefix}{run_id}/"):
+            for item in page.get('Contents', []):
+                names.append(item['Key'].rsplit('/', 1)[-1][:-len('.json')])
+        return names
+    
+    def load(self, run_id, stage):
+        """Saved stage output"""
+        response = self.s3_client.get_object(Bucket=self.bucket, Key=f"{self.prefix}{run_id}/{stage}.json")
+        return loads(response['Body'].read())
+    
+    def save(self, run_id, stage, value):
+        """Save a stage output"""
+        self.s3_client.put_object(
+            Bucket=self.bucket,
+            Key=f"{self.prefix}{run_id}/{stage}.json",
+            Body=dumps(value),
+            ContentType='application/json'
+        )
+    
+    def clear(self, run_id):
+        """Delete every checkpoint of a run"""
+        keys = [{'Key': f"{self.prefix}{run_id}/{stage}.json"} for stage in self.stages(run_id)]
+        for start in range(0, len(keys), 1000):
+            self.s3_client.delete_objects(Bucket=self.bucket, Delete={'Objects': keys[start:start + 1000]})
+
+
+class LocalDirectoryCheckpointStore:
+    """Stage outputs as JSON in a local directory (stand-in for S3 in tests)"""
+    
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+    
+    def stages(self, run_id):
+        """Names of the stages checkpointed for a run"""
+        run_path = os.path.join(self.path, run_id)
+        if not os.path.isdir(run_path):
+            return []
+        return [name[:-len('.json')] for name in os.listdir(run_path) if name.endswith('.json')]
+    
+    def load(self, run_id, stage):
+        """Saved stage output"""
+        with open(os.path.join(self.path, run_id, f"{stage}.json"), 'rb') as f:
+            return loads(f.read())
+    
+    def save(self, run_id, stage, value):
+        """Save a stage output"""
+        run_path = os.path.join(self.path, run_id)
+        os.makedirs(run_path, exist_ok=True)
+        # Write then rename so a run cut off mid-write never leaves a partial checkpoint
+        data = dumps(value)
+        file_path = os.path.join(run_path, f"{stage}.json")
+        tmp_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, file_path)
+    
+    def clear(self, run_id):
+        """Delete every checkpoint of a run"""
+        shutil.rmtree(os.path.join(self.path, run_id), ignore_errors=True)
+
+
+class RunCheckpoint:
+    """Checkpoints of one run, as used by StageGraph.run"""
+    
+    def __init__(self, store, run_id):
+        self.store = store
+        self.run_id = run_id
+    
+    def completed(self):
+        """Stages with a saved output"""
+        return set(self.store.stages(self.run_id))
+    
+    def load(self, stage):
+        """Saved output of a stage"""
+        return self.store.load(self.run_id, stage)
+    
+    def save(self, stage, value):
+        """Save the output of a finished stage"""
+        self.store.save(self.run_id, stage, value)
+    
+    def clear(self):
+        """Drop the checkpoints once the run has finished"""
+        self.store.clear(self.run_id)
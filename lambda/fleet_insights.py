@@ -0,0 +1,171 @@
+"""Archetype-level insights for household fleets"""
+from collections import OrderedDict
+
+# Hour ranges used to bucket each household's peak hour
+PEAK_PERIODS = (
+    ('night', range(0, 6)),
+    ('morning', range(6, 12)),
+    ('afternoon', range(12, 18)),
+    ('evening', range(18, 24))
+)
+
+
+class HouseholdProfileQuantizer:
+    """Map a household's consumption features onto a small set of archetypes.
+
+    Features are quantized into fixed bands rather than clustered, so the
+    same archetype always renders the same context and its narrative can be
+    served from the insights cache across runs.
+    """
+    
+    def __init__(self, dominance_share=0.4, anomaly_bands=(0.02, 0.05), trend_band=0.005):
+        self.dominance_share = dominance_share
+        self.anomaly_bands = anomaly_bands
+        self.trend_band = trend_band
+    
+    def features(self, analytics_data):
+        """Feature vector for one household's analytics data"""
+        appliance_stats = analytics_data.get('appliance_stats', [])
+        total = sum(stat.get('total_kwh', 0) for stat in appliance_stats)
+        readings = sum(stat.get('count', 0) for stat in appliance_stats)
+        
+        shares = {
+            stat.get('appliance', 'Unknown'): (stat.get('total_kwh', 0) / total if total > 0 else 0)
+            for stat in appliance_stats
+        }
+        top_appliance = max(shares, key=shares.get) if shares else 'Unknown'
+        
+        peak_hours = analytics_data.get('peak_hours', [])
+        peak_hour = int(peak_hours[0].get('hour', 0)) if peak_hours else 0
+        
+        return {
+            'total_kwh': total,
+            'appliance_shares': shares,
+            'top_appliance': top_appliance,
+            'top_share': shares.get(top_appliance, 0),
+            'peak_hour': peak_hour,
+            'anomaly_count': analytics_data.get('anomaly_count', 0),
+            'anomaly_rate': analytics_data.get('anomaly_count', 0) / readings if readings else 0,
+            # Relative daily change in consumption, e.g. 0.01 = +1%/day
+            'trend': analytics_data.get('trend', 0.0)
+        }
+    
+    def archetype(self, features):
+        """Quantized archetype key for a feature vector"""
+        dominance = 'dominant' if features['top_share'] >= self.dominance_share else 'led'
+        
+        peak_period = next(
+            name for name, hours in PEAK_PERIODS if features['peak_hour'] % 24 in hours
+        )
+        
+        low, high = self.anomaly_bands
+        if features['anomaly_rate'] < low:
+            anomalies = 'low'
+        elif features['anomaly_rate'] < high:
+            anomalies = 'moderate'
+        else:
+            anomalies = 'high'
+        
+        if features['trend'] > self.trend_band:
+            trend = 'rising'
+        elif features['trend'] < -self.trend_band:
+            trend = 'falling'
+        else:
+            trend = 'stable'
+        
+        return (features['top_appliance'], dominance, peak_period, anomalies, trend)
+    
+    def describe(self, archetype):
+        """Human-readable archetype label"""
+        appliance, dominance, peak_period, anomalies, trend = archetype
+        return f"{appliance}-{dominance}, {peak_period} peak, {anomalies} anomaly rate, {trend} usage"
+
+
+class FleetInsightsGenerator:
+    """Generate one narrative per archetype and template per-household numbers into it"""
+    
+    def __init__(self, assistant, quantizer=None, batch_size=1):
+        self.assistant = assistant
+        self.quantizer = quantizer or HouseholdProfileQuantizer()
+        # batch_size > 1 packs several archetype contexts into each provider call
+        self.batch_size = batch_size
+    
+    def generate(self, households):
+        """Insights for each household from a dict of household_id -> analytics data"""
+        features = OrderedDict(
+            (household_id, self.quantizer.features(analytics_data))
+            for household_id, analytics_data in households.items()
+        )
+        
+        clusters = OrderedDict()
+        for household_id, household_features in features.items():
+            key = self.quantizer.archetype(household_features)
+            clusters.setdefault(key, []).append(household_id)
+        
+        narratives = self._generate_narratives(list(clusters))
+        
+        insights = {}
+        for key, household_ids in clusters.items():
+            for household_id in household_ids:
+                insights[household_id] = self._render_household(
+                    household_id, features[household_id], self.quantizer.describe(key), narratives[key]
+                )
+        
+        return {
+            'insights': insights,
+            'archetypes': {self.quantizer.describe(key): ids for key, ids in clusters.items()},
+            'households': len(households),
+            'narratives_generated': len(narratives)
+        }
+    
+    def _generate_narratives(self, archetypes):
+        """One narrative per archetype, batched when batch_size allows"""
+        if self.batch_size <= 1:
+            return {
+                key: self.assistant.generate_from_context(self._archetype_context(key))
+                for key in archetypes
+            }
+        
+        # Batch items need plain string ids for the JSON response
+        ids = {f"archetype-{index}": key for index, key in enumerate(archetypes, 1)}
+        narratives = self.assistant.generate_batch(
+            {item_id: self._archetype_context(key) for item_id, key in ids.items()},
+            max_batch_size=self.batch_size
+        )
+        return {key: narratives[item_id] for item_id, key in ids.items()}
+    
+    def _archetype_context(self, archetype):
+        """Context describing an archetype, free of household-specific numbers"""
+        appliance, dominance, peak_period, anomalies, trend = archetype
+        
+        share_text = 'the largest single share'
+        if dominance == 'dominant':
+            # Dominant means at least dominance_share, which is only a majority above one half
+            share_text = ('the majority' if self.quantizer.dominance_share > 0.5
+                          else f"the largest share, at least {self.quantizer.dominance_share:.0%},")
+        
+        return f"""
+Household Consumption Archetype: {self.quantizer.describe(archetype)}
+
+Profile:
+- {appliance} accounts for {share_text} of total consumption
+- Consumption peaks in the {peak_period}
+- Anomalous high-consumption readings are {anomalies}
+- Daily consumption is {trend} over the observation period
+
+Write guidance that applies to every household with this profile.
+Do not quote specific kWh figures; they are added per household.
+"""
+    
+    def _render_household(self, household_id, features, label, narrative):
+        """Fill per-household numbers around the shared archetype narrative"""
+        return f"""
+HOUSEHOLD: {household_id}
+Profile: {label}
+
+Total Consumption: {features['total_kwh']:.2f} kWh
+Top Consumer: {features['top_appliance']} ({features['top_share']*100:.1f}% of total)
+Peak Hour: {features['peak_hour']}:00
+Anomalies: {features['anomaly_count']} ({features['anomaly_rate']*100:.1f}% of readings)
+Usage Trend: {features['trend']*100:+.2f}% per day
+{narrative}"""
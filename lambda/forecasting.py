@@ -1,42 +1,325 @@
 """Time-series forecasting using Prophet"""
+import math
+import time
+import warnings
+import numpy as np
 import pandas as pd
 import json
 from io import StringIO
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, wait
+
+DEFAULT_ENSEMBLE_MEMBERS = ('prophet', 'seasonal_naive', 'ets')
+
+# Expected fit seconds per ensemble member: seeded with rough figures, then
+# smoothed with observed durations for as long as the container stays warm
+ENSEMBLE_MEMBER_COSTS = {'prophet': 5.0, 'ets': 0.05, 'seasonal_naive': 0.01, 'simple': 0.01}
+
+
+def _fit_ensemble_member(engine, daily_df, forecast_days, holdout_days, changepoint_prior_scale):
+    """Score a member on a recent holdout, then forecast from the full series"""
+    start = time.perf_counter()
+    holdout_mape = None
+    
+    # Need at least two weeks of training data left after the holdout
+    if len(daily_df) >= holdout_days + 14:
+        train_df = daily_df.iloc[:-holdout_days]
+        test_df = daily_df.iloc[-holdout_days:]
+        
+        holdout_forecast = EnergyForecaster(
+            forecast_days=holdout_days,
+            engine=engine,
+            changepoint_prior_scale=changepoint_prior_scale
+        ).forecast(train_df)
+        
+        merged = test_df.merge(holdout_forecast, on='ds')
+        merged = merged[merged['y'] != 0]
+        if len(merged):
+            holdout_mape = float(((merged['y'] - merged['yhat']).abs() / merged['y'].abs()).mean())
+    
+    forecaster = EnergyForecaster(
+        forecast_days=forecast_days,
+        engine=engine,
+        changepoint_prior_scale=changepoint_prior_scale
+    )
+    forecast_df = forecaster.forecast(daily_df)
+    if forecaster.engine_used != engine:
+        # A fallback would duplicate the simple member under another name
+        raise RuntimeError(f"{engine} unavailable, fell back to {forecaster.engine_used}")
+    
+    return forecast_df, holdout_mape, forecaster.residuals(), time.perf_counter() - start
+
+
+def _record_member_cost(member, seconds):
+    """Smooth an observed member fit time into its expected cost"""
+    previous = ENSEMBLE_MEMBER_COSTS.get(member)
+    ENSEMBLE_MEMBER_COSTS[member] = seconds if previous is None else 0.7 * previous + 0.3 * seconds
+
+
+def _record_member_timeout(member, budget_seconds):
+    """A member that ran out the budget costs at least the budget, so later fits skip it"""
+    ENSEMBLE_MEMBER_COSTS[member] = max(budget_seconds, ENSEMBLE_MEMBER_COSTS.get(member, 0.0))
+
 
 class EnergyForecaster:
-    def __init__(self, forecast_days=7):
+    ENGINES = ('prophet', 'simple', 'online', 'ets', 'seasonal_naive', 'ensemble')
+    
+    def __init__(self, forecast_days=7, engine='prophet', state=None, changepoint_prior_scale=0.05,
+                 ensemble_members=DEFAULT_ENSEMBLE_MEMBERS, time_budget_seconds=30,
+                 holdout_days=7, executor='thread'):
+        if engine not in self.ENGINES:
+            raise ValueError(f"Unknown forecast engine: {engine}")
+        
         self.forecast_days = forecast_days
+        self.engine = engine
+        # Engine that produced the last fit; differs from engine after a fallback
+        self.engine_used = None
+        self.changepoint_prior_scale = changepoint_prior_scale
+        # Persisted online model state (engine='online'); refreshed after fit()
+        self.state = state
+        # Revised days re-absorbed and too-old days rejected by the last online fit
+        self.state_revisions = None
+        
+        # Ensemble settings (engine='ensemble')
+        self.ensemble_members = ensemble_members
+        self.time_budget_seconds = time_budget_seconds
+        self.holdout_days = holdout_days
+        self.executor = executor
+        self.ensemble_report = None
+        
+        self._model = None
+        self._history = None
+        self._residuals = None
     
     def forecast(self, daily_df):
-        """Generate forecast using Prophet"""
-        try:
-            from prophet import Prophet
-            
-            # Initialize Prophet model
-            model = Prophet(
-                daily_seasonality=False,
-                weekly_seasonality=True,
-                yearly_seasonality=False,
-                changepoint_prior_scale=0.05
-            )
-            
-            # Fit model
-            model.fit(daily_df)
-            
-            # Create future dataframe
-            future = model.make_future_dataframe(periods=self.forecast_days)
-            
-            # Generate forecast
-            forecast = model.predict(future)
-            
-            # Extract relevant columns
-            forecast_result = forecast[['ds', 'yhat', 'yhat_lower', 'yhat_upper']].tail(self.forecast_days)
+        """Generate forecast using the configured engine"""
+        return self.fit(daily_df).predict()
+    
+    def fit(self, daily_df):
+        """Fit the configured engine on the daily series"""
+        self._history = daily_df
+        self._model = None
+        self._residuals = None
+        self.engine_used = self.engine
+        
+        if self.engine == 'online':
+            self._fit_online(daily_df)
+        elif self.engine == 'ets':
+            # Same state-space model, fitted from scratch and not persisted
+            self._model = OnlineStateSpaceForecaster().update(daily_df)
+        elif self.engine == 'ensemble':
+            self._model = self._fit_ensemble(daily_df)
+        elif self.engine == 'prophet':
+            try:
+                from prophet import Prophet
+                
+                # Initialize Prophet model
+                model = Prophet(
+                    daily_seasonality=False,
+                    weekly_seasonality=True,
+                    yearly_seasonality=False,
+                    changepoint_prior_scale=self.changepoint_prior_scale
+                )
+                
+                # Fit model
+                model.fit(daily_df)
+                self._model = model
             
-            return forecast_result
+            except ImportError:
+                # Fallback: Simple moving average forecast in predict()
+                self.engine_used = 'simple'
+        
+        return self
+    
+    def predict(self):
+        """Forecast the next forecast_days from the fitted engine"""
+        if self._history is None:
+            raise ValueError("Forecaster must be fitted before predict()")
+        
+        if self.engine in ('online', 'ets'):
+            return self._model.forecast(self.forecast_days)
+        
+        if self.engine == 'seasonal_naive':
+            return self._seasonal_naive_forecast(self._history)
+        
+        if self.engine == 'ensemble':
+            return self._model
+        
+        if self._model is None:
+            return self._simple_forecast(self._history)
+        
+        # Create future dataframe
+        future = self._model.make_future_dataframe(periods=self.forecast_days)
+        
+        # Generate forecast
+        forecast = self._model.predict(future)
+        
+        # History rows come for free with the future frame
+        in_sample = forecast['yhat'].to_numpy()[:len(self._history)]
+        self._residuals = self._history['y'].to_numpy(dtype=float) - in_sample
+        
+        # Extract relevant columns
+        forecast_result = forecast[['ds', 'yhat', 'yhat_lower', 'yhat_upper']].tail(self.forecast_days)
+        
+        return forecast_result
+    
+    def residuals(self):
+        """In-sample one-step residuals of the fitted engine"""
+        if self._history is None:
+            raise ValueError("Forecaster must be fitted before residuals()")
+        
+        if self._residuals is not None:
+            return self._residuals
+        
+        y = self._history.sort_values('ds')['y'].to_numpy(dtype=float)
+        
+        if self.engine in ('online', 'ets'):
+            residuals = np.asarray(self._model.recent_errors, dtype=float)
+        elif self.engine == 'seasonal_naive':
+            residuals = y[7:] - y[:-7]
+        elif self.engine == 'prophet' and self._model is not None:
+            self.predict()
+            residuals = self._residuals
+        else:
+            # Moving-average fallback: deviations from the trailing 7-day mean
+            rolling_mean = pd.Series(y).rolling(7, min_periods=1).mean().shift(1).to_numpy()
+            residuals = (y - rolling_mean)[1:]
+        
+        if len(residuals) == 0:
+            residuals = y - y.mean()
+        
+        self._residuals = residuals
+        return residuals
+    
+    def _fit_online(self, daily_df):
+        """Update persisted state-space model with new days"""
+        if self.state:
+            model = OnlineStateSpaceForecaster.from_dict(self.state)
+        else:
+            model = OnlineStateSpaceForecaster()
+        
+        model.update(daily_df)
+        self.state = model.to_dict()
+        self.state_revisions = {'revised_days': model.revised_days, 'rejected_days': model.rejected_days}
+        self._model = model
+    
+    def _fit_ensemble(self, daily_df):
+        """Fit members concurrently and combine those finishing within the budget"""
+        deadline = time.monotonic() + self.time_budget_seconds
+        report = {member: {'status': 'timeout'} for member in self.ensemble_members}
+        
+        # Threads cannot be stopped once started, so members expected to
+        # overrun the budget are not started at all
+        members = []
+        for member in self.ensemble_members:
+            expected = ENSEMBLE_MEMBER_COSTS.get(member, 0.0)
+            if expected >= self.time_budget_seconds:
+                report[member] = {'status': 'skipped', 'expected_seconds': round(expected, 3)}
+            else:
+                members.append(member)
+        
+        args = (daily_df, self.forecast_days, self.holdout_days, self.changepoint_prior_scale)
+        # Member -> callable returning its result, for members finished within the budget
+        outcomes = {}
+        if members and self.executor == 'process':
+            # A process pool can be terminated, which stops late members outright
+            pool = multiprocessing.Pool(processes=len(members))
+            try:
+                pending = {member: pool.apply_async(_fit_ensemble_member, (member,) + args) for member in members}
+                for member, result in pending.items():
+                    result.wait(max(deadline - time.monotonic(), 0))
+                    if result.ready():
+                        outcomes[member] = result.get
+            finally:
+                pool.terminate()
+        elif members:
+            pool = ThreadPoolExecutor(max_workers=len(members))
+            futures = {pool.submit(_fit_ensemble_member, member, *args): member for member in members}
+            done, _ = wait(futures, timeout=max(deadline - time.monotonic(), 0))
+            # Late members finish in the background; their results are dropped
+            pool.shutdown(wait=False, cancel_futures=True)
+            outcomes = {futures[future]: future.result for future in done}
+        
+        for member in members:
+            if member not in outcomes:
+                _record_member_timeout(member, self.time_budget_seconds)
+        
+        forecasts = {}
+        residuals = {}
+        for member, outcome in outcomes.items():
+            try:
+                forecast_df, holdout_mape, member_residuals, seconds = outcome()
+            except Exception as e:
+                report[member] = {'status': 'failed', 'error': str(e)}
+                continue
             
-        except ImportError:
-            # Fallback: Simple moving average forecast
+            _record_member_cost(member, seconds)
+            forecasts[member] = (forecast_df.reset_index(drop=True), holdout_mape)
+            residuals[member] = member_residuals
+            report[member] = {'status': 'ok', 'holdout_mape': holdout_mape, 'seconds': round(seconds, 3)}
+        
+        if not forecasts:
+            self.ensemble_report = report
+            self.engine_used = 'simple'
+            return self._simple_forecast(daily_df)
+        
+        weights = self._ensemble_weights(forecasts)
+        for member, weight in weights.items():
+            report[member]['weight'] = weight
+        self.ensemble_report = report
+        # Residuals of the dominant member stand in for the combination
+        self._residuals = residuals[max(weights, key=weights.get)]
+        
+        base = next(iter(forecasts.values()))[0]
+        combined = pd.DataFrame({'ds': base['ds']})
+        for column in ('yhat', 'yhat_lower', 'yhat_upper'):
+            combined[column] = sum(
+                weights[member] * forecast_df[column].to_numpy(dtype=float)
+                for member, (forecast_df, _) in forecasts.items()
+            )
+        
+        return combined
+    
+    def _ensemble_weights(self, forecasts):
+        """Inverse holdout-error weights; equal weights when errors are unknown"""
+        errors = {member: holdout_mape for member, (_, holdout_mape) in forecasts.items()}
+        
+        if any(error is None for error in errors.values()):
+            return {member: 1.0 / len(errors) for member in errors}
+        
+        inverse = {member: 1.0 / max(error, 1e-6) for member, error in errors.items()}
+        total = sum(inverse.values())
+        
+        return {member: value / total for member, value in inverse.items()}
+    
+    def _seasonal_naive_forecast(self, daily_df):
+        """Repeat the last observed week"""
+        season = 7
+        if len(daily_df) < season:
             return self._simple_forecast(daily_df)
+        
+        history = daily_df.sort_values('ds')
+        last_week = history['y'].tail(season).to_numpy(dtype=float)
+        seasonal_diff = history['y'].diff(season).dropna()
+        std = float(seasonal_diff.std()) if len(seasonal_diff) > 1 else float(history['y'].std())
+        std = 0.0 if np.isnan(std) else std
+        
+        future_dates = pd.date_range(
+            start=history['ds'].max() + pd.Timedelta(days=1),
+            periods=self.forecast_days,
+            freq='D'
+        )
+        steps = np.arange(self.forecast_days)
+        yhat = last_week[steps % season]
+        # Error grows with the number of seasons stepped ahead
+        width = 2 * std * np.sqrt(steps // season + 1)
+        
+        return pd.DataFrame({
+            'ds': future_dates,
+            'yhat': yhat,
+            'yhat_lower': yhat - width,
+            'yhat_upper': yhat + width
+        })
     
     def _simple_forecast(self, daily_df):
         """Simple moving average forecast as fallback"""
@@ -44,6 +327,8 @@ class EnergyForecaster:
         window = min(7, len(daily_df))
         avg = daily_df['y'].tail(window).mean()
         std = daily_df['y'].tail(window).std()
+        # A single day has no spread; a NaN std would leave the bounds undefined
+        std = 0.0 if pd.isna(std) else std
         
         # Generate future dates
         last_date = daily_df['ds'].max()
@@ -63,12 +348,13 @@ class EnergyForecaster:
         
         return forecast_df
     
-    def format_forecast_summary(self, forecast_df):
+    def format_forecast_summary(self, forecast_df, quantile_df=None):
         """Format forecast summary for reporting"""
         summary = {
             'forecast_period': f"{self.forecast_days} days",
             'start_date': forecast_df['ds'].min().strftime('%Y-%m-%d'),
             'end_date': forecast_df['ds'].max().strftime('%Y-%m-%d'),
+            'engine': self.engine_used or self.engine,
             'avg_predicted_kwh': float(forecast_df['yhat'].mean()),
             'total_predicted_kwh': float(forecast_df['yhat'].sum()),
             'daily_predictions': []
@@ -82,4 +368,335 @@ class EnergyForecaster:
                 'upper_bound': float(row['yhat_upper'])
             })
         
+        # Optional simulated quantiles, one column per level (see probabilistic.py)
+        if quantile_df is not None:
+            quantile_columns = [column for column in quantile_df.columns if column != 'ds']
+            for prediction, (_, row) in zip(summary['daily_predictions'], quantile_df.iterrows()):
+                prediction['quantiles'] = {column: float(row[column]) for column in quantile_columns}
+        
         return summary
+
+
+
+class OnlineStateSpaceForecaster:
+    """Additive Holt-Winters (ETS A,A,A) model with weekly seasonality.
+
+    The state is small and fixed-size, so it can be persisted between runs.
+    It keeps the last REVISION_WINDOW days and a snapshot of the state from
+    before them. update() replays that window when an upload revises or fills
+    in one of those days. Days already absorbed before the window cannot be
+    re-absorbed; update() lists the ones whose value changed in rejected_days,
+    comparing against the values of the last ARCHIVE_WINDOW days. forecast()
+    never touches the history.
+    """
+    SEASON_LENGTH = 7
+    STATE_VERSION = 2
+    # One-step errors kept for residual simulation (bounded, so state stays small)
+    RESIDUAL_WINDOW = 56
+    # Recent days kept so revised values can be re-absorbed
+    REVISION_WINDOW = 28
+    # Values within this tolerance of the absorbed one are not revisions
+    REVISION_TOLERANCE = 1e-6
+    # Values of days that left the revision window, kept to tell changed old days from re-sent ones
+    ARCHIVE_WINDOW = 365
+    
+    def __init__(self, alpha=0.3, beta=0.05, gamma=0.1, interval_z=2.0):
+        self.alpha = alpha
+        self.beta = beta
+        self.gamma = gamma
+        self.interval_z = interval_z
+        
+        self.level = None
+        self.trend = 0.0
+        # Seasonal components indexed by weekday (Monday=0)
+        self.seasonal = [0.0] * self.SEASON_LENGTH
+        self.variance = 0.0
+        self.n_obs = 0
+        self.last_date = None
+        # Observations collected until one full season is available
+        self.warmup = []
+        self.recent_errors = []
+        # Last REVISION_WINDOW observations, and the model state before the first of them
+        self.history = []
+        self.base = None
+        self.archive = []
+        # Set by update(): days re-absorbed with revised values, and absorbed days too old to re-absorb
+        self.revised_days = []
+        self.rejected_days = []
+    
+    def update(self, daily_df):
+        """Absorb new days and re-absorb revised days of the revision window"""
+        days = [(pd.Timestamp(ds).date(), float(y)) for ds, y in zip(daily_df['ds'], daily_df['y'])]
+        recent = dict(self.history)
+        archived = dict(self.archive)
+        window_start = self.history[0][0] if self.history else None
+        archive_start = self.archive[0][0] if self.archive else None
+        
+        revised = {}
+        rejected = []
+        for date, y in days:
+            if self.last_date is None or date > self.last_date:
+                continue
+            if window_start is not None and date >= window_start:
+                # A changed value, or a day that was missing when the window was absorbed
+                if self._differs(recent.get(date), y):
+                    revised[date] = y
+            elif archive_start is not None and date >= archive_start and self._differs(archived.get(date), y):
+                # Older days are only reported when they differ; unchanged re-sent history is expected
+                rejected.append(date)
+        
+        if revised:
+            self._replay({**recent, **revised})
+        for date, y in days:
+            self.observe(date, y)
+        
+        self.revised_days = sorted(revised)
+        self.rejected_days = sorted(rejected)
+        return self
+    
+    def _differs(self, absorbed, y):
+        """Whether y changes an absorbed value (None when the day was never absorbed)"""
+        return absorbed is None or abs(absorbed - y) > self.REVISION_TOLERANCE * max(1.0, abs(y))
+    
+    def _replay(self, values):
+        """Rebuild the state from the pre-window snapshot and the given window values"""
+        model = OnlineStateSpaceForecaster.from_dict(self.base.to_dict()) if self.base else self._fresh()
+        model.base = OnlineStateSpaceForecaster.from_dict(model.to_dict()) if self.base else None
+        model.archive = list(self.archive)
+        for date in sorted(values):
+            model.observe(date, values[date])
+        self.__dict__.update(model.__dict__)
+    
+    def _fresh(self):
+        """Empty model with the same parameters"""
+        return OnlineStateSpaceForecaster(self.alpha, self.beta, self.gamma, self.interval_z)
+    
+    def observe(self, date, y):
+        """Apply a single daily observation to the state"""
+        if self.last_date is not None and date <= self.last_date:
+            return
+        
+        self._step(date, y)
+        self.history.append((date, y))
+        if len(self.history) > self.REVISION_WINDOW:
+            # The oldest day leaves the window and moves into the snapshot
+            if self.base is None:
+                self.base = self._fresh()
+            date, y = self.history.pop(0)
+            self.base._step(date, y)
+            self.archive = (self.archive + [(date, y)])[-self.ARCHIVE_WINDOW:]
+    
+    def _step(self, date, y):
+        """Update level, trend, seasonality and variance with one observation"""
+        if self.level is None:
+            self.warmup.append((date, y))
+            self.last_date = date
+            self.n_obs += 1
+            if len(self.warmup) >= self.SEASON_LENGTH:
+                self._initialize()
+            return
+        
+        # Roll the level and trend across missing days without an error update
+        gap = (date - self.last_date).days
+        for _ in range(gap - 1):
+            self.level += self.trend
+        
+        season = date.weekday()
+        error = y - (self.level + self.trend + self.seasonal[season])
+        
+        self.level = self.level + self.trend + self.alpha * error
+        self.trend = self.trend + self.beta * error
+        self.seasonal[season] += self.gamma * error
+        
+        # Exponentially weighted one-step error variance
+        self.variance = (1 - self.alpha) * self.variance + self.alpha * error ** 2
+        self.recent_errors = (self.recent_errors + [error])[-self.RESIDUAL_WINDOW:]
+        
+        self.last_date = date
+        self.n_obs += 1
+    
+    def _initialize(self):
+        """Seed level, seasonality and variance from the first full season"""
+        values = [y for _, y in self.warmup]
+        mean = sum(values) / len(values)
+        
+        self.level = mean
+        self.trend = 0.0
+        for date, y in self.warmup:
+            self.seasonal[date.weekday()] = y - mean
+        self.variance = sum((y - mean) ** 2 for y in values) / len(values)
+        self.warmup = []
+    
+    def forecast(self, days=7):
+        """Forecast the next days from the current state"""
+        if self.last_date is None:
+            raise ValueError("Online forecaster has no observations")
+        
+        if self.level is None:
+            # Not enough history for seasonality yet: flat forecast from warmup
+            values = [y for _, y in self.warmup]
+            level = sum(values) / len(values)
+            trend = 0.0
+            seasonal = [0.0] * self.SEASON_LENGTH
+            variance = sum((y - level) ** 2 for y in values) / len(values)
+        else:
+            level, trend, seasonal, variance = self.level, self.trend, self.seasonal, self.variance
+        
+        start = pd.Timestamp(self.last_date) + pd.Timedelta(days=1)
+        future_dates = pd.date_range(start=start, periods=days, freq='D')
+        
+        yhat, lower, upper = [], [], []
+        spread = 0.0
+        for h, ds in enumerate(future_dates, 1):
+            point = level + h * trend + seasonal[ds.weekday()]
+            
+            # ETS(A,A,A) h-step variance: sigma^2 * (1 + sum c_j^2)
+            if h > 1:
+                j = h - 1
+                c = self.alpha + j * self.beta + (self.gamma if j % self.SEASON_LENGTH == 0 else 0.0)
+                spread += c ** 2
+            width = self.interval_z * math.sqrt(variance * (1 + spread))
+            
+            yhat.append(point)
+            lower.append(point - width)
+            upper.append(point + width)
+        
+        return pd.DataFrame({
+            'ds': future_dates,
+            'yhat': yhat,
+            'yhat_lower': lower,
+            'yhat_upper': upper
+        })
+    
+    def to_dict(self):
+        """Serialize state to a JSON-compatible dict"""
+        return {
+            'version': self.STATE_VERSION,
+            'params': {
+                'alpha': self.alpha,
+                'beta': self.beta,
+                'gamma': self.gamma,
+                'interval_z': self.interval_z
+            },
+            'level': self.level,
+            'trend': self.trend,
+            'seasonal': list(self.seasonal),
+            'variance': self.variance,
+            'n_obs': self.n_obs,
+            'last_date': self.last_date.isoformat() if self.last_date else None,
+            'warmup': [[date.isoformat(), y] for date, y in self.warmup],
+            'recent_errors': list(self.recent_errors),
+            'history': [[date.isoformat(), y] for date, y in self.history],
+            'base': self.base.to_dict() if self.base else None,
+            'archive': [[date.isoformat(), y] for date, y in self.archive]
+        }
+    
+    @classmethod
+    def from_dict(cls, state):
+        """Restore a forecaster from a dict produced by to_dict()"""
+        if state.get('version') != cls.STATE_VERSION:
+            raise ValueError(f"Unsupported forecaster state version: {state.get('version')}")
+        
+        model = cls(**state.get('params', {}))
+        model.level = state['level']
+        model.trend = state['trend']
+        model.seasonal = list(state['seasonal'])
+        model.variance = state['variance']
+        model.n_obs = state['n_obs']
+        if state['last_date']:
+            model.last_date = pd.Timestamp(state['last_date']).date()
+        model.warmup = [(pd.Timestamp(date).date(), y) for date, y in state['warmup']]
+        model.recent_errors = list(state.get('recent_errors', []))
+        model.history = [(pd.Timestamp(date).date(), y) for date, y in state['history']]
+        if state['base']:
+            model.base = cls.from_dict(state['base'])
+        model.archive = [(pd.Timestamp(date).date(), y) for date, y in state['archive']]
+        
+        return model
+
+
+
+class HourlyProfileForecaster:
+    """Spread a daily forecast over hours using hour-of-week profiles.
+
+    fit() builds an (appliance x weekday x hour) matrix of each slot's share
+    of the daily total plus per-slot residual quantiles; predict() scales it
+    by the daily forecast. Everything is array arithmetic, so all 168 weekly
+    slots for all appliances are produced at once.
+    """
+    HOURS_PER_DAY = 24
+    DAYS_PER_WEEK = 7
+    
+    def __init__(self, interval_quantiles=(0.1, 0.9)):
+        self.interval_quantiles = interval_quantiles
+        self.appliances = None
+        self.profile = None
+        self.residual_bounds = None
+    
+    def fit(self, processed_df):
+        """Learn hour-of-week profiles and residual quantiles from hourly data"""
+        codes, appliances = pd.factorize(processed_df['appliance'], sort=True)
+        days = processed_df['timestamp'].dt.normalize()
+        
+        # Align the day axis to a Monday so it reshapes into whole weeks
+        start = days.min() - pd.Timedelta(days=days.min().dayofweek)
+        day_index = (days - start).dt.days.to_numpy()
+        n_weeks = day_index.max() // self.DAYS_PER_WEEK + 1
+        n_days = n_weeks * self.DAYS_PER_WEEK
+        
+        cube = np.zeros((len(appliances), n_days, self.HOURS_PER_DAY))
+        np.add.at(cube, (codes, day_index, processed_df['hour'].to_numpy()), processed_df['kwh'].to_numpy(dtype=float))
+        
+        daily_total = cube.sum(axis=(0, 2))
+        observed = np.zeros(n_days, dtype=bool)
+        observed[day_index] = True
+        valid = (observed & (daily_total > 0))[None, :, None]
+        
+        weekly_shape = (len(appliances), n_weeks, self.DAYS_PER_WEEK, self.HOURS_PER_DAY)
+        
+        # Empty slices (unobserved weekdays) are expected and filled below
+        with np.errstate(invalid='ignore', divide='ignore'), warnings.catch_warnings():
+            warnings.simplefilter('ignore', category=RuntimeWarning)
+            
+            share = np.where(valid, cube / daily_total[None, :, None], np.nan).reshape(weekly_shape)
+            profile = np.nanmean(share, axis=1)
+            
+            # Weekdays never observed fall back to the all-days profile
+            profile = np.where(np.isnan(profile), np.nanmean(profile, axis=1, keepdims=True), profile)
+            profile = np.nan_to_num(profile)
+            
+            fitted = daily_total.reshape(n_weeks, self.DAYS_PER_WEEK)[None, :, :, None] * profile[:, None, :, :]
+            residuals = np.where(np.isnan(share), np.nan, cube.reshape(weekly_shape) - fitted)
+            bounds = np.nanquantile(residuals, self.interval_quantiles, axis=1)
+        
+        self.appliances = list(appliances)
+        self.profile = profile
+        self.residual_bounds = np.nan_to_num(bounds)
+        
+        return self
+    
+    def predict(self, forecast_df):
+        """Hourly forecast per appliance from a daily forecast"""
+        if self.profile is None:
+            raise ValueError("Hourly forecaster must be fitted before predict()")
+        
+        days = pd.to_datetime(forecast_df['ds']).dt.normalize().to_numpy()
+        weekdays = pd.DatetimeIndex(days).dayofweek.to_numpy()
+        daily_yhat = forecast_df['yhat'].to_numpy(dtype=float)
+        
+        # (appliance, day, hour) arrays for every forecast slot
+        yhat = daily_yhat[None, :, None] * self.profile[:, weekdays, :]
+        lower = np.maximum(yhat + self.residual_bounds[0][:, weekdays, :], 0)
+        upper = yhat + self.residual_bounds[1][:, weekdays, :]
+        
+        n_appliances, n_days, n_hours = yhat.shape
+        hours = np.arange(n_hours) * np.timedelta64(1, 'h')
+        timestamps = (days[:, None] + hours[None, :]).ravel()
+        
+        return pd.DataFrame({
+            'ds': np.tile(timestamps, n_appliances),
+            'appliance': np.repeat(self.appliances, n_days * n_hours),
+            'yhat': yhat.ravel(),
+            'yhat_lower': lower.ravel(),
+            'yhat_upper': upper.ravel()
+        })
@@ -1,11 +1,51 @@
 """GenAI modules for energy insights and recommendations"""
 import json
 import os
+import time
+import logging
+from collections import deque
+from functools import partial
+
+from resilience import get_circuit_breaker, CircuitOpenError
+from hedging import HedgeDeadlineExceeded
+from rate_limiter import RateLimitExceeded
+from prompt_context import CompactContextBuilder, estimate_tokens
+from report_templates import render_rule_based_insights, render_audit_text
+
+logger = logging.getLogger()
+
+OPENAI_MODEL = "gpt-3.5-turbo"
+BEDROCK_MODEL_ID = 'anthropic.claude-3-sonnet-20240229-v1:0'
+MAX_COMPLETION_TOKENS = 500
+# Batched prompts: prompt size limit and completion allowance per item
+MAX_BATCH_PROMPT_TOKENS = 6000
+BATCH_ITEM_COMPLETION_TOKENS = 350
+MAX_BATCH_COMPLETION_TOKENS = 4000
+
 
 class EnergyInsightsAssistant:
-    def __init__(self, use_bedrock=False):
+    def __init__(self, use_bedrock=False, cache=None, deadline=None,
+                 breaker_failure_threshold=3, breaker_cooldown_seconds=120, hedge=None,
+                 rate_limiters=None, context_token_budget=None, telemetry=None):
         self.use_bedrock = use_bedrock
         self.openai_api_key = os.environ.get('OPENAI_API_KEY', '')
+        # Optional InsightsCache shared across invocations of a warm container
+        self.cache = cache
+        # Optional CallDeadline bounding each provider call
+        self.deadline = deadline
+        self.breaker_failure_threshold = breaker_failure_threshold
+        self.breaker_cooldown_seconds = breaker_cooldown_seconds
+        # Optional HedgedRequest racing OpenAI and Bedrock when both are configured
+        self.hedge = hedge
+        # Optional provider -> TokenBucketRateLimiter shared across concurrent invocations
+        self.rate_limiters = rate_limiters or {}
+        # With a token budget, provider prompts carry a ranked compact context instead of the full
+        # listing; rule-based fallbacks still read the full context
+        self.context_builder = CompactContextBuilder(context_token_budget) if context_token_budget else None
+        # Optional LLMTelemetry recording every provider call and request outcome
+        self.telemetry = telemetry
+        # Outcome of the last generation, for run metrics
+        self.metrics = {}
     
     def generate_insights(self, analytics_data):
         """Generate professional energy insights summary"""
@@ -21,16 +61,324 @@ class EnergyInsightsAssistant:
             appliance_stats, forecast_summary
         )
         
-        # Generate insights using available AI service
-        if self.openai_api_key:
-            insights = self._generate_with_openai(context)
-        elif self.use_bedrock:
-            insights = self._generate_with_bedrock(context)
-        else:
-            insights = self._generate_rule_based(context)
+        prompt_context = self.context_builder.build(analytics_data) if self.context_builder is not None else None
+        return self.generate_from_context(context, prompt_context)
+    
+    def generate_from_context(self, context, prompt_context=None):
+        """Generate insights for an already rendered context; prompt_context, if given, replaces it in the prompt"""
+        start = time.time()
+        insights = self._generate_from_context(context, prompt_context or context)
+        
+        if self.telemetry is not None:
+            self.telemetry.record_request(
+                'single',
+                self.metrics.get('provider'),
+                self.metrics.get('model'),
+                self.metrics.get('outcome'),
+                time.time() - start,
+                fallback_reason=self.metrics.get('fallback_reason'),
+                # A single request is never retried; a hedge is a concurrent backup call
+                hedged=bool(self.metrics.get('hedged'))
+            )
+        return insights
+    
+    def _generate_from_context(self, context, prompt_context):
+        """Cache lookup, provider call and fallback for one context"""
+        # Generate insights using available AI service; hedging races the next provider too
+        providers = self._available_providers()
+        if self.hedge is None:
+            providers = providers[:1]
+        
+        provider, model = providers[0] if providers else (None, None)
+        self.metrics = {'provider': provider, 'model': model}
+        if provider is None:
+            return self._fallback(context, 'no_provider')
+        
+        if self.cache is not None:
+            for index, (provider, model) in enumerate(providers):
+                # One lookup per request counts as a miss, however many providers are tried
+                cached = self.cache.get(
+                    self.cache.make_key(prompt_context, provider, model),
+                    count_miss=index == len(providers) - 1
+                )
+                if cached is not None:
+                    self.metrics.update({'provider': provider, 'model': model, 'outcome': 'cache'})
+                    return cached
+        
+        # Not worth starting a call that cannot finish in the remaining time
+        timeout = self.deadline.call_timeout() if self.deadline else None
+        if self.deadline and timeout is None:
+            return self._fallback(context, 'deadline')
+        
+        prompt = self._build_prompt(prompt_context)
+        start = time.time()
+        try:
+            if len(providers) > 1:
+                provider, insights, hedged = self.hedge.run(
+                    [(name, partial(self._call_provider, name, prompt, timeout)) for name, _ in providers],
+                    deadline_seconds=timeout
+                )
+                self.metrics['hedged'] = hedged
+            else:
+                provider = providers[0][0]
+                insights = self._call_provider(provider, prompt, timeout)
+        except CircuitOpenError:
+            return self._fallback(context, 'circuit_open')
+        except RateLimitExceeded:
+            return self._fallback(context, 'rate_limited')
+        except HedgeDeadlineExceeded:
+            return self._fallback(context, 'deadline')
+        except Exception as e:
+            self.metrics['latency_seconds'] = time.time() - start
+            logger.warning(f"{provider} insights call failed: {type(e).__name__}: {str(e)}")
+            return self._fallback(context, f"error:{type(e).__name__}")
+        
+        latency = time.time() - start
+        model = dict(providers)[provider]
+        self.metrics.update({
+            'provider': provider,
+            'model': model,
+            'outcome': 'llm',
+            'latency_seconds': latency,
+            'timeout_seconds': timeout
+        })
+        
+        if self.cache is not None:
+            cache_key = self.cache.make_key(prompt_context, provider, model)
+            self.cache.put(cache_key, insights, latency, provider=provider, model=model)
+        return insights
+    
+    def generate_batch(self, contexts, max_batch_size=8, max_prompt_tokens=MAX_BATCH_PROMPT_TOKENS, max_retries=1):
+        """Insights for several contexts (str id -> context) with one provider call per batch.
+
+        Contexts are packed into prompts within max_prompt_tokens and the model
+        answers with a JSON array. Items missing from a response are re-batched
+        up to max_retries times; anything still unanswered gets rule-based text.
+        """
+        batch_start = time.time()
+        provider, model = (self._available_providers() or [(None, None)])[0]
+        metrics = {
+            'provider': provider,
+            'model': model,
+            'outcome': 'batch',
+            'items': len(contexts),
+            'cache_hits': 0,
+            'llm_items': 0,
+            'batches': 0,
+            'retried_items': 0
+        }
+        results = {}
+        
+        if provider is None:
+            metrics['fallback_reason'] = 'no_provider'
+        elif self.cache is not None:
+            for item_id, context in contexts.items():
+                cached = self.cache.get(self.cache.make_key(context, provider, model))
+                if cached is not None:
+                    results[item_id] = cached
+                    metrics['cache_hits'] += 1
+        
+        pending = [item_id for item_id in contexts if item_id not in results] if provider else []
+        batches = deque(
+            (batch, 0) for batch in self._pack_batches(pending, contexts, max_batch_size, max_prompt_tokens)
+        )
+        
+        while batches:
+            batch, attempt = batches.popleft()
+            
+            timeout = self.deadline.call_timeout() if self.deadline else None
+            if self.deadline and timeout is None:
+                metrics['fallback_reason'] = 'deadline'
+                break
+            
+            start = time.time()
+            try:
+                answered = self._request_batch(provider, batch, contexts, timeout)
+            except CircuitOpenError:
+                metrics['fallback_reason'] = 'circuit_open'
+                break
+            except RateLimitExceeded:
+                metrics['fallback_reason'] = 'rate_limited'
+                break
+            except Exception as e:
+                logger.warning(f"{provider} batch call failed: {type(e).__name__}: {str(e)}")
+                answered = {}
+            
+            metrics['batches'] += 1
+            metrics['llm_items'] += len(answered)
+            latency = time.time() - start
+            for item_id, insights in answered.items():
+                results[item_id] = insights
+                if self.cache is not None:
+                    cache_key = self.cache.make_key(contexts[item_id], provider, model)
+                    self.cache.put(cache_key, insights, latency / len(batch), provider=provider, model=model)
+            
+            failed = [item_id for item_id in batch if item_id not in answered]
+            if failed and attempt < max_retries:
+                metrics['retried_items'] += len(failed)
+                batches.extend(
+                    (retry, attempt + 1)
+                    for retry in self._pack_batches(failed, contexts, max_batch_size, max_prompt_tokens)
+                )
+        
+        unanswered = [item_id for item_id in contexts if item_id not in results]
+        for item_id in unanswered:
+            results[item_id] = self._generate_rule_based(contexts[item_id])
+        metrics['fallback_items'] = len(unanswered)
+        
+        self.metrics = metrics
+        if self.telemetry is not None:
+            self.telemetry.record_request(
+                'batch',
+                provider,
+                model,
+                'rule_based' if unanswered else 'batch',
+                time.time() - batch_start,
+                fallback_reason=metrics.get('fallback_reason') or ('unanswered' if unanswered else None),
+                retries=metrics['retried_items'],
+                items=len(contexts)
+            )
+        return {item_id: results[item_id] for item_id in contexts}
+    
+    def _pack_batches(self, item_ids, contexts, max_batch_size, max_prompt_tokens):
+        """Greedily group items into batches that fit the prompt token budget"""
+        base_tokens = estimate_tokens(self._build_batch_prompt([], contexts))
+        batches = []
+        batch, batch_tokens = [], base_tokens
+        
+        for item_id in item_ids:
+            item_tokens = estimate_tokens(self._batch_section(item_id, contexts[item_id]))
+            if batch and (len(batch) >= max_batch_size or batch_tokens + item_tokens > max_prompt_tokens):
+                batches.append(batch)
+                batch, batch_tokens = [], base_tokens
+            batch.append(item_id)
+            batch_tokens += item_tokens
+        
+        if batch:
+            batches.append(batch)
+        return batches
+    
+    def _request_batch(self, provider, batch, contexts, timeout):
+        """Send one batch prompt; returns id -> insights for the items the model answered"""
+        prompt = self._build_batch_prompt(batch, contexts)
+        max_tokens = min(MAX_BATCH_COMPLETION_TOKENS, BATCH_ITEM_COMPLETION_TOKENS * len(batch))
+        response = self._call_provider(provider, prompt, timeout, max_tokens)
+        return self._parse_batch_response(response, batch)
+    
+    def _batch_section(self, item_id, context):
+        """One item's context inside a batch prompt"""
+        return f"### ID: {item_id}\n{context.strip()}\n"
+    
+    def _build_batch_prompt(self, batch, contexts):
+        """Build a prompt asking for a JSON array with one narrative per item"""
+        sections = "\n".join(self._batch_section(item_id, contexts[item_id]) for item_id in batch)
+        return f"""Based on the energy usage profiles below, provide a professional summary with behavioral recommendations for each one.
+
+For each profile provide:
+1. Key insights about consumption patterns
+2. Behavioral recommendations to reduce energy usage
+3. Cost-saving opportunities
+
+Respond with only a JSON array holding one object per profile, in the same order:
+[{{"id": "<ID>", "insights": "<text>"}}]
+
+{sections}"""
+    
+    def _parse_batch_response(self, response, batch):
+        """Split a JSON array response into id -> insights, skipping malformed items"""
+        start, end = response.find('['), response.rfind(']')
+        if start < 0 or end < start:
+            return {}
+        
+        try:
+            items = json.loads(response[start:end + 1])
+        except ValueError:
+            return {}
+        
+        answered = {}
+        for item in items if isinstance(items, list) else []:
+            if not isinstance(item, dict):
+                continue
+            item_id = str(item.get('id', ''))
+            insights = item.get('insights')
+            if item_id in batch and isinstance(insights, str) and insights.strip():
+                answered[item_id] = insights.strip()
+        
+        return answered
+    
+    def _call_provider(self, provider, prompt, timeout, max_tokens=MAX_COMPLETION_TOKENS):
+        """Call a provider through its rate limiter and circuit breaker"""
+        breaker = get_circuit_breaker(
+            provider, self.breaker_failure_threshold, self.breaker_cooldown_seconds
+        )
+        # Don't spend rate-limit capacity on a provider that is known to be down
+        if breaker.state == breaker.OPEN:
+            raise CircuitOpenError(provider)
+        
+        limiter = self.rate_limiters.get(provider)
+        if limiter is None:
+            return self._call_through_breaker(breaker, provider, prompt, timeout, max_tokens)
+        
+        # Time spent queueing for capacity comes out of the call's own budget
+        tokens = estimate_tokens(prompt) + max_tokens
+        start = time.monotonic()
+        with limiter.acquire(tokens, max_wait_seconds=timeout):
+            if timeout is not None:
+                timeout -= time.monotonic() - start
+                if timeout <= 0:
+                    # Capacity came too late to make the call; shed it like an over-budget wait
+                    raise RateLimitExceeded(f"{provider}: no time left after waiting for capacity")
+            return self._call_through_breaker(breaker, provider, prompt, timeout, max_tokens)
+    
+    def _call_through_breaker(self, breaker, provider, prompt, timeout, max_tokens):
+        """Call a provider, recording the outcome on its breaker"""
+        if not breaker.allow_request():
+            raise CircuitOpenError(provider)
+        
+        start = time.time()
+        try:
+            insights, usage = self._request(provider, prompt, timeout, max_tokens)
+        except Exception as e:
+            breaker.record_failure()
+            self._record_call(provider, time.time() - start, estimate_tokens(prompt), None, type(e).__name__)
+            raise
         
+        breaker.record_success()
+        self._record_call(
+            provider,
+            time.time() - start,
+            usage.get('prompt_tokens') or estimate_tokens(prompt),
+            usage.get('response_tokens') or estimate_tokens(insights)
+        )
         return insights
     
+    def _record_call(self, provider, latency_seconds, prompt_tokens, response_tokens, error=None):
+        """Report one provider round trip to telemetry"""
+        if self.telemetry is None:
+            return
+        model = dict(self._available_providers()).get(provider)
+        self.telemetry.record_call(provider, model, latency_seconds, prompt_tokens, response_tokens, error)
+    
+    def _fallback(self, context, reason):
+        """Rule-based insights, recording why the provider was not used"""
+        self.metrics.update({'outcome': 'rule_based', 'fallback_reason': reason})
+        return self._generate_rule_based(context)
+    
+    def _available_providers(self):
+        """Configured (provider, model) pairs in order of preference"""
+        providers = []
+        if self.openai_api_key:
+            providers.append(('openai', OPENAI_MODEL))
+        if self.use_bedrock:
+            providers.append(('bedrock', BEDROCK_MODEL_ID))
+        return providers
+    
+    def _request(self, provider, prompt, timeout=None, max_tokens=MAX_COMPLETION_TOKENS):
+        """Call a provider; returns (text, token usage), raising on failure or timeout"""
+        if provider == 'openai':
+            return self._request_openai(prompt, timeout, max_tokens)
+        return self._request_bedrock(prompt, timeout, max_tokens)
+    
     def _build_context(self, total_usage, peak_hours, anomaly_count, appliance_stats, forecast_summary):
         """Build context string for AI"""
         context = f"""
@@ -56,157 +404,91 @@ Peak Consumption Hours:
         
         return context
     
-    def _generate_with_openai(self, context):
-        """Generate insights using OpenAI API"""
-        try:
-            import openai
-            openai.api_key = self.openai_api_key
-            
-            prompt = f"""Based on the following energy usage data, provide a professional summary with behavioral recommendations:
-
-{context}
-
-Provide:
-1. Key insights about consumption patterns
-2. Behavioral recommendations to reduce energy usage
-3. Cost-saving opportunities
-"""
-            
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are an energy efficiency expert."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=500,
-                temperature=0.7
-            )
-            
-            return response.choices[0].message.content
-            
-        except Exception as e:
-            return self._generate_rule_based(context)
-    
-    def _generate_with_bedrock(self, context):
-        """Generate insights using AWS Bedrock"""
-        try:
-            import boto3
-            
-            bedrock = boto3.client('bedrock-runtime', region_name=os.environ.get('AWS_REGION', 'us-east-1'))
-            
-            prompt = f"""Based on the following energy usage data, provide a professional summary with behavioral recommendations:
-
-{context}
+    def _build_prompt(self, context):
+        """Build the insights prompt for a context"""
+        # Fixed instructions first and data last, so providers can cache the shared prefix
+        return f"""Based on the energy usage data below, provide a professional summary with behavioral recommendations.
 
 Provide:
 1. Key insights about consumption patterns
 2. Behavioral recommendations to reduce energy usage
 3. Cost-saving opportunities
-"""
-            
-            body = json.dumps({
-                "anthropic_version": "bedrock-2023-05-31",
-                "max_tokens": 500,
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ]
-            })
-            
-            response = bedrock.invoke_model(
-                modelId='anthropic.claude-3-sonnet-20240229-v1:0',
-                body=body
-            )
-            
-            response_body = json.loads(response['body'].read())
-            return response_body['content'][0]['text']
-            
-        except Exception as e:
-            return self._generate_rule_based(context)
-    
-    def _generate_rule_based(self, context):
-        """Generate insights using rule-based approach"""
-        insights = f"""
-ENERGY USAGE INSIGHTS REPORT
-{'='*50}
-
-{context}
-
-KEY INSIGHTS:
-• Your energy consumption shows typical residential patterns with peak usage during evening hours
-• Anomalies detected suggest occasional high-consumption events that warrant investigation
-• Consistent monitoring can help identify opportunities for optimization
 
-BEHAVIORAL RECOMMENDATIONS:
-1. Shift high-energy activities away from peak hours (6 PM - 9 PM) when possible
-2. Review anomalous consumption events to identify and eliminate energy waste
-3. Consider implementing smart scheduling for major appliances
-4. Maintain regular appliance maintenance to ensure optimal efficiency
-5. Monitor standby power consumption and use power strips to eliminate phantom loads
-
-COST-SAVING OPPORTUNITIES:
-• Optimize thermostat settings during peak and off-peak hours
-• Utilize natural lighting and ventilation when weather permits
-• Consider time-of-use electricity plans if available in your area
-• Implement energy-efficient practices during high-consumption periods
-"""
-        return insights
-
-
-class VirtualEnergyAuditor:
-    def __init__(self):
-        pass
+{context}"""
     
-    def generate_audit_report(self, appliance_stats):
-        """Generate appliance upgrade recommendations"""
-        if not appliance_stats:
-            return "No appliance data available for audit."
+    def _request_openai(self, prompt, timeout=None, max_tokens=MAX_COMPLETION_TOKENS):
+        """Send a prompt to OpenAI and return the completion text and token usage"""
+        import openai
+        openai.api_key = self.openai_api_key
         
-        # Find highest consuming appliance
-        highest = max(appliance_stats, key=lambda x: x.get('total_kwh', 0))
-        
-        total_consumption = sum(stat.get('total_kwh', 0) for stat in appliance_stats)
+        response = openai.ChatCompletion.create(
+            model=OPENAI_MODEL,
+            messages=[
+                {"role": "system", "content": "You are an energy efficiency expert."},
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=max_tokens,
+            temperature=0.7,
+            request_timeout=timeout
+        )
         
-        report = f"""
-VIRTUAL ENERGY AUDITOR REPORT
-{'='*50}
-
-CONSUMPTION ANALYSIS:
-Total Energy Consumption: {total_consumption:.2f} kWh (30 days)
-
-Appliance Breakdown:
-"""
+        usage = response.get('usage', {})
+        return response.choices[0].message.content, {
+            'prompt_tokens': usage.get('prompt_tokens'),
+            'response_tokens': usage.get('completion_tokens')
+        }
+    
+    def _request_bedrock(self, prompt, timeout=None, max_tokens=MAX_COMPLETION_TOKENS):
+        """Send a prompt to Bedrock and return the completion text and token usage"""
+        import boto3
+        from botocore.config import Config
         
-        for stat in sorted(appliance_stats, key=lambda x: x.get('total_kwh', 0), reverse=True):
-            appliance = stat.get('appliance', 'Unknown')
-            total = stat.get('total_kwh', 0)
-            percentage = (total / total_consumption * 100) if total_consumption > 0 else 0
-            peak_hour = stat.get('peak_hour', 'N/A')
-            
-            report += f"\n{appliance}:\n"
-            report += f"  • Consumption: {total:.2f} kWh ({percentage:.1f}% of total)\n"
-            report += f"  • Peak Usage: Hour {peak_hour}\n"
+        config = None
+        if timeout is not None:
+            # No SDK retries: a retry would silently exceed the call deadline
+            config = Config(
+                connect_timeout=min(timeout, 5),
+                read_timeout=timeout,
+                retries={'max_attempts': 1, 'mode': 'standard'}
+            )
         
-        report += f"\n\nHIGHEST CONSUMER: {highest.get('appliance', 'Unknown')}\n"
-        report += f"Accounts for {(highest.get('total_kwh', 0)/total_consumption*100):.1f}% of total consumption\n"
+        bedrock = boto3.client(
+            'bedrock-runtime',
+            region_name=os.environ.get('AWS_REGION', 'us-east-1'),
+            config=config
+        )
         
-        report += "\n\nUPGRADE RECOMMENDATIONS:\n"
-        report += self._get_recommendations(highest.get('appliance', ''))
+        body = json.dumps({
+            "anthropic_version": "bedrock-2023-05-31",
+            "max_tokens": max_tokens,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ]
+        })
         
-        report += "\n\nESTIMATED SAVINGS:\n"
-        report += "• Upgrading to energy-efficient appliances: 20-40% reduction\n"
-        report += "• Smart thermostat installation: 10-15% reduction on HVAC\n"
-        report += "• LED lighting conversion: 75% reduction on lighting costs\n"
-        report += f"• Potential annual savings: ${(total_consumption * 0.12 * 0.25 * 12):.2f} (estimated)\n"
+        response = bedrock.invoke_model(
+            modelId=BEDROCK_MODEL_ID,
+            body=body
+        )
         
-        return report
+        response_body = json.loads(response['body'].read())
+        usage = response_body.get('usage', {})
+        return response_body['content'][0]['text'], {
+            'prompt_tokens': usage.get('input_tokens'),
+            'response_tokens': usage.get('output_tokens')
+        }
     
-    def _get_recommendations(self, appliance):
-        """Get specific recommendations for appliance"""
-        recommendations = {
-            'AC': """
+    def _generate_rule_based(self, context):
+        """Generate insights using rule-based approach"""
+        return render_rule_based_insights(context)
+
+
+# Upgrade recommendations per appliance, built once rather than on every audit
+APPLIANCE_RECOMMENDATIONS = {
+    'AC': """
 1. Inverter AC Upgrade (5-Star Rated)
    • Energy savings: 30-40% compared to conventional AC
    • Features: Variable speed compressor, smart temperature control
@@ -222,7 +504,7 @@ Appliance Breakdown:
    • Annual professional servicing
    • Seal room properly to prevent cool air loss
 """,
-            'Refrigerator': """
+    'Refrigerator': """
 1. Energy Star Certified Refrigerator
    • 15-20% more efficient than standard models
    • Features: Improved insulation, efficient compressors
@@ -234,7 +516,7 @@ Appliance Breakdown:
    • Ensure door seals are tight
    • Avoid placing near heat sources
 """,
-            'Heater': """
+    'Heater': """
 1. Energy-Efficient Space Heater
    • Ceramic or infrared heaters with thermostats
    • 25-30% more efficient than traditional heaters
@@ -249,7 +531,7 @@ Appliance Breakdown:
    • Heat pump systems (3x more efficient)
    • Radiant floor heating for specific areas
 """,
-            'Washing Machine': """
+    'Washing Machine': """
 1. Front-Load Energy Star Washer
    • Uses 25% less energy and 33% less water
    • Features: High-efficiency motors, advanced wash cycles
@@ -261,12 +543,57 @@ Appliance Breakdown:
    • Use high-speed spin to reduce dryer time
    • Consider air-drying when feasible
 """
-        }
-        
-        return recommendations.get(appliance, """
+}
+
+GENERAL_RECOMMENDATIONS = """
 General Recommendations:
 • Look for Energy Star certified replacements
 • Consider smart appliances with energy monitoring
 • Implement usage scheduling during off-peak hours
 • Regular maintenance to ensure optimal performance
-""")
+"""
+
+
+class VirtualEnergyAuditor:
+    def __init__(self):
+        pass
+    
+    def generate_audit_report(self, appliance_stats):
+        """Generate appliance upgrade recommendations"""
+        return render_audit_text(self.audit(appliance_stats))
+    
+    def audit(self, appliance_stats):
+        """Audit model for the report templates, or None without appliance data"""
+        if not appliance_stats:
+            return None
+        
+        # Find highest consuming appliance
+        highest = max(appliance_stats, key=lambda x: x.get('total_kwh', 0))
+        
+        total_consumption = sum(stat.get('total_kwh', 0) for stat in appliance_stats)
+        
+        def share(kwh):
+            return (kwh / total_consumption * 100) if total_consumption > 0 else 0
+        
+        return {
+            'total_kwh': total_consumption,
+            'appliances': [
+                {
+                    'appliance': stat.get('appliance', 'Unknown'),
+                    'total_kwh': stat.get('total_kwh', 0),
+                    'share_pct': share(stat.get('total_kwh', 0)),
+                    'peak_hour': stat.get('peak_hour', 'N/A')
+                }
+                for stat in sorted(appliance_stats, key=lambda x: x.get('total_kwh', 0), reverse=True)
+            ],
+            'highest': {
+                'appliance': highest.get('appliance', 'Unknown'),
+                'share_pct': share(highest.get('total_kwh', 0))
+            },
+            'recommendations': self._get_recommendations(highest.get('appliance', '')),
+            'annual_savings': total_consumption * 0.12 * 0.25 * 12
+        }
+    
+    def _get_recommendations(self, appliance):
+        """Get specific recommendations for appliance"""
+        return APPLIANCE_RECOMMENDATIONS.get(appliance, GENERAL_RECOMMENDATIONS)
@@ -0,0 +1,149 @@
+"""Hedged requests across interchangeable providers"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+class HedgeDeadlineExceeded(Exception):
+    """No provider answered before the hedge deadline"""
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies for one provider"""
+    
+    def __init__(self, window=200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+    
+    def record(self, seconds):
+        """Add a latency sample"""
+        with self._lock:
+            self._samples.append(seconds)
+    
+    def percentile(self, p, min_samples=5):
+        """p-th percentile latency, or None until enough samples exist"""
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < min_samples:
+            return None
+        
+        index = min(len(samples) - 1, int(round(p / 100 * (len(samples) - 1))))
+        return samples[index]
+
+
+class HedgedRequest:
+    """Send to the primary provider and hedge to the next one if it is slow.
+
+    The hedge fires once the primary has been outstanding for longer than
+    its observed hedge_percentile latency (default_hedge_delay until enough
+    samples exist), or immediately if the primary fails. Only launches
+    caused by the hedge delay count as hedges; launches after a failure
+    (including a call rejected by an open circuit) count as failovers. The
+    first successful answer wins; the others are abandoned. One instance is meant
+    to live for the container so latencies and stats accumulate.
+    """
+    
+    def __init__(self, hedge_percentile=90, default_hedge_delay=3.0, max_wait_seconds=30):
+        self.hedge_percentile = hedge_percentile
+        self.default_hedge_delay = default_hedge_delay
+        self.max_wait_seconds = max_wait_seconds
+        self._trackers = {}
+        self._lock = threading.Lock()
+        self._stats = {'requests': 0, 'hedged': 0, 'failovers': 0, 'deadline_exceeded': 0, 'failed': 0, 'wins': {}}
+    
+    def hedge_delay(self, provider):
+        """Seconds to wait on a provider before firing the next one"""
+        delay = self._tracker(provider).percentile(self.hedge_percentile)
+        return self.default_hedge_delay if delay is None else delay
+    
+    def run(self, calls, deadline_seconds=None):
+        """Run (provider, callable) pairs in preference order; returns (provider, result, hedged)"""
+        deadline = time.monotonic() + (self.max_wait_seconds if deadline_seconds is None else deadline_seconds)
+        pool = ThreadPoolExecutor(max_workers=len(calls))
+        pending = {}
+        launched = 0
+        hedged = False
+        hedge_at = None
+        last_error = None
+        
+        with self._lock:
+            self._stats['requests'] += 1
+        
+        try:
+            while pending or launched < len(calls):
+                now = time.monotonic()
+                if now >= deadline:
+                    with self._lock:
+                        self._stats['deadline_exceeded'] += 1
+                    raise HedgeDeadlineExceeded(f"No provider answered within {deadline_seconds}s")
+                
+                # Launch the next provider at start, on hedge timeout, or when everything in flight failed
+                if launched < len(calls) and (not pending or now >= hedge_at):
+                    if launched > 0:
+                        # Calls still in flight mean the hedge delay elapsed; none means they all failed
+                        with self._lock:
+                            if not pending:
+                                self._stats['failovers'] += 1
+                            elif not hedged:
+                                self._stats['hedged'] += 1
+                        hedged = hedged or bool(pending)
+                    provider, call = calls[launched]
+                    pending[pool.submit(self._timed_call, provider, call)] = provider
+                    launched += 1
+                    hedge_at = now + self.hedge_delay(provider)
+                    continue
+                
+                wait_until = deadline if launched == len(calls) else min(deadline, hedge_at)
+                done, _ = wait(pending, timeout=max(wait_until - now, 0), return_when=FIRST_COMPLETED)
+                
+                for future in done:
+                    provider = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        last_error = e
+                        continue
+                    
+                    with self._lock:
+                        self._stats['wins'][provider] = self._stats['wins'].get(provider, 0) + 1
+                    return provider, result, hedged
+            
+            with self._lock:
+                self._stats['failed'] += 1
+            raise last_error
+        finally:
+            # Losing calls cannot be interrupted; they finish under their own timeouts
+            for future in pending:
+                future.cancel()
+            pool.shutdown(wait=False, cancel_futures=True)
+    
+    def stats(self):
+        """Hedge and failover rates and per-provider win rates since the container started"""
+        with self._lock:
+            stats = dict(self._stats, wins=dict(self._stats['wins']))
+            providers = list(self._trackers)
+        
+        requests = stats['requests']
+        stats['hedge_rate'] = stats['hedged'] / requests if requests else 0.0
+        stats['failover_rate'] = stats['failovers'] / requests if requests else 0.0
+        stats['win_rate'] = {
+            provider: wins / requests for provider, wins in stats['wins'].items()
+        } if requests else {}
+        stats['hedge_delay_seconds'] = {provider: self.hedge_delay(provider) for provider in providers}
+        
+        return stats
+    
+    def _tracker(self, provider):
+        """Latency tracker for a provider, created on first use"""
+        with self._lock:
+            if provider not in self._trackers:
+                self._trackers[provider] = LatencyTracker()
+            return self._trackers[provider]
+    
+    def _timed_call(self, provider, call):
+        """Run a call, recording its latency when it succeeds"""
+        start = time.monotonic()
+        result = call()
+        self._tracker(provider).record(time.monotonic() - start)
+        return result
@@ -0,0 +1,172 @@
+"""Idempotency index that lets duplicate uploads and redelivered events reuse earlier results"""
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+
+from botocore.exceptions import ClientError
+
+IN_PROGRESS = 'in_progress'
+COMPLETED = 'completed'
+
+
+def make_config_version(settings):
+    """Short hash of the settings that change pipeline outputs"""
+    return hashlib.sha256(json.dumps(settings, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:12]
+
+
+def make_idempotency_key(content_hashes, config_version):
+    """Key for a batch of inputs, independent of object names and upload times"""
+    # Identical CSVs re-uploaded under another key hash the same; a config change does not
+    payload = '\n'.join(sorted(content_hashes)) + f"\n{config_version}"
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+
+class S3IdempotencyIndex:
+    """Claims and results as small JSON objects under an S3 prefix.
+
+    A claim is a conditional put (If-None-Match: *), so of several concurrent
+    duplicates exactly one runs. Expired claims (an invocation that died
+    mid-run) are taken over with If-Match on the claim's ETag.
+    """
+    
+    def __init__(self, s3_client, bucket, prefix='idempotency/'):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.prefix = prefix
+    
+    def claim(self, key, owner, lease_seconds):
+        """(status, record): 'claimed' to run, 'completed' or 'in_progress' for a duplicate"""
+        record = {'status': IN_PROGRESS, 'owner': owner, 'expires_at': time.time() + lease_seconds}
+        if self._put(key, record, IfNoneMatch='*'):
+            return 'claimed', record
+        
+        existing, etag = self._get(key)
+        if existing is None:
+            # Released between our put and get; one more attempt
+            return ('claimed', record) if self._put(key, record, IfNoneMatch='*') else (IN_PROGRESS, None)
+        if existing['status'] == COMPLETED:
+            return COMPLETED, existing
+        if existing['owner'] != owner and existing['expires_at'] > time.time():
+            return IN_PROGRESS, existing
+        
+        # Our own claim (a continuation renewing its lease) or an expired one
+        if self._put(key, record, IfMatch=etag):
+            return 'claimed', record
+        return IN_PROGRESS, existing
+    
+    def complete(self, key, owner, result):
+        """Record the result of a finished run"""
+        self.s3_client.put_object(
+            Bucket=self.bucket,
+            Key=f"{self.prefix}{key}.json",
+            Body=json.dumps({'status': COMPLETED, 'owner': owner, 'completed_at': time.time(), 'result': result}),
+            ContentType='application/json'
+        )
+    
+    def release(self, key, owner):
+        """Drop a claim after a failed run so a retry can run it"""
+        existing, _ = self._get(key)
+        if existing is not None and existing['status'] == IN_PROGRESS and existing['owner'] == owner:
+            self.s3_client.delete_object(Bucket=self.bucket, Key=f"{self.prefix}{key}.json")
+    
+    def _get(self, key):
+        """Record and ETag, or (None, None) if absent"""
+        try:
+            response = self.s3_client.get_object(Bucket=self.bucket, Key=f"{self.prefix}{key}.json")
+        except self.s3_client.exceptions.NoSuchKey:
+            return None, None
+        return json.loads(response['Body'].read()), response['ETag']
+    
+    def _put(self, key, record, **conditions):
+        """Conditional put; False when the precondition failed"""
+        try:
+            self.s3_client.put_object(
+                Bucket=self.bucket,
+                Key=f"{self.prefix}{key}.json",
+                Body=json.dumps(record),
+                ContentType='application/json',
+                **conditions
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('PreconditionFailed', 'ConditionalRequestConflict'):
+                return False
+            raise
+        return True
+
+
+class LocalDirectoryIdempotencyIndex:
+    """Claims and results as JSON files in a local directory (stand-in for S3 in tests)"""
+    
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+    
+    def claim(self, key, owner, lease_seconds):
+        """(status, record): 'claimed' to run, 'completed' or 'in_progress' for a duplicate"""
+        record = {'status': IN_PROGRESS, 'owner': owner, 'expires_at': time.time() + lease_seconds}
+        if self._create(key, record):
+            return 'claimed', record
+        
+        existing = self._read(key)
+        if existing is None:
+            return ('claimed', record) if self._create(key, record) else (IN_PROGRESS, None)
+        if existing['status'] == COMPLETED:
+            return COMPLETED, existing
+        if existing['owner'] != owner and existing['expires_at'] > time.time():
+            return IN_PROGRESS, existing
+        
+        # Move the stale claim aside; rename is atomic, so only one taker gets to re-create it
+        stale_path = f"{self._file(key)}.{uuid.uuid4().hex}.stale"
+        try:
+            os.rename(self._file(key), stale_path)
+        except FileNotFoundError:
+            return IN_PROGRESS, existing
+        os.remove(stale_path)
+        if self._create(key, record):
+            return 'claimed', record
+        return IN_PROGRESS, existing
+    
+    def complete(self, key, owner, result):
+        """Record the result of a finished run"""
+        file_path = self._file(key)
+        tmp_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'status': COMPLETED, 'owner': owner, 'completed_at': time.time(), 'result': result}, f)
+        os.replace(tmp_path, file_path)
+    
+    def release(self, key, owner):
+        """Drop a claim after a failed run so a retry can run it"""
+        existing = self._read(key)
+        if existing is not None and existing['status'] == IN_PROGRESS and existing['owner'] == owner:
+            try:
+                os.remove(self._file(key))
+            except FileNotFoundError:
+                pass
+    
+    def _file(self, key):
+        """Path of a key's record"""
+        return os.path.join(self.path, f"{key}.json")
+    
+    def _read(self, key):
+        """Record, or None if absent"""
+        try:
+            with open(self._file(key), 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            # Caught between exclusive create and write: a live claim
+            return {'status': IN_PROGRESS, 'owner': None, 'expires_at': float('inf')}
+    
+    def _create(self, key, record):
+        """Exclusive create (the local If-None-Match); False when the file exists"""
+        try:
+            fd = os.open(self._file(key), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, 'w') as f:
+            json.dump(record, f)
+        return True
@@ -0,0 +1,117 @@
+"""Queue-buffered ingestion: S3 event notifications drained in micro-batches"""
+import json
+import os
+import threading
+import time
+import uuid
+
+
+def is_queue_event(event):
+    """SQS event source mapping batches (records with eventSource aws:sqs)"""
+    records = event.get('Records') or []
+    return bool(records) and records[0].get('eventSource') == 'aws:sqs'
+
+
+def queue_event(messages):
+    """SQS-shaped event for (message_id, body) pairs, as the event source mapping delivers them"""
+    return {'Records': [
+        {'messageId': message_id, 'body': body, 'eventSource': 'aws:sqs'}
+        for message_id, body in messages
+    ]}
+
+
+def s3_notification(bucket, key, size=0, etag='', event_time=None):
+    """S3 ObjectCreated notification body for one object"""
+    return json.dumps({'Records': [{
+        'eventSource': 'aws:s3',
+        'eventName': 'ObjectCreated:Put',
+        'eventTime': event_time or time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.gmtime()),
+        's3': {'bucket': {'name': bucket}, 'object': {'key': key, 'size': size, 'eTag': etag}}
+    }]})
+
+
+def notification_bytes(body):
+    """Total object size named in a notification body; 0 for test events and unreadable bodies"""
+    try:
+        records = json.loads(body).get('Records', [])
+        return sum(record['s3']['object'].get('size', 0) for record in records)
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return 0
+
+
+class LocalDirectoryIngestQueue:
+    """Notification bodies as files in a local directory (stand-in for the SQS ingest queue).
+
+    Received messages stay in flight until deleted or released, like SQS
+    messages within their visibility timeout.
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+    
+    def send(self, body):
+        """Write a message file; returns its id"""
+        # Time-prefixed ids keep FIFO order; write then rename so consumers never see partial files
+        message_id = f"{time.time_ns()}-{uuid.uuid4().hex}"
+        file_path = os.path.join(self.path, f"{message_id}.msg")
+        tmp_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(body)
+        os.replace(tmp_path, file_path)
+        return message_id
+    
+    def receive(self, max_messages):
+        """Take up to max_messages of the oldest messages as (message_id, body) pairs"""
+        messages = []
+        for name in sorted(name for name in os.listdir(self.path) if name.endswith('.msg')):
+            if len(messages) >= max_messages:
+                break
+            
+            file_path = os.path.join(self.path, name)
+            try:
+                # Rename is atomic, so only one consumer receives each message
+                os.rename(file_path, f"{file_path}.inflight")
+            except FileNotFoundError:
+                continue
+            
+            with open(f"{file_path}.inflight", 'r') as f:
+                messages.append((name[:-len('.msg')], f.read()))
+        return messages
+    
+    def delete(self, message_id):
+        """Acknowledge a processed message"""
+        os.remove(os.path.join(self.path, f"{message_id}.msg.inflight"))
+    
+    def release(self, message_id):
+        """Return a failed message to the queue for another attempt"""
+        file_path = os.path.join(self.path, f"{message_id}.msg")
+        os.rename(f"{file_path}.inflight", file_path)
+
+
+def collect_batch(queue, max_messages=100, max_bytes=20 * 1024 * 1024, max_delay_seconds=30, poll_seconds=0.2):
+    """Receive messages until the batch is full or its first message has waited max_delay_seconds.
+
+    Returns an empty list when the queue is empty, so callers decide whether
+    to keep polling. Mirrors the BatchSize and MaximumBatchingWindowInSeconds
+    bounds of the SQS event source mapping, plus a bound on the bytes named
+    in the notifications.
+    """
+    messages = []
+    total_bytes = 0
+    first_received = None
+    
+    while len(messages) < max_messages and total_bytes < max_bytes:
+        received = queue.receive(max_messages - len(messages))
+        if received:
+            if first_received is None:
+                first_received = time.time()
+            messages.extend(received)
+            total_bytes += sum(notification_bytes(body) for _, body in received)
+            continue
+        
+        if first_received is None or time.time() - first_received >= max_delay_seconds:
+            break
+        time.sleep(min(poll_seconds, max(0.0, max_delay_seconds - (time.time() - first_received))))
+    
+    return messages
@@ -0,0 +1,102 @@
+"""Decoding of readings sent inline in a direct invocation"""
+import base64
+import binascii
+import gzip
+import io
+import json
+import zlib
+
+import pandas as pd
+
+ENCODINGS = ('gzip+base64', 'base64', 'none')
+FORMATS = ('csv', 'json')
+REQUIRED_COLUMNS = ('timestamp', 'appliance', 'kwh')
+
+
+class InlinePayloadError(ValueError):
+    """Raised when an inline request cannot be decoded; reported as a 400"""
+
+
+def decode_inline_data(request, max_bytes):
+    """Raw payload bytes after base64 and gzip decoding, capped at max_bytes"""
+    encoding = request.get('encoding', 'gzip+base64')
+    if encoding not in ENCODINGS:
+        raise InlinePayloadError(f"Unknown encoding: {encoding} (expected one of {', '.join(ENCODINGS)})")
+    
+    data = request.get('data')
+    if not isinstance(data, str):
+        raise InlinePayloadError("Inline request needs a 'data' string or a 'readings' list")
+    
+    if encoding == 'none':
+        raw = data.encode('utf-8')
+    else:
+        try:
+            raw = base64.b64decode(data, validate=True)
+        except binascii.Error as e:
+            raise InlinePayloadError(f"Invalid base64 data: {e}")
+    
+    if encoding.startswith('gzip'):
+        try:
+            # Bounded read so a small compressed payload cannot expand without limit
+            raw = gzip.GzipFile(fileobj=io.BytesIO(raw)).read(max_bytes + 1)
+        except (OSError, EOFError, zlib.error) as e:
+            raise InlinePayloadError(f"Invalid gzip data: {e}")
+    
+    if len(raw) > max_bytes:
+        raise InlinePayloadError(f"Inline data exceeds {max_bytes} bytes")
+    return raw
+
+
+def validate_readings(df):
+    """Reject frames missing a required column, with no rows, or with null or non-numeric values"""
+    missing = [column for column in REQUIRED_COLUMNS if column not in df.columns]
+    if missing:
+        raise InlinePayloadError(f"Readings are missing fields: {', '.join(missing)}")
+    if df.empty:
+        raise InlinePayloadError("Readings contain no rows")
+    
+    null_rows = df[list(REQUIRED_COLUMNS)].isna().any(axis=1)
+    if null_rows.any():
+        raise InlinePayloadError(
+            f"{int(null_rows.sum())} reading(s) have null {'/'.join(REQUIRED_COLUMNS)} values "
+            f"(first at row {int(null_rows.to_numpy().argmax())})"
+        )
+    if not pd.api.types.is_numeric_dtype(df['kwh']):
+        raise InlinePayloadError("Readings have non-numeric kwh values")
+    return df
+
+
+def parse_inline_request(processor, request, max_bytes):
+    """Parsed and validated readings DataFrame for an inline request"""
+    return validate_readings(_parse_inline_readings(processor, request, max_bytes))
+
+
+def _parse_inline_readings(processor, request, max_bytes):
+    """Readings DataFrame for an inline request, before validation"""
+    if 'readings' in request:
+        readings = request['readings']
+    else:
+        data_format = request.get('format', 'csv')
+        if data_format not in FORMATS:
+            raise InlinePayloadError(f"Unknown format: {data_format} (expected csv or json)")
+        
+        raw = decode_inline_data(request, max_bytes)
+        if data_format == 'csv':
+            try:
+                return processor.parse_data(raw.decode('utf-8'))
+            except (KeyError, ValueError, pd.errors.EmptyDataError) as e:
+                raise InlinePayloadError(f"Invalid CSV readings: {e}")
+        
+        try:
+            readings = json.loads(raw)
+        except ValueError as e:
+            raise InlinePayloadError(f"Invalid JSON readings: {e}")
+        if isinstance(readings, dict):
+            readings = readings.get('readings')
+    
+    if not isinstance(readings, list) or not readings:
+        raise InlinePayloadError("Readings must be a non-empty list of {timestamp, appliance, kwh}")
+    try:
+        return processor.parse_records(readings)
+    except (KeyError, ValueError, TypeError) as e:
+        raise InlinePayloadError(f"Invalid readings: {e}")
@@ -3,8 +3,15 @@ import json
 import boto3
 import os
 import logging
+import re
+import time
+import uuid
 from datetime import datetime
 from io import StringIO
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote_plus
+from botocore.exceptions import ClientError
+import numpy as np
 import pandas as pd
 
 # Configure logging
@@ -12,9 +19,30 @@ logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 # Import local modules
+# Forecasting, GenAI, fleet and warm-up modules are imported by the stages that
+# use them, so profiles that skip those stages never load their dependencies
 from processing import EnergyDataProcessor
-from forecasting import EnergyForecaster
-from genai_insights import EnergyInsightsAssistant, VirtualEnergyAuditor
+from llm_cache import InsightsCache, S3CacheStore, LocalDirectoryCacheStore
+from resilience import CallDeadline, circuit_breaker_snapshots
+from hedging import HedgedRequest
+from rate_limiter import TokenBucketRateLimiter, SQLiteRateLimitBackend, DynamoDBRateLimitBackend
+from report_jobs import LambdaReportQueue, LocalDirectoryReportQueue, json_default
+from telemetry import LLMTelemetry
+from report_templates import build_report_model, render_report
+from pipeline_dag import StageGraph, StagesSuspended
+from checkpoints import RunCheckpoint, S3CheckpointStore, LocalDirectoryCheckpointStore
+from alerts import AnomalyFastPath, compute_thresholds, merge_thresholds, S3AlertNotifier, LocalDirectoryAlertNotifier
+from inline_api import InlinePayloadError, parse_inline_request
+from warmup import is_warmup_event, process_started_at
+from pipeline_profiles import load_profiles, parse_prefix_map, ProfileResolver
+from run_context import RunContext, TABLE_OUTPUTS
+from ingest_queue import is_queue_event
+from idempotency import (
+    make_config_version, make_idempotency_key, S3IdempotencyIndex, LocalDirectoryIdempotencyIndex
+)
+
+# Container start, for cold-start init time in invocation logs
+CONTAINER_STARTED = process_started_at()
 
 # AWS clients
 s3_client = boto3.client('s3')
@@ -24,91 +52,1147 @@ BUCKET_NAME = os.environ.get('BUCKET_NAME')
 ATHENA_DATABASE = os.environ.get('ATHENA_DATABASE')
 AWS_REGION = os.environ.get('AWS_REGION', 'us-east-1')
 USE_BEDROCK = os.environ.get('USE_BEDROCK', 'false').lower() == 'true'
+FORECAST_ENGINE = os.environ.get('FORECAST_ENGINE', 'prophet')
+# Online forecaster state is kept per series (household, or upload folder) under this prefix
+FORECAST_STATE_PREFIX = os.environ.get('FORECAST_STATE_PREFIX', 'state/forecaster/')
+# Attempts at a conditional state update (forecaster state, anomaly thresholds) when a concurrent run won
+FORECAST_STATE_ATTEMPTS = int(os.environ.get('FORECAST_STATE_ATTEMPTS', '3'))
+ENSEMBLE_BUDGET_SECONDS = float(os.environ.get('ENSEMBLE_BUDGET_SECONDS', '30'))
+HOURLY_FORECAST = os.environ.get('HOURLY_FORECAST', 'false').lower() == 'true'
+FORECAST_QUANTILES = [float(q) for q in os.environ.get('FORECAST_QUANTILES', '').split(',') if q.strip()]
+MONTHLY_KWH_CAP = float(os.environ['MONTHLY_KWH_CAP']) if os.environ.get('MONTHLY_KWH_CAP') else None
+INSIGHTS_CACHE_TTL_SECONDS = int(os.environ.get('INSIGHTS_CACHE_TTL_SECONDS', '604800'))
+INSIGHTS_CACHE_DIR = os.environ.get('INSIGHTS_CACHE_DIR')
+INSIGHTS_RESERVE_SECONDS = float(os.environ.get('INSIGHTS_RESERVE_SECONDS', '15'))
+INSIGHTS_MAX_CALL_SECONDS = float(os.environ.get('INSIGHTS_MAX_CALL_SECONDS', '30'))
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get('BREAKER_FAILURE_THRESHOLD', '3'))
+BREAKER_COOLDOWN_SECONDS = float(os.environ.get('BREAKER_COOLDOWN_SECONDS', '120'))
+INSIGHTS_HEDGE = os.environ.get('INSIGHTS_HEDGE', 'false').lower() == 'true'
+HEDGE_PERCENTILE = float(os.environ.get('HEDGE_PERCENTILE', '90'))
+HEDGE_DEFAULT_DELAY_SECONDS = float(os.environ.get('HEDGE_DEFAULT_DELAY_SECONDS', '3'))
+RATE_LIMIT_TABLE = os.environ.get('RATE_LIMIT_TABLE')
+RATE_LIMIT_SQLITE_PATH = os.environ.get('RATE_LIMIT_SQLITE_PATH')
+RATE_LIMIT_MAX_WAIT_SECONDS = float(os.environ.get('RATE_LIMIT_MAX_WAIT_SECONDS', '10'))
+LLM_MAX_CONCURRENCY = int(os.environ.get('LLM_MAX_CONCURRENCY', '10'))
+OPENAI_RPM = int(os.environ.get('OPENAI_RPM', '60'))
+OPENAI_TPM = int(os.environ.get('OPENAI_TPM', '60000'))
+BEDROCK_RPM = int(os.environ.get('BEDROCK_RPM', '50'))
+BEDROCK_TPM = int(os.environ.get('BEDROCK_TPM', '200000'))
+INSIGHTS_CONTEXT_TOKENS = int(os.environ.get('INSIGHTS_CONTEXT_TOKENS', '400'))
+INSIGHTS_BATCH_SIZE = int(os.environ.get('INSIGHTS_BATCH_SIZE', '8'))
+REPORT_FORMATS = [f.strip() for f in os.environ.get('REPORT_FORMATS', 'text').split(',') if f.strip()]
+SMALL_FILE_BYTES = int(os.environ.get('SMALL_FILE_BYTES', str(5 * 1024 * 1024)))
+BATCH_MAX_BYTES = int(os.environ.get('BATCH_MAX_BYTES', str(20 * 1024 * 1024)))
+PIPELINE_MAX_WORKERS = int(os.environ.get('PIPELINE_MAX_WORKERS', '4'))
+PIPELINE_STAGE_WORKERS = int(os.environ.get('PIPELINE_STAGE_WORKERS', '4'))
+CHECKPOINTS = os.environ.get('CHECKPOINTS', 'true').lower() == 'true'
+CHECKPOINT_DIR = os.environ.get('CHECKPOINT_DIR')
+CONTINUATION_RESERVE_SECONDS = float(os.environ.get('CONTINUATION_RESERVE_SECONDS', '120'))
+CONTINUATION_QUEUE_DIR = os.environ.get('CONTINUATION_QUEUE_DIR')
+MAX_CONTINUATIONS = int(os.environ.get('MAX_CONTINUATIONS', '5'))
+IDEMPOTENCY = os.environ.get('IDEMPOTENCY', 'true').lower() == 'true'
+IDEMPOTENCY_DIR = os.environ.get('IDEMPOTENCY_DIR')
+IDEMPOTENCY_LEASE_SECONDS = float(os.environ.get('IDEMPOTENCY_LEASE_SECONDS', '900'))
+ANOMALY_ALERTS = os.environ.get('ANOMALY_ALERTS', 'true').lower() == 'true'
+ALERTS_DIR = os.environ.get('ALERTS_DIR')
+ALERT_MAX_EVENTS = int(os.environ.get('ALERT_MAX_EVENTS', '100'))
+ANOMALY_THRESHOLDS_KEY = os.environ.get('ANOMALY_THRESHOLDS_KEY', 'state/anomaly_thresholds.json')
+INLINE_FORECAST_ENGINE = os.environ.get('INLINE_FORECAST_ENGINE', 'seasonal_naive')
+INLINE_MAX_BYTES = int(os.environ.get('INLINE_MAX_BYTES', str(50 * 1024 * 1024)))
+INLINE_MAX_ANOMALIES = int(os.environ.get('INLINE_MAX_ANOMALIES', '100'))
+PIPELINE_PROFILES = os.environ.get('PIPELINE_PROFILES')
+PROFILE_PREFIXES = os.environ.get('PROFILE_PREFIXES', '')
+DEFAULT_PROFILE = os.environ.get('DEFAULT_PROFILE', 'full')
+PROFILE_FROM_METADATA = os.environ.get('PROFILE_FROM_METADATA', 'true').lower() == 'true'
+# Concurrent HEAD requests when reading profile metadata for an event's files
+METADATA_LOOKUP_WORKERS = int(os.environ.get('METADATA_LOOKUP_WORKERS', '16'))
+OUTPUT_LAYOUT = os.environ.get('OUTPUT_LAYOUT', 'run')
+REPORT_MODE = os.environ.get('REPORT_MODE', 'sync')
+REPORT_QUEUE_DIR = os.environ.get('REPORT_QUEUE_DIR')
+REPORT_FUNCTION_NAME = os.environ.get('REPORT_FUNCTION_NAME', os.environ.get('AWS_LAMBDA_FUNCTION_NAME'))
+
+# Bump when a code change alters pipeline outputs, so earlier results are not reused
+PIPELINE_VERSION = '1'
+PIPELINE_CONFIG_VERSION = make_config_version({
+    'pipeline_version': PIPELINE_VERSION,
+    'forecast_engine': FORECAST_ENGINE,
+    'hourly_forecast': HOURLY_FORECAST,
+    'forecast_quantiles': FORECAST_QUANTILES,
+    'monthly_kwh_cap': MONTHLY_KWH_CAP,
+    'use_bedrock': USE_BEDROCK,
+    'insights_context_tokens': INSIGHTS_CONTEXT_TOKENS,
+    'report_formats': REPORT_FORMATS,
+    'report_mode': REPORT_MODE,
+    # A duplicate reuses the earlier run's output keys, which depend on the layout
+    'output_layout': OUTPUT_LAYOUT
+})
+
+# Profiles are validated at init so a bad PIPELINE_PROFILES or PROFILE_PREFIXES fails the deploy, not an upload
+profile_resolver = ProfileResolver(load_profiles(PIPELINE_PROFILES), parse_prefix_map(PROFILE_PREFIXES), DEFAULT_PROFILE)
+
+# Insights cache lives at module level so warm containers reuse the memory tier
+if INSIGHTS_CACHE_DIR:
+    insights_cache_store = LocalDirectoryCacheStore(INSIGHTS_CACHE_DIR)
+elif BUCKET_NAME:
+    insights_cache_store = S3CacheStore(s3_client, BUCKET_NAME)
+else:
+    insights_cache_store = None
+insights_cache = InsightsCache(ttl_seconds=INSIGHTS_CACHE_TTL_SECONDS, store=insights_cache_store)
+
+# Hedging keeps provider latency history for the life of the container
+insights_hedge = HedgedRequest(
+    hedge_percentile=HEDGE_PERCENTILE,
+    default_hedge_delay=HEDGE_DEFAULT_DELAY_SECONDS,
+    max_wait_seconds=INSIGHTS_MAX_CALL_SECONDS
+) if INSIGHTS_HEDGE else None
+
+# Provider rate limits are coordinated across concurrent invocations through a shared table
+if RATE_LIMIT_TABLE:
+    rate_limit_backend = DynamoDBRateLimitBackend(RATE_LIMIT_TABLE, region_name=AWS_REGION)
+elif RATE_LIMIT_SQLITE_PATH:
+    rate_limit_backend = SQLiteRateLimitBackend(RATE_LIMIT_SQLITE_PATH)
+else:
+    rate_limit_backend = None
+insights_rate_limiters = {
+    provider: TokenBucketRateLimiter(
+        rate_limit_backend, provider,
+        requests_per_minute=rpm,
+        tokens_per_minute=tpm,
+        max_concurrency=LLM_MAX_CONCURRENCY,
+        max_wait_seconds=RATE_LIMIT_MAX_WAIT_SECONDS
+    )
+    for provider, rpm, tpm in (('openai', OPENAI_RPM, OPENAI_TPM), ('bedrock', BEDROCK_RPM, BEDROCK_TPM))
+} if rate_limit_backend else {}
+
+# Async report jobs go to another invocation of this function, or a local queue directory
+if REPORT_QUEUE_DIR:
+    report_queue = LocalDirectoryReportQueue(REPORT_QUEUE_DIR)
+elif REPORT_FUNCTION_NAME:
+    report_queue = LambdaReportQueue(boto3.client('lambda', region_name=AWS_REGION), REPORT_FUNCTION_NAME)
+else:
+    report_queue = None
+
+# A run cut short by the timeout checkpoints its finished stages and resumes where it stopped
+if not CHECKPOINTS:
+    checkpoint_store = None
+elif CHECKPOINT_DIR:
+    checkpoint_store = LocalDirectoryCheckpointStore(CHECKPOINT_DIR)
+elif BUCKET_NAME:
+    checkpoint_store = S3CheckpointStore(s3_client, BUCKET_NAME)
+else:
+    checkpoint_store = None
+
+# Duplicate uploads and redelivered events are answered from this index instead of re-run
+if not IDEMPOTENCY:
+    idempotency_index = None
+elif IDEMPOTENCY_DIR:
+    idempotency_index = LocalDirectoryIdempotencyIndex(IDEMPOTENCY_DIR)
+elif BUCKET_NAME:
+    idempotency_index = S3IdempotencyIndex(s3_client, BUCKET_NAME)
+else:
+    idempotency_index = None
+
+# Fast-path anomaly alerts go to alerts/ (or a local directory) before the heavy stages run
+if not ANOMALY_ALERTS:
+    alert_notifier = None
+elif ALERTS_DIR:
+    alert_notifier = LocalDirectoryAlertNotifier(ALERTS_DIR)
+elif BUCKET_NAME:
+    alert_notifier = S3AlertNotifier(s3_client, BUCKET_NAME)
+else:
+    alert_notifier = None
+
+# Runs close to the timeout continue in a fresh invocation, or a local queue directory
+if CONTINUATION_QUEUE_DIR:
+    continuation_queue = LocalDirectoryReportQueue(CONTINUATION_QUEUE_DIR)
+elif REPORT_FUNCTION_NAME:
+    continuation_queue = LambdaReportQueue(
+        boto3.client('lambda', region_name=AWS_REGION), REPORT_FUNCTION_NAME, event_key='continuation'
+    )
+else:
+    continuation_queue = None
+
+# Set by the first invocation this container serves
+container_state = {'invocations': 0, 'warmed': False, 'init_seconds': None}
 
 def lambda_handler(event, context):
     """Main Lambda handler triggered by S3 upload"""
+    start = time.time()
+    cold_start = container_state['invocations'] == 0
+    if cold_start:
+        container_state['init_seconds'] = round(start - CONTAINER_STARTED, 3)
+    container_state['invocations'] += 1
+    
+    # Scheduled warm-ups keep containers hot for latency-sensitive requests
+    if is_warmup_event(event):
+        response = handle_warmup(cold_start)
+        log_invocation('warmup', cold_start, start, response['statusCode'])
+        return response
+    
+    # Report jobs enqueued by an earlier run point at their analytics artifact
+    if 'report_job' in event:
+        return handle_report_job(event['report_job'], context)
+    # Continuations resume a run that was handed off before the timeout
+    if 'continuation' in event:
+        return handle_continuation(event['continuation'], context)
+    # Direct invocations with inline readings are answered in memory
+    if 'inline' in event:
+        response = handle_inline_request(event['inline'], context)
+        log_invocation('inline', cold_start, start, response['statusCode'])
+        return response
+    # Queue-buffered uploads arrive as SQS micro-batches of S3 notifications
+    if is_queue_event(event):
+        response = handle_queue_batch(event, context)
+        log_invocation('queue', cold_start, start, response['statusCode'])
+        return response
+    
     try:
         logger.info("Energy analytics pipeline started")
         logger.info(f"Event: {json.dumps(event)}")
         
-        # Extract S3 event details
-        s3_event = event['Records'][0]['s3']
-        bucket = s3_event['bucket']['name']
-        key = s3_event['object']['key']
+        # Extract S3 event details for every record, not just the first
+        records = parse_s3_records(event)
+        # A file naming an unknown profile fails alone; the rest of the event still runs
+        rejected = profile_failures(records)
+        records = [record for record in records if not record.get('profile_error')]
+        batches = plan_batches(records)
+        logger.info(f"Processing {len(records)} file(s) in {len(batches)} batch(es)")
         
-        logger.info(f"Processing file: s3://{bucket}/{key}")
+        results = run_batches(batches, context) + rejected
+        failed = [result for result in results if result['status'] == 'failed']
+        continued = [result for result in results if result['status'] == 'continued']
+        duplicates = [result for result in results if result['status'] == 'duplicate']
         
-        # Step 1: Read raw data from S3
-        raw_data = read_s3_file(bucket, key)
-        logger.info(f"Read {len(raw_data)} bytes from S3")
+        message = 'Energy analytics pipeline completed successfully'
+        if failed:
+            message = f"Energy analytics pipeline completed with {len(failed)} failed file(s)"
+        elif continued:
+            message = f"Energy analytics pipeline continuing {len(continued)} file(s) in a new invocation"
+        elif duplicates and len(duplicates) == len(results):
+            message = 'Energy analytics pipeline skipped duplicate input'
         
-        # Step 2: Process data
-        processor = EnergyDataProcessor(anomaly_threshold_sigma=2)
-        processed_results = processor.process_data(raw_data)
-        logger.info("Data processing completed")
+        body = {
+            'message': message,
+            'records': results,
+            'succeeded': len(results) - len(failed) - len(continued) - len(duplicates),
+            'failed': len(failed),
+            'continued': len(continued),
+            'duplicates': len(duplicates),
+            'timestamp': datetime.now().isoformat()
+        }
+        # Single-file events keep the original flat response fields
+        if len(results) == 1 and results[0]['status'] in ('succeeded', 'duplicate'):
+            body.update(results[0]['result'])
         
-        # Step 3: Save processed data
-        save_processed_data(processed_results)
-        logger.info("Processed data saved to S3")
+        # Return success response; partial failures are reported per record
+        return {
+            'statusCode': 500 if results and len(failed) == len(results) else 200,
+            'body': json.dumps(body)
+        }
         
-        # Step 4: Generate forecast
-        daily_df = processor.prepare_for_forecast(processed_results['processed_df'])
-        forecaster = EnergyForecaster(forecast_days=7)
-        forecast_df = forecaster.forecast(daily_df)
-        forecast_summary = forecaster.format_forecast_summary(forecast_df)
+    except Exception as e:
+        logger.error(f"Pipeline error: {str(e)}", exc_info=True)
+        return {
+            'statusCode': 500,
+            'body': json.dumps({
+                'message': 'Pipeline execution failed',
+                'error': str(e)
+            })
+        }
+
+def handle_queue_batch(event, context):
+    """Process the S3 notifications of an SQS batch as combined datasets; failed messages are retried"""
+    messages = {}
+    failed_messages = []
+    for message in event['Records']:
+        try:
+            body = json.loads(message['body'])
+            if body.get('Event') == 's3:TestEvent':
+                # Sent once when the bucket notification is configured
+                continue
+            records = parse_s3_records(body)
+        except Exception as e:
+            logger.error(f"Unreadable queue message {message['messageId']}: {type(e).__name__}: {str(e)}")
+            failed_messages.append(message['messageId'])
+            continue
         
-        # Save forecast
-        save_forecast(forecast_df)
-        logger.info("Forecast generated and saved")
+        for record in records:
+            # A later notification for the same object supersedes earlier ones in the batch
+            messages.setdefault((record['bucket'], record['key']), []).append((message['messageId'], record))
+    
+    records = [entries[-1][1] for entries in messages.values()]
+    rejected = profile_failures(records)
+    records = [record for record in records if not record.get('profile_error')]
+    batches = plan_batches(records)
+    logger.info(
+        f"Queue batch: {len(event['Records'])} message(s), {len(records)} file(s) in {len(batches)} dataset(s)"
+    )
+    
+    results = run_batches(batches, context) + rejected
+    for result in results:
+        if result['status'] == 'failed':
+            failed_messages.extend(message_id for message_id, _ in messages[(result['bucket'], result['key'])])
+    
+    failed_messages = list(dict.fromkeys(failed_messages))
+    return {
+        'statusCode': 500 if failed_messages and len(failed_messages) == len(event['Records']) else 200,
+        # Read by the event source mapping (ReportBatchItemFailures): only these messages are redelivered
+        'batchItemFailures': [{'itemIdentifier': message_id} for message_id in failed_messages],
+        'body': json.dumps({
+            'message': f"Processed queue batch of {len(records)} file(s) in {len(batches)} dataset(s)",
+            'messages': len(event['Records']),
+            'records': results,
+            'failed_messages': len(failed_messages),
+            'timestamp': datetime.now().isoformat()
+        })
+    }
+
+def handle_warmup(cold_start):
+    """Import heavy modules, exercise model, template and storage paths and prime caches once per container"""
+    if container_state['warmed']:
+        return {
+            'statusCode': 200,
+            'body': json.dumps({'message': 'Already warm', 'cold_start': cold_start})
+        }
+    
+    from warmup import warm_up
+    from prompt_context import estimate_tokens
+    
+    extra_steps = {
+        'prompt_tokenizer': lambda: estimate_tokens('warm-up'),
+        'genai_insights': lambda: __import__('genai_insights'),
+        'fleet_insights': lambda: __import__('fleet_insights')
+    }
+    if insights_cache_store is not None:
+        # Recent insight responses, so repeated contexts hit memory instead of the persistent tier
+        extra_steps['insights_cache'] = insights_cache.prime
+    if BUCKET_NAME and alert_notifier is not None:
+        # Also opens the S3 connection the first upload would otherwise pay for
+        extra_steps['anomaly_thresholds'] = load_anomaly_thresholds
+    if os.environ.get('OPENAI_API_KEY'):
+        extra_steps['openai'] = lambda: __import__('openai')
+    
+    engines = [engine for engine in (FORECAST_ENGINE, INLINE_FORECAST_ENGINE) if engine != 'online']
+    timings, errors = warm_up(engines, REPORT_FORMATS, extra_steps)
+    container_state['warmed'] = True
+    
+    return {
+        'statusCode': 200,
+        'body': json.dumps({
+            'message': 'Warmed up',
+            'cold_start': cold_start,
+            'init_seconds': container_state['init_seconds'],
+            'steps': timings,
+            'errors': errors
+        })
+    }
+
+def log_invocation(mode, cold_start, start, status_code):
+    """Structured cold/warm latency line for Logs Insights"""
+    logger.info(json.dumps({
+        'type': 'invocation',
+        'mode': mode,
+        'cold_start': cold_start,
+        'init_seconds': container_state['init_seconds'] if cold_start else None,
+        'duration_ms': round((time.time() - start) * 1000, 1),
+        'warmed': container_state['warmed'],
+        'status_code': status_code
+    }))
+
+def parse_s3_records(event):
+    """Bucket, key, size and pipeline profile of every S3 record in an event.
+
+    Records whose profile cannot be resolved carry a profile_error instead of a profile.
+    """
+    records = []
+    for record in event.get('Records', []):
+        s3_event = record['s3']
+        records.append({
+            'bucket': s3_event['bucket']['name'],
+            # Event keys arrive URL-encoded (spaces as '+')
+            'key': unquote_plus(s3_event['object']['key']),
+            'size': s3_event['object'].get('size', 0),
+            'etag': s3_event['object'].get('eTag', ''),
+            'event_time': record.get('eventTime', '')
+        })
+    
+    # One HEAD per file; issued concurrently so large events do not pay for them in series
+    metadata_profiles = [None] * len(records)
+    if records and PROFILE_FROM_METADATA and not event.get('profile'):
+        with ThreadPoolExecutor(max_workers=max(1, min(METADATA_LOOKUP_WORKERS, len(records)))) as executor:
+            metadata_profiles = list(executor.map(
+                lambda record: read_profile_metadata(record['bucket'], record['key']), records
+            ))
+    
+    for record, metadata_profile in zip(records, metadata_profiles):
+        try:
+            record['profile'] = profile_resolver.resolve(
+                record['key'], event_profile=event.get('profile'), metadata_profile=metadata_profile
+            ).name
+        except ValueError as e:
+            logger.error(f"No pipeline profile for {record['key']}: {str(e)}")
+            record['profile_error'] = f"{type(e).__name__}: {str(e)}"
+    return records
+
+def profile_failures(records):
+    """Failed results for the records whose pipeline profile could not be resolved"""
+    return [
+        {'status': 'failed', 'error': record['profile_error'], 'bucket': record['bucket'], 'key': record['key'],
+         'batch': None}
+        for record in records if record.get('profile_error')
+    ]
+
+def read_profile_metadata(bucket, key):
+    """Profile named in the object's x-amz-meta-pipeline-profile header, if any"""
+    if not PROFILE_FROM_METADATA:
+        return None
+    try:
+        return s3_client.head_object(Bucket=bucket, Key=key).get('Metadata', {}).get('pipeline-profile')
+    except Exception as e:
+        # Unreadable objects fail in the read stage; fall back to the prefix map meanwhile
+        logger.warning(f"Could not read metadata of {key}: {type(e).__name__}: {str(e)}")
+        return None
+
+def plan_batches(records):
+    """Large files run alone; small files under the same prefix and profile share a batch up to BATCH_MAX_BYTES"""
+    batches = []
+    open_batches = {}
+    
+    for record in records:
+        if record['size'] > SMALL_FILE_BYTES:
+            batches.append([record])
+            continue
         
-        # Step 5: Save anomalies
-        save_anomalies(processed_results['anomalies'])
-        logger.info(f"Saved {len(processed_results['anomalies'])} anomalies")
+        group = (record['bucket'], record['key'].rsplit('/', 1)[0], record.get('profile', DEFAULT_PROFILE))
+        batch = open_batches.get(group)
+        if batch is None or sum(r['size'] for r in batch) + record['size'] > BATCH_MAX_BYTES:
+            batch = []
+            open_batches[group] = batch
+            batches.append(batch)
+        batch.append(record)
+    
+    return batches
+
+def run_batches(batches, context):
+    """Run each batch through the pipeline concurrently; returns one result per record"""
+    # Online forecaster state is saved with conditional puts, so batches can run concurrently
+    workers = max(1, min(PIPELINE_MAX_WORKERS, len(batches)))
+    
+    def run(index, batch):
+        try:
+            result = run_pipeline(batch, context)
+            if 'continuation' in result:
+                return {'status': 'continued', 'result': result}
+            return {'status': 'duplicate' if result.get('duplicate') else 'succeeded', 'result': result}
+        except Exception as e:
+            logger.error(f"Batch {index} failed: {str(e)}", exc_info=True)
+            return {'status': 'failed', 'error': f"{type(e).__name__}: {str(e)}"}
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        outcomes = list(executor.map(run, range(len(batches)), batches))
+    
+    results = []
+    for index, (batch, outcome) in enumerate(zip(batches, outcomes)):
+        failed_files = outcome.get('result', {}).get('failed_files', {})
+        for record in batch:
+            result = dict(outcome, bucket=record['bucket'], key=record['key'], batch=index)
+            if record['key'] in failed_files:
+                result = {
+                    'status': 'failed',
+                    'error': failed_files[record['key']],
+                    'bucket': record['bucket'],
+                    'key': record['key'],
+                    'batch': index
+                }
+            results.append(result)
+    return results
+
+def run_pipeline(records, context, attempt=0, claim_token=None, run_id=None):
+    """Process, forecast and report on one batch of S3 files, once per distinct input"""
+    if idempotency_index is None:
+        return execute_pipeline(records, context, attempt, run_id=run_id)
+    
+    # Continuations carry the token of the claim their first attempt took
+    claim_token = claim_token or uuid.uuid4().hex
+    # The same file run under another profile produces different outputs
+    config_version = f"{PIPELINE_CONFIG_VERSION}:{records[0].get('profile', DEFAULT_PROFILE)}"
+    idempotency_key = make_idempotency_key(content_hashes(records), config_version)
+    status, existing = idempotency_index.claim(idempotency_key, claim_token, claim_lease_seconds(context))
+    if status == 'completed':
+        logger.info(f"Duplicate input {idempotency_key}: returning results of run {existing['result'].get('run_id')}")
+        return dict(existing['result'], duplicate=True, idempotency_key=idempotency_key)
+    if status != 'claimed':
+        logger.info(f"Duplicate input {idempotency_key} is already being processed, skipping")
+        return {
+            'processed_file': [record['key'] for record in records],
+            'duplicate': True,
+            'in_progress': True,
+            'idempotency_key': idempotency_key
+        }
+    
+    try:
+        result = execute_pipeline(records, context, attempt, claim_token, run_id)
+    except Exception:
+        idempotency_index.release(idempotency_key, claim_token)
+        raise
+    
+    if 'continuation' in result:
+        # The claim stays with the continuation
+        return result
+    if result['failed_files']:
+        # Partially read batches are not recorded, so a retry can pick up the missing files
+        idempotency_index.release(idempotency_key, claim_token)
+    else:
+        idempotency_index.complete(idempotency_key, claim_token, result)
+    return dict(result, idempotency_key=idempotency_key)
+
+def content_hashes(records):
+    """Content hash of each record: the object ETag, from the event or a HEAD request"""
+    hashes = []
+    for record in records:
+        etag = record.get('etag')
+        if not etag:
+            try:
+                etag = s3_client.head_object(Bucket=record['bucket'], Key=record['key'])['ETag']
+            except Exception:
+                # Unreadable objects fail in the read stage; hash them by name meanwhile
+                etag = f"{record['bucket']}/{record['key']}"
+        hashes.append(etag.strip('"'))
+    return hashes
+
+def claim_lease_seconds(context):
+    """Claims last until this invocation would time out, so a retry after a crash can take over"""
+    remaining = getattr(context, 'get_remaining_time_in_millis', None)
+    if remaining is None:
+        return IDEMPOTENCY_LEASE_SECONDS
+    return remaining() / 1000 + 30
+
+def execute_pipeline(records, context, attempt=0, claim_token=None, run_id=None):
+    """Run the stage graph for one batch of S3 files"""
+    keys = [record['key'] for record in records]
+    # Continuations pass the id of the run they resume, so outputs and checkpoints stay under it
+    run = RunContext(run_id, OUTPUT_LAYOUT) if run_id else RunContext.for_records(records, OUTPUT_LAYOUT)
+    run_id = run.run_id
+    profile = profile_resolver.get(records[0].get('profile', DEFAULT_PROFILE))
+    logger.info(f"Processing file(s): {', '.join(keys)} (run {run_id}, profile {profile.name}, attempt {attempt})")
+    
+    # The pipeline runs as a stage graph: S3 writes, forecasting and reporting
+    # overlap wherever they do not depend on each other
+    processor = EnergyDataProcessor(anomaly_threshold_sigma=2)
+    graph = StageGraph()
+    
+    # Step 1: Read and parse raw data from S3
+    graph.add('parse', lambda r: read_batch(processor, records))
+    
+    # Fast path: alert on rows above persisted thresholds before any aggregation or fitting
+    alerts = alert_notifier is not None and profile.runs('alerts')
+    if alerts:
+        graph.add('alerts', lambda r: publish_anomaly_alerts(r['parse']['df'], records, run), after=['parse'])
+        graph.add('thresholds', lambda r: update_anomaly_thresholds(r['parse']['df']), after=['alerts'])
+    
+    # Step 2: Process data; small files batched together are processed as one dataset
+    graph.add('process', lambda r: processor.process_frame(r['parse']['df']),
+              after=['parse', 'alerts'] if alerts else ['parse'])
+    
+    # Step 3: Save processed data
+    if profile.runs('processed'):
+        graph.add('save_processed', lambda r: save_processed_data(r['process'], run), after=['process'])
+    
+    # Step 4: Generate forecast
+    if profile.runs('forecast'):
+        graph.add('forecast', lambda r: run_forecast(processor, r['process'], profile.forecast_engine,
+                                                     series=forecast_series_id(r['process'], keys)),
+                  after=['process'])
+        graph.add('save_forecast', lambda r: save_forecast(r['forecast']['forecast_df'], run), after=['forecast'])
+    
+    if HOURLY_FORECAST and profile.runs('forecast') and profile.runs('hourly_forecast'):
+        graph.add('hourly_forecast', lambda r: save_hourly_forecast(
+            fit_hourly_forecast(r['process']['processed_df'], r['forecast']['forecast_df']), run
+        ), after=['process', 'forecast'])
+    
+    # Step 5: Save anomalies
+    if profile.runs('anomalies'):
+        graph.add('save_anomalies', lambda r: save_anomalies(r['process']['anomalies'], run), after=['process'])
+    
+    if profile.runs('report'):
+        # Step 6: Prepare analytics for the report stage
+        graph.add('analytics', lambda r: prepare_analytics_data(r['process'], r['forecast']['summary']),
+                  after=['process', 'forecast'])
+        graph.add('households', lambda r: prepare_household_analytics(processor, r['process']['processed_df'])
+                  if 'household_id' in r['process']['processed_df'].columns else None, after=['process'])
         
-        # Step 6: Generate GenAI insights
-        analytics_data = prepare_analytics_data(processed_results, forecast_summary)
+        # Step 7: Generate reports inline, or hand them to the report worker so
+        # LLM latency stays off the path to anomalies and forecast
+        graph.add('report', lambda r: dispatch_report(r['analytics'], r['households'], keys, context, run),
+                  after=['analytics', 'households'])
+    
+    checkpoint = RunCheckpoint(checkpoint_store, run_id) if checkpoint_store is not None else None
+    try:
+        stage_run = graph.run(
+            max_workers=PIPELINE_STAGE_WORKERS,
+            checkpoint=checkpoint,
+            should_stop=continuation_deadline(context) if checkpoint is not None else None
+        )
+    except StagesSuspended as suspended:
+        return continue_pipeline(records, attempt, run_id, suspended, claim_token)
+    
+    results = stage_run.results
+    timing = stage_run.summary()
+    logger.info(f"Stage timings: {json.dumps(timing)}")
+    if checkpoint is not None:
+        checkpoint.clear()
+    
+    failed_files = results['parse']['failed_files']
+    processed_keys = [key for key in keys if key not in failed_files]
+    outputs = {
+        'processed': results.get('save_processed'),
+        'forecast': results.get('save_forecast'),
+        'hourly_forecast': results.get('hourly_forecast'),
+        'anomalies': results.get('save_anomalies')
+    }
+    if 'report' in results:
+        outputs.update(results['report']['outputs'])
+    manifest_key = save_run_manifest(run, run.manifest(
+        outputs,
+        source_keys=keys,
+        failed_files=failed_files,
+        profile=profile.name,
+        alerts=(results.get('alerts') or {}).get('location'),
+        report=results['report']['info'] if 'report' in results else None,
+        stages=timing
+    ))
+    return {
+        'processed_file': processed_keys[0] if len(processed_keys) == 1 else processed_keys,
+        'failed_files': failed_files,
+        'anomalies_detected': len(results['process']['anomalies']),
+        'forecast_days': 7 if 'forecast' in results else 0,
+        'insights': results['report']['insights'] if 'report' in results else None,
+        'report': results['report']['info'] if 'report' in results else None,
+        'stages': timing,
+        'run_id': run_id,
+        'run_prefix': run.prefix,
+        'manifest': manifest_key,
+        'profile': profile.name,
+        'alerts': results.get('alerts'),
+        'outputs': outputs
+    }
+
+def read_batch(processor, records):
+    """Parsed frame of a batch's files; a bad file fails alone, not its whole batch"""
+    frames = []
+    failed_files = {}
+    for record in records:
+        try:
+            raw_data = read_s3_file(record['bucket'], record['key'])
+            logger.info(f"Read {len(raw_data)} bytes from s3://{record['bucket']}/{record['key']}")
+            frames.append(processor.parse_data(raw_data))
+        except Exception as e:
+            logger.error(f"Could not read {record['key']}: {type(e).__name__}: {str(e)}")
+            failed_files[record['key']] = f"{type(e).__name__}: {str(e)}"
+    
+    if not frames:
+        raise ValueError("No readable files in batch")
+    
+    return {'df': pd.concat(frames, ignore_index=True), 'failed_files': failed_files}
+
+def continuation_deadline(context):
+    """should_stop callable that turns true once the invocation is near its timeout"""
+    remaining = getattr(context, 'get_remaining_time_in_millis', None)
+    if remaining is None:
+        return None
+    return lambda: remaining() / 1000 < CONTINUATION_RESERVE_SECONDS
+
+def continue_pipeline(records, attempt, run_id, suspended, claim_token=None):
+    """Hand a suspended run to a continuation invocation"""
+    if continuation_queue is None:
+        raise RuntimeError(f"Run {run_id} ran out of time and no continuation queue is configured")
+    if attempt >= MAX_CONTINUATIONS:
+        raise RuntimeError(f"Run {run_id} did not finish within {MAX_CONTINUATIONS} continuations")
+    
+    continuation_queue.enqueue({
+        'records': records,
+        'attempt': attempt + 1,
+        'run_id': run_id,
+        'claim_token': claim_token
+    })
+    logger.info(
+        f"Run {run_id} continuing in a new invocation; done: {', '.join(suspended.completed)}; "
+        f"remaining: {', '.join(suspended.remaining)}"
+    )
+    return {
+        'processed_file': [record['key'] for record in records],
+        'run_id': run_id,
+        'continuation': {'attempt': attempt + 1, 'completed': suspended.completed, 'remaining': suspended.remaining}
+    }
+
+def handle_continuation(job, context):
+    """Resume a run from its checkpoints in a fresh invocation"""
+    try:
+        logger.info(f"Continuation {job['attempt']} of run {job['run_id']}")
+        result = run_pipeline(job['records'], context, job['attempt'], job.get('claim_token'), job['run_id'])
         
-        insights_assistant = EnergyInsightsAssistant(use_bedrock=USE_BEDROCK)
-        insights = insights_assistant.generate_insights(analytics_data)
+        return {
+            'statusCode': 200,
+            'body': json.dumps(dict(
+                result,
+                message='Continuation handed off again' if 'continuation' in result else 'Continuation completed',
+                timestamp=datetime.now().isoformat()
+            ))
+        }
         
-        auditor = VirtualEnergyAuditor()
-        audit_report = auditor.generate_audit_report(
-            processed_results['appliance_stats'].to_dict('records')
+    except Exception as e:
+        # Re-raised so Lambda retries the async event; the run's checkpoints are kept for the retry
+        logger.error(f"Continuation error (run {job.get('run_id')}): {str(e)}", exc_info=True)
+        raise
+
+def forecast_series_id(processed_results, keys):
+    """Series the online forecaster state belongs to: the household of a single-household
+    upload, otherwise the folder of the source files"""
+    processed_df = processed_results['processed_df']
+    if 'household_id' in processed_df.columns and processed_df['household_id'].nunique() == 1:
+        series = f"household-{processed_df['household_id'].iloc[0]}"
+    else:
+        folder = os.path.dirname(keys[0]) if keys else ''
+        series = f"folder-{folder}" if folder else 'default'
+    return re.sub(r'[^A-Za-z0-9_.-]+', '_', series)
+
+def run_forecast(processor, processed_results, engine=None, persist_state=True, series='default'):
+    """Fit the configured forecaster; returns the forecast frame and its summary"""
+    from forecasting import EnergyForecaster
+    
+    engine = engine or FORECAST_ENGINE
+    daily_df = processor.prepare_for_forecast(processed_results['processed_df'])
+    
+    # Online state is read-modify-write: a run that lost the race to a
+    # concurrent update reloads the newer state and refits on top of it
+    for attempt in range(FORECAST_STATE_ATTEMPTS):
+        state, etag = load_forecaster_state(series) if engine == 'online' else (None, None)
+        forecaster = EnergyForecaster(
+            forecast_days=7,
+            engine=engine,
+            state=state,
+            time_budget_seconds=ENSEMBLE_BUDGET_SECONDS
         )
+        forecast_df = forecaster.forecast(daily_df)
+        if engine != 'online' or not persist_state:
+            break
         
-        # Step 7: Generate and save final report
-        final_report = generate_final_report(insights, audit_report, analytics_data)
-        save_report(final_report)
-        logger.info("GenAI reports generated and saved")
-        
-        # Return success response
+        log_forecaster_revisions(forecaster, series)
+        if save_forecaster_state(series, forecaster.state, etag):
+            break
+        logger.warning(f"Forecaster state {series} changed concurrently (attempt {attempt + 1}), refitting")
+    else:
+        raise RuntimeError(f"Could not save forecaster state {series} after {FORECAST_STATE_ATTEMPTS} attempts")
+    
+    if forecaster.ensemble_report:
+        logger.info(f"Ensemble members: {json.dumps(forecaster.ensemble_report)}")
+    if forecaster.engine_used != engine:
+        logger.warning(f"Forecast engine {engine} unavailable, forecast produced by {forecaster.engine_used}")
+    
+    logger.info(f"Forecast generated ({forecaster.engine_used})")
+    return {'forecast_df': forecast_df, 'summary': build_forecast_summary(forecaster, forecast_df, daily_df)}
+
+def fit_hourly_forecast(processed_df, forecast_df):
+    """Spread the daily forecast over hours using the processed data's hourly profile"""
+    from forecasting import HourlyProfileForecaster
+    
+    return HourlyProfileForecaster().fit(processed_df).predict(forecast_df)
+
+def dispatch_report(analytics_data, households, keys, context, run):
+    """Run the report stage inline or enqueue it; returns report info, insights metrics and report keys"""
+    if REPORT_MODE == 'async' and report_queue is not None:
+        artifact_key = save_analytics_artifact(analytics_data, households, keys, run)
+        report_queue.enqueue({'bucket': BUCKET_NAME, 'artifact_key': artifact_key, 'run_id': run.run_id})
+        logger.info(f"Queued report job for {artifact_key}")
         return {
-            'statusCode': 200,
-            'body': json.dumps({
-                'message': 'Energy analytics pipeline completed successfully',
-                'processed_file': key,
-                'anomalies_detected': len(processed_results['anomalies']),
-                'forecast_days': 7,
-                'timestamp': datetime.now().isoformat()
-            })
+            'info': {'mode': 'async', 'artifact_key': artifact_key},
+            'insights': None,
+            'outputs': {'analytics': artifact_key}
+        }
+    
+    if REPORT_MODE == 'async':
+        logger.warning("REPORT_MODE=async but no report queue is configured, reporting inline")
+    insights_metrics, outputs = run_report_stage(analytics_data, households, context, run)
+    return {'info': {'mode': 'sync'}, 'insights': insights_metrics, 'outputs': outputs}
+
+def build_insights_assistant(context, telemetry=None):
+    """Insights assistant wired to the container's cache, breakers and limiters, recording to telemetry"""
+    from genai_insights import EnergyInsightsAssistant
+    
+    return EnergyInsightsAssistant(
+        use_bedrock=USE_BEDROCK,
+        cache=insights_cache,
+        deadline=CallDeadline.from_lambda_context(
+            context,
+            reserve_seconds=INSIGHTS_RESERVE_SECONDS,
+            max_call_seconds=INSIGHTS_MAX_CALL_SECONDS
+        ),
+        breaker_failure_threshold=BREAKER_FAILURE_THRESHOLD,
+        breaker_cooldown_seconds=BREAKER_COOLDOWN_SECONDS,
+        hedge=insights_hedge,
+        rate_limiters=insights_rate_limiters,
+        context_token_budget=INSIGHTS_CONTEXT_TOKENS or None,
+        telemetry=telemetry
+    )
+
+def run_report_stage(analytics_data, households, context, run):
+    """Generate GenAI insights, fleet and audit reports; returns insights metrics and report keys"""
+    from genai_insights import VirtualEnergyAuditor
+    
+    # Household insights, fleet narratives and the audit are independent; each
+    # LLM consumer gets its own assistant because assistants keep per-request metrics.
+    # Telemetry belongs to this stage, so concurrent runs never flush each other's calls
+    telemetry = LLMTelemetry()
+    graph = StageGraph()
+    graph.add('insights', lambda r: generate_household_insights(
+        build_insights_assistant(context, telemetry), analytics_data
+    ))
+    if households:
+        graph.add('fleet', lambda r: generate_fleet_insights(
+            build_insights_assistant(context, telemetry), households, run
+        ))
+    graph.add('audit', lambda r: VirtualEnergyAuditor().audit(analytics_data['appliance_stats']))
+    graph.add('reports', lambda r: save_final_reports(r['insights'][0], r['audit'], analytics_data, run),
+              after=['insights', 'audit'])
+    
+    stage_run = graph.run(max_workers=PIPELINE_STAGE_WORKERS)
+    logger.info(f"Report stage timings: {json.dumps(stage_run.summary())}")
+    
+    insights_metrics = stage_run.results['insights'][1]
+    insights_metrics['telemetry'] = telemetry.flush()
+    return insights_metrics, {'report': stage_run.results['reports'], 'fleet_report': stage_run.results.get('fleet')}
+
+def generate_household_insights(insights_assistant, analytics_data):
+    """Insights text and metrics for the analytics of one run"""
+    insights = insights_assistant.generate_insights(analytics_data)
+    insights_metrics = dict(insights_assistant.metrics, circuit_breakers=circuit_breaker_snapshots())
+    if insights_hedge:
+        insights_metrics['hedging'] = insights_hedge.stats()
+    if insights_rate_limiters:
+        insights_metrics['rate_limits'] = {
+            provider: limiter.stats() for provider, limiter in insights_rate_limiters.items()
+        }
+    logger.info(f"Insights metrics: {json.dumps(insights_metrics)}")
+    logger.info(f"Insights cache: {json.dumps(insights_cache.stats())}")
+    return insights, insights_metrics
+
+def generate_fleet_insights(insights_assistant, households, run):
+    """Fleet uploads: one narrative per consumption archetype, numbers templated per household"""
+    from fleet_insights import FleetInsightsGenerator
+    
+    fleet_results = FleetInsightsGenerator(
+        insights_assistant, batch_size=INSIGHTS_BATCH_SIZE
+    ).generate(households)
+    key = save_fleet_report(fleet_results, run)
+    logger.info(
+        f"Fleet insights: {fleet_results['households']} households, "
+        f"{fleet_results['narratives_generated']} archetype narratives"
+    )
+    logger.info(f"Fleet insights metrics: {json.dumps(insights_assistant.metrics)}")
+    return key
+
+def save_final_reports(insights, audit, analytics_data, run):
+    """Generate and save the final report in each configured format; returns their keys"""
+    keys = []
+    for output_format in REPORT_FORMATS:
+        final_report = generate_final_report(insights, audit, analytics_data, output_format)
+        keys.append(save_report(final_report, output_format, run))
+    logger.info("GenAI reports generated and saved")
+    return keys
+
+def handle_inline_request(request, context):
+    """Analyze readings sent in the event and return the analytics in the response"""
+    start = time.time()
+    from forecasting import EnergyForecaster
+    
+    processor = EnergyDataProcessor(anomaly_threshold_sigma=2)
+    try:
+        df = parse_inline_request(processor, request, INLINE_MAX_BYTES)
+        engine = request.get('forecast_engine', INLINE_FORECAST_ENGINE)
+        if engine not in EnergyForecaster.ENGINES or engine == 'online':
+            raise InlinePayloadError(f"Unsupported forecast engine for inline requests: {engine}")
+    except InlinePayloadError as e:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'message': 'Invalid inline request', 'error': str(e)})
+        }
+    
+    try:
+        persist = bool(request.get('persist', False))
+        run = RunContext.for_request('inline', OUTPUT_LAYOUT)
+        telemetry = LLMTelemetry()
+        
+        graph = StageGraph()
+        graph.add('process', lambda r: processor.process_frame(df))
+        if request.get('forecast', True):
+            graph.add('forecast', lambda r: run_forecast(processor, r['process'], engine), after=['process'])
+        forecast_stages = ['forecast'] if request.get('forecast', True) else []
+        graph.add('analytics', lambda r: prepare_analytics_data(
+            r['process'], r['forecast']['summary'] if forecast_stages else None
+        ), after=['process'] + forecast_stages)
+        if request.get('insights', False):
+            graph.add('insights', lambda r: generate_household_insights(
+                build_insights_assistant(context, telemetry), r['analytics']
+            ), after=['analytics'])
+        
+        # Outputs are written to S3 only when the client asks for it
+        if persist:
+            graph.add('save_processed', lambda r: save_processed_data(r['process'], run), after=['process'])
+            graph.add('save_anomalies', lambda r: save_anomalies(r['process']['anomalies'], run), after=['process'])
+            if forecast_stages:
+                graph.add('save_forecast', lambda r: save_forecast(r['forecast']['forecast_df'], run),
+                          after=['forecast'])
+        
+        stage_run = graph.run(max_workers=PIPELINE_STAGE_WORKERS)
+        results = stage_run.results
+        anomalies = results['process']['anomalies']
+        
+        body = {
+            'message': 'Inline analysis completed',
+            'records_processed': len(df),
+            'analytics': results['analytics'],
+            'anomalies': anomalies.head(INLINE_MAX_ANOMALIES).to_dict('records'),
+            'anomalies_detected': len(anomalies),
+            'stages': stage_run.summary(),
+            'processing_time_ms': round((time.time() - start) * 1000, 1)
         }
+        if 'insights' in results:
+            body['insights'], body['insights_metrics'] = results['insights']
+            body['insights_metrics']['telemetry'] = telemetry.flush()
+        if persist:
+            body['outputs'] = {
+                'processed': results['save_processed'],
+                'forecast': results.get('save_forecast'),
+                'anomalies': results['save_anomalies']
+            }
+            body['run_id'] = run.run_id
+            body['manifest'] = save_run_manifest(run, run.manifest(
+                body['outputs'], source='inline', records_processed=len(df)
+            ))
+        
+        # NaN is not valid JSON; refuse it here rather than hand strict clients an unparseable body
+        return {'statusCode': 200, 'body': json.dumps(body, default=json_default, allow_nan=False)}
         
     except Exception as e:
-        logger.error(f"Pipeline error: {str(e)}", exc_info=True)
+        logger.error(f"Inline request error: {str(e)}", exc_info=True)
         return {
             'statusCode': 500,
             'body': json.dumps({
-                'message': 'Pipeline execution failed',
+                'message': 'Inline analysis failed',
                 'error': str(e)
             })
         }
 
+def handle_report_job(job, context):
+    """Report worker: build the narrative report from a saved analytics artifact"""
+    try:
+        logger.info(f"Report job started: s3://{job['bucket']}/{job['artifact_key']}")
+        
+        artifact = json.loads(read_s3_file(job['bucket'], job['artifact_key']))
+        # Reports join the outputs of the run that queued them
+        if job.get('run_id'):
+            run = RunContext(job['run_id'], OUTPUT_LAYOUT)
+        else:
+            run = RunContext.for_request('report', OUTPUT_LAYOUT)
+        insights_metrics, outputs = run_report_stage(
+            artifact['analytics_data'], artifact.get('households'), context, run
+        )
+        manifest_key = save_run_manifest(run, run.manifest(
+            outputs, artifact_key=job['artifact_key'], source_keys=artifact.get('source_keys')
+        ), name='report_manifest')
+        
+        return {
+            'statusCode': 200,
+            'body': json.dumps({
+                'message': 'Report generated successfully',
+                'artifact_key': job['artifact_key'],
+                'source_files': artifact.get('source_keys'),
+                'run_id': run.run_id,
+                'manifest': manifest_key,
+                'outputs': outputs,
+                'insights': insights_metrics,
+                'timestamp': datetime.now().isoformat()
+            })
+        }
+        
+    except Exception as e:
+        # Re-raised so Lambda retries the async event (and then sends it to the failure destination)
+        logger.error(f"Report job error: {str(e)}", exc_info=True)
+        raise
+
+def save_analytics_artifact(analytics_data, households, source_keys, run):
+    """Save the compact analytics the report stage needs to S3"""
+    artifact = {
+        'source_keys': source_keys,
+        'created_at': datetime.now().isoformat(),
+        'analytics_data': analytics_data,
+        'households': households
+    }
+    
+    key = run.key('analytics', 'json')
+    
+    s3_client.put_object(
+        Bucket=BUCKET_NAME,
+        Key=key,
+        Body=json.dumps(artifact, default=json_default),
+        ContentType='application/json'
+    )
+    
+    logger.info(f"Saved analytics artifact: {key}")
+    return key
+
 def read_s3_file(bucket, key):
     """Read file content from S3"""
     response = s3_client.get_object(Bucket=bucket, Key=key)
     return response['Body'].read().decode('utf-8')
 
-def save_processed_data(processed_results):
+def build_forecast_summary(forecaster, forecast_df, daily_df):
+    """Forecast summary with optional simulated quantiles and cap risk"""
+    if not FORECAST_QUANTILES and MONTHLY_KWH_CAP is None:
+        return forecaster.format_forecast_summary(forecast_df)
+    
+    from probabilistic import ResidualSimulator
+    
+    simulator = ResidualSimulator()
+    paths = simulator.simulate(forecast_df, forecaster.residuals())
+    
+    quantile_df = None
+    if FORECAST_QUANTILES:
+        quantile_df = simulator.quantiles(forecast_df, paths, FORECAST_QUANTILES)
+    summary = forecaster.format_forecast_summary(forecast_df, quantile_df)
+    
+    if MONTHLY_KWH_CAP is not None:
+        # Month-to-date usage plus simulated usage for forecast days in the same month
+        month = forecast_df['ds'].min().to_period('M')
+        month_to_date = float(daily_df.loc[daily_df['ds'].dt.to_period('M') == month, 'y'].sum())
+        in_month = (forecast_df['ds'].dt.to_period('M') == month).to_numpy()
+        
+        summary['monthly_cap'] = {
+            'month': str(month),
+            'cap_kwh': MONTHLY_KWH_CAP,
+            'month_to_date_kwh': month_to_date,
+            'exceedance_probability': simulator.exceedance_probability(
+                paths, MONTHLY_KWH_CAP, baseline_kwh=month_to_date, mask=in_month
+            )
+        }
+    
+    return summary
+
+def publish_anomaly_alerts(df, records, run):
+    """Score parsed rows against persisted thresholds and publish an alert batch"""
+    try:
+        events, total = AnomalyFastPath(
+            load_anomaly_thresholds(), sigma=2, max_events=ALERT_MAX_EVENTS
+        ).score(df)
+        if not events:
+            return {'events': 0}
+        
+        alert = {
+            'run_id': run.run_id,
+            'source_keys': [record['key'] for record in records],
+            'anomaly_count': total,
+            'events': events,
+            'created_at': datetime.now().isoformat()
+        }
+        location = alert_notifier.publish(alert, f"alerts_{run.run_id}")
+        
+        latency_ms = upload_latency_ms(records)
+        logger.info(f"Published {total} anomaly alert(s) to {location}; upload to alert {latency_ms} ms")
+        return {'events': total, 'location': location, 'upload_to_alert_ms': latency_ms}
+    
+    except Exception as e:
+        # Alerting is best effort; the full pipeline still saves every anomaly
+        logger.error(f"Anomaly fast path failed: {str(e)}", exc_info=True)
+        return {'events': None, 'error': str(e)}
+
+def upload_latency_ms(records):
+    """Milliseconds since the earliest S3 event time in a batch, or None without event times"""
+    try:
+        upload_times = [pd.Timestamp(record['event_time']) for record in records if record.get('event_time')]
+    except ValueError:
+        return None
+    if not upload_times:
+        return None
+    return round((time.time() - min(upload_times).timestamp()) * 1000, 1)
+
+def load_anomaly_thresholds():
+    """Load persisted per-appliance anomaly thresholds from S3"""
+    return read_anomaly_thresholds()[0]
+
+def read_anomaly_thresholds():
+    """Persisted anomaly thresholds and their ETag ({} and None when none exist yet)"""
+    try:
+        response = s3_client.get_object(Bucket=BUCKET_NAME, Key=ANOMALY_THRESHOLDS_KEY)
+        return json.loads(response['Body'].read()), response.get('ETag')
+    except s3_client.exceptions.NoSuchKey:
+        logger.info("No anomaly thresholds found, scoring against in-file statistics")
+        return {}, None
+
+def update_anomaly_thresholds(df):
+    """Fold this upload's statistics into the persisted thresholds for the next run's fast path"""
+    try:
+        update = compute_thresholds(df, sigma=2)
+        for attempt in range(FORECAST_STATE_ATTEMPTS):
+            persisted, etag = read_anomaly_thresholds()
+            if put_json_if_unchanged(ANOMALY_THRESHOLDS_KEY, merge_thresholds(persisted, update, sigma=2), etag):
+                logger.info(f"Saved anomaly thresholds: {ANOMALY_THRESHOLDS_KEY}")
+                return {'appliances': len(update), 'attempts': attempt + 1}
+            logger.warning(f"Anomaly thresholds changed concurrently (attempt {attempt + 1}), merging again")
+        raise RuntimeError(f"Could not save anomaly thresholds after {FORECAST_STATE_ATTEMPTS} attempts")
+    
+    except Exception as e:
+        # Like the alerts it feeds, the threshold update is best effort and never fails the run
+        logger.error(f"Anomaly threshold update failed: {str(e)}", exc_info=True)
+        return {'appliances': None, 'error': str(e)}
+
+def put_json_if_unchanged(key, value, etag):
+    """Put a JSON object only if its ETag still matches (or, without an ETag, it still does not exist).
+    Returns False when another writer got there first."""
+    conditions = {'IfMatch': etag} if etag else {'IfNoneMatch': '*'}
+    try:
+        s3_client.put_object(
+            Bucket=BUCKET_NAME,
+            Key=key,
+            Body=json.dumps(value),
+            ContentType='application/json',
+            **conditions
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('PreconditionFailed', 'ConditionalRequestConflict'):
+            return False
+        raise
+    return True
+
+def load_forecaster_state(series):
+    """Load persisted online forecaster state of a series from S3; returns (state, ETag)"""
+    try:
+        response = s3_client.get_object(Bucket=BUCKET_NAME, Key=f"{FORECAST_STATE_PREFIX}{series}.json")
+        return json.loads(response['Body'].read()), response.get('ETag')
+    except s3_client.exceptions.NoSuchKey:
+        logger.info(f"No forecaster state for {series}, starting fresh")
+        return None, None
+
+def save_forecaster_state(series, state, etag):
+    """Persist online forecaster state only if it is unchanged since it was loaded.
+    Returns False when another run updated it first."""
+    key = f"{FORECAST_STATE_PREFIX}{series}.json"
+    if not put_json_if_unchanged(key, state, etag):
+        return False
+    
+    logger.info(f"Saved forecaster state: {key}")
+    return True
+
+def log_forecaster_revisions(forecaster, series):
+    """Report days re-absorbed with revised values and changed days too old to re-absorb"""
+    revised = forecaster.state_revisions['revised_days']
+    rejected = forecaster.state_revisions['rejected_days']
+    if revised:
+        logger.info(f"Forecaster state {series}: re-absorbed revised days {', '.join(str(day) for day in revised)}")
+    if rejected:
+        logger.warning(f"Forecaster state {series}: ignored {len(rejected)} already-absorbed day(s) before the "
+                       f"revision window ({rejected[0]} to {rejected[-1]})")
+
+def save_processed_data(processed_results, run):
     """Save processed data to S3"""
     appliance_stats = processed_results['appliance_stats']
     
@@ -117,8 +1201,7 @@ def save_processed_data(processed_results):
     appliance_stats.to_csv(csv_buffer, index=False)
     
     # Upload to S3
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    key = f"processed/aggregated_{timestamp}.csv"
+    key = run.key('processed', 'csv')
     
     s3_client.put_object(
         Bucket=BUCKET_NAME,
@@ -128,14 +1211,15 @@ def save_processed_data(processed_results):
     )
     
     logger.info(f"Saved processed data: {key}")
+    register_table_output(run, 'processed', key)
+    return key
 
-def save_forecast(forecast_df):
+def save_forecast(forecast_df, run):
     """Save forecast to S3"""
     csv_buffer = StringIO()
     forecast_df.to_csv(csv_buffer, index=False)
     
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    key = f"forecast/forecast_{timestamp}.csv"
+    key = run.key('forecast', 'csv')
     
     s3_client.put_object(
         Bucket=BUCKET_NAME,
@@ -145,8 +1229,27 @@ def save_forecast(forecast_df):
     )
     
     logger.info(f"Saved forecast: {key}")
+    register_table_output(run, 'forecast', key)
+    return key
 
-def save_anomalies(anomalies_df):
+def save_hourly_forecast(hourly_df, run):
+    """Save hourly per-appliance forecast to S3"""
+    csv_buffer = StringIO()
+    hourly_df.to_csv(csv_buffer, index=False)
+    
+    key = run.key('hourly_forecast', 'csv')
+    
+    s3_client.put_object(
+        Bucket=BUCKET_NAME,
+        Key=key,
+        Body=csv_buffer.getvalue(),
+        ContentType='text/csv'
+    )
+    
+    logger.info(f"Saved hourly forecast: {key}")
+    return key
+
+def save_anomalies(anomalies_df, run):
     """Save anomalies to S3"""
     if len(anomalies_df) == 0:
         logger.info("No anomalies detected")
@@ -155,8 +1258,7 @@ def save_anomalies(anomalies_df):
     csv_buffer = StringIO()
     anomalies_df.to_csv(csv_buffer, index=False)
     
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    key = f"anomalies/anomalies_{timestamp}.csv"
+    key = run.key('anomalies', 'csv')
     
     s3_client.put_object(
         Bucket=BUCKET_NAME,
@@ -166,20 +1268,57 @@ def save_anomalies(anomalies_df):
     )
     
     logger.info(f"Saved anomalies: {key}")
+    return key
+
+# File extension and content type per report format
+REPORT_CONTENT_TYPES = {
+    'text': ('txt', 'text/plain'),
+    'json': ('json', 'application/json'),
+    'html': ('html', 'text/html')
+}
 
-def save_report(report_content):
+def save_report(report_content, output_format, run):
     """Save final report to S3"""
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    key = f"reports/final_report_{timestamp}.txt"
+    extension, content_type = REPORT_CONTENT_TYPES[output_format]
+    key = run.key('report', extension)
     
     s3_client.put_object(
         Bucket=BUCKET_NAME,
         Key=key,
         Body=report_content,
-        ContentType='text/plain'
+        ContentType=content_type
     )
     
     logger.info(f"Saved report: {key}")
+    return key
+
+def register_table_output(run, output, key):
+    """Point the output's Athena table at a file of this run with a symlink manifest"""
+    if output not in TABLE_OUTPUTS:
+        return None
+    
+    manifest_key = run.table_manifest_key(output)
+    s3_client.put_object(
+        Bucket=BUCKET_NAME,
+        Key=manifest_key,
+        Body=f"s3://{BUCKET_NAME}/{key}\n",
+        ContentType='text/plain'
+    )
+    return manifest_key
+
+def save_run_manifest(run, manifest, name='manifest'):
+    """Save the manifest linking a run's outputs to S3"""
+    key = run.manifest_key(name)
+    
+    s3_client.put_object(
+        Bucket=BUCKET_NAME,
+        Key=key,
+        Body=json.dumps(manifest, default=json_default),
+        ContentType='application/json'
+    )
+    
+    logger.info(f"Saved run manifest: {key}")
+    return key
 
 def prepare_analytics_data(processed_results, forecast_summary):
     """Prepare analytics data for GenAI"""
@@ -196,54 +1335,55 @@ def prepare_analytics_data(processed_results, forecast_summary):
         'forecast_summary': forecast_summary
     }
 
-def generate_final_report(insights, audit_report, analytics_data):
-    """Generate comprehensive final report"""
-    report = f"""
-{'='*70}
-ENERGY USAGE ANALYSIS & FORECASTING SYSTEM
-COMPREHENSIVE REPORT
-{'='*70}
-
-Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-
-{'='*70}
-EXECUTIVE SUMMARY
-{'='*70}
-
-Total Energy Consumption: {analytics_data['total_usage']:.2f} kWh (30 days)
-Daily Average: {analytics_data['total_usage']/30:.2f} kWh
-Anomalies Detected: {analytics_data['anomaly_count']}
-Forecast Period: 7 days
-
-{'='*70}
-AI-GENERATED INSIGHTS
-{'='*70}
-
-{insights}
-
-{'='*70}
-{audit_report}
-
-{'='*70}
-FORECAST SUMMARY
-{'='*70}
-
-7-Day Energy Consumption Forecast:
-"""
+def prepare_household_analytics(processor, processed_df):
+    """Per-household analytics data for fleet uploads"""
+    households = {}
     
-    if 'forecast_summary' in analytics_data and analytics_data['forecast_summary']:
-        fs = analytics_data['forecast_summary']
-        report += f"\nTotal Predicted: {fs.get('total_predicted_kwh', 0):.2f} kWh\n"
-        report += f"Daily Average: {fs.get('avg_predicted_kwh', 0):.2f} kWh\n"
-        report += f"Period: {fs.get('start_date', 'N/A')} to {fs.get('end_date', 'N/A')}\n"
+    for household_id, household_df in processed_df.groupby('household_id'):
+        household_results = processor.process_frame(household_df)
+        analytics_data = prepare_analytics_data(household_results, None)
+        
+        # Relative daily trend from a linear fit of daily totals
+        daily_df = processor.prepare_for_forecast(household_df)
+        if len(daily_df) > 1 and daily_df['y'].mean() > 0:
+            days = (daily_df['ds'] - daily_df['ds'].min()).dt.days.to_numpy()
+            slope = np.polyfit(days, daily_df['y'].to_numpy(dtype=float), 1)[0]
+            analytics_data['trend'] = float(slope / daily_df['y'].mean())
         
-        report += "\nDaily Breakdown:\n"
-        for pred in fs.get('daily_predictions', []):
-            report += f"  {pred['date']}: {pred['predicted_kwh']:.2f} kWh "
-            report += f"(Range: {pred['lower_bound']:.2f} - {pred['upper_bound']:.2f})\n"
+        households[str(household_id)] = analytics_data
     
-    report += f"\n{'='*70}\n"
-    report += "END OF REPORT\n"
-    report += f"{'='*70}\n"
+    return households
+
+def save_fleet_report(fleet_results, run):
+    """Save per-household fleet insights to S3"""
+    # Collected in a list and joined once; fleets can carry thousands of households
+    parts = [
+        f"FLEET INSIGHTS REPORT\n{'='*70}\n\n",
+        f"Households: {fleet_results['households']}\n",
+        f"Archetypes: {fleet_results['narratives_generated']}\n\n"
+    ]
+    for label, household_ids in fleet_results['archetypes'].items():
+        parts.append(f"  {label}: {len(household_ids)} household(s)\n")
+    
+    for household_id, insights in fleet_results['insights'].items():
+        parts.append(f"\n{'='*70}\n{insights}\n")
+    report = ''.join(parts)
     
-    return report
+    key = run.key('fleet_report', 'txt')
+    
+    s3_client.put_object(
+        Bucket=BUCKET_NAME,
+        Key=key,
+        Body=report,
+        ContentType='text/plain'
+    )
+    
+    logger.info(f"Saved fleet report: {key}")
+    return key
+
+def generate_final_report(insights, audit, analytics_data, output_format='text'):
+    """Generate comprehensive final report from precompiled templates"""
+    model = build_report_model(
+        analytics_data, insights, audit, datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    )
+    return render_report(model, output_format)
@@ -0,0 +1,206 @@
+"""Content-addressed cache for LLM insight responses"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class InsightsCache:
+    """Two-tier response cache keyed by a hash of context, provider and model.
+
+    The memory tier is an LRU that survives across warm Lambda invocations;
+    the optional persistent tier (S3 prefix or local directory) is shared
+    across containers. Entries older than ttl_seconds are ignored in both.
+    """
+    
+    def __init__(self, max_entries=256, ttl_seconds=86400, store=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.store = store
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            'memory_hits': 0,
+            'persistent_hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'saved_latency_seconds': 0.0
+        }
+    
+    @staticmethod
+    def make_key(context, provider, model):
+        """Content hash identifying a prompt context for one provider/model"""
+        digest = hashlib.sha256()
+        for part in (provider, model, context):
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+    
+    def get(self, key, count_miss=True):
+        """Cached response text, or None on a miss"""
+        now = time.time()
+        
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._is_fresh(entry, now):
+                self._entries.move_to_end(key)
+                self._record_hit('memory_hits', entry)
+                return entry['text']
+            if entry is not None:
+                del self._entries[key]
+        
+        if self.store is not None:
+            try:
+                entry = self.store.get(key)
+            except Exception:
+                entry = None
+            
+            if entry is not None and self._is_fresh(entry, now):
+                with self._lock:
+                    self._remember(key, entry)
+                    self._record_hit('persistent_hits', entry)
+                return entry['text']
+        
+        if count_miss:
+            with self._lock:
+                self._stats['misses'] += 1
+        return None
+    
+    def put(self, key, text, latency_seconds, provider=None, model=None):
+        """Store a response along with the latency it cost to produce"""
+        entry = {
+            'text': text,
+            'created_at': time.time(),
+            'latency_seconds': latency_seconds,
+            'provider': provider,
+            'model': model
+        }
+        
+        with self._lock:
+            self._remember(key, entry)
+        
+        if self.store is not None:
+            try:
+                self.store.put(key, entry)
+            except Exception:
+                # Persistent tier is best-effort; the memory tier still holds it
+                pass
+    
+    def prime(self, limit=None):
+        """Load the most recently written persistent entries into the memory tier; returns how many"""
+        if self.store is None:
+            return 0
+        
+        now = time.time()
+        loaded = 0
+        for key in self.store.recent_keys(min(limit or self.max_entries, self.max_entries)):
+            entry = self.store.get(key)
+            if entry is None or not self._is_fresh(entry, now):
+                continue
+            with self._lock:
+                # Entries already in use stay; primed ones rank behind them, newest last
+                if key not in self._entries:
+                    self._remember(key, entry)
+                    self._entries.move_to_end(key, last=False)
+                    loaded += 1
+        return loaded
+    
+    def stats(self):
+        """Hit rate and latency saved since the container started"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        
+        hits = stats['memory_hits'] + stats['persistent_hits']
+        lookups = hits + stats['misses']
+        stats['hits'] = hits
+        stats['hit_rate'] = hits / lookups if lookups else 0.0
+        
+        return stats
+    
+    def _is_fresh(self, entry, now):
+        """Whether an entry is still within the TTL"""
+        return now - entry['created_at'] <= self.ttl_seconds
+    
+    def _remember(self, key, entry):
+        """Insert into the memory tier, evicting least recently used entries"""
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats['evictions'] += 1
+    
+    def _record_hit(self, counter, entry):
+        """Count a hit and the provider latency it avoided"""
+        self._stats[counter] += 1
+        self._stats['saved_latency_seconds'] += entry.get('latency_seconds') or 0.0
+
+
+class S3CacheStore:
+    """Persistent cache tier stored as JSON objects under an S3 prefix"""
+    
+    def __init__(self, s3_client, bucket, prefix='cache/insights/'):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.prefix = prefix
+    
+    def get(self, key):
+        """Load an entry from S3, or None if absent"""
+        try:
+            response = self.s3_client.get_object(Bucket=self.bucket, Key=f"{self.prefix}{key}.json")
+        except self.s3_client.exceptions.NoSuchKey:
+            return None
+        return json.loads(response['Body'].read())
+    
+    def recent_keys(self, limit):
+        """Keys of the most recently written entries, newest first"""
+        objects = []
+        paginator = self.s3_client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            objects.extend(page.get('Contents', []))
+        objects = sorted(
+            (obj for obj in objects if obj['Key'].endswith('.json')), key=lambda obj: obj['LastModified'], reverse=True
+        )
+        return [obj['Key'][len(self.prefix):-len('.json')] for obj in objects[:limit]]
+    
+    def put(self, key, entry):
+        """Write an entry to S3"""
+        self.s3_client.put_object(
+            Bucket=self.bucket,
+            Key=f"{self.prefix}{key}.json",
+            Body=json.dumps(entry),
+            ContentType='application/json'
+        )
+
+
+class LocalDirectoryCacheStore:
+    """Persistent cache tier in a local directory (stand-in for S3 in tests)"""
+    
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+    
+    def get(self, key):
+        """Load an entry from disk, or None if absent"""
+        file_path = os.path.join(self.path, f"{key}.json")
+        if not os.path.exists(file_path):
+            return None
+        with open(file_path, 'r') as f:
+            return json.load(f)
+    
+    def recent_keys(self, limit):
+        """Keys of the most recently written entries, newest first"""
+        names = [name for name in os.listdir(self.path) if name.endswith('.json')]
+        names.sort(key=lambda name: os.path.getmtime(os.path.join(self.path, name)), reverse=True)
+        return [name[:-len('.json')] for name in names[:limit]]
+    
+    def put(self, key, entry):
+        """Write an entry to disk"""
+        # Write then rename so concurrent readers never see partial files
+        file_path = os.path.join(self.path, f"{key}.json")
+        tmp_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, file_path)
@@ -0,0 +1,152 @@
+"""Declarative stage graph executed concurrently on a thread pool"""
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+
+class StagesSuspended(Exception):
+    """Raised when a run stopped scheduling stages before all of them finished"""
+    
+    def __init__(self, completed, remaining):
+        super().__init__(f"Suspended with {len(remaining)} stage(s) remaining: {', '.join(sorted(remaining))}")
+        self.completed = completed
+        self.remaining = remaining
+
+
+class StageGraph:
+    """Named stages with dependencies, run as soon as their inputs are ready.
+
+    Each stage is a callable taking the dict of results produced so far and
+    returning its own result. Stages whose dependencies are all complete
+    run concurrently, so a run takes as long as its longest dependency
+    chain rather than the sum of every stage. The first failing stage stops
+    scheduling; stages already running finish, then its exception is raised.
+    
+    When should_stop() turns true no new stage starts; running stages finish
+    and StagesSuspended is raised so the caller can continue elsewhere. With
+    a checkpoint, the outputs finished so far are saved at that point, and
+    stages saved by an earlier attempt are restored instead of re-run. Runs
+    that finish in one go write no checkpoints.
+    """
+    
+    def __init__(self):
+        self.stages = {}
+    
+    def add(self, name, func, after=()):
+        """Register a stage that runs after the named stages"""
+        if name in self.stages:
+            raise ValueError(f"Duplicate stage: {name}")
+        for dependency in after:
+            if dependency not in self.stages:
+                raise ValueError(f"Stage {name} depends on unknown stage {dependency}")
+        self.stages[name] = (func, tuple(after))
+        return self
+    
+    def run(self, max_workers=4, checkpoint=None, should_stop=None):
+        """Execute every stage; returns a StageRun with results and timings"""
+        results = {}
+        timings = {}
+        pending = dict(self.stages)
+        running = {}
+        start = time.time()
+        error = None
+        suspended = False
+        restored = set()
+        
+        if checkpoint is not None:
+            for name in checkpoint.completed() & set(pending):
+                pending.pop(name)
+                restored.add(name)
+                results[name] = checkpoint.load(name)
+                timings[name] = {'start': round(time.time() - start, 4), 'seconds': 0.0, 'restored': True}
+        
+        def execute(name, func):
+            stage_start = time.time()
+            try:
+                return func(results)
+            finally:
+                timings[name] = {
+                    'start': round(stage_start - start, 4),
+                    'seconds': round(time.time() - stage_start, 4)
+                }
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while pending or running:
+                if error is None and not suspended:
+                    ready = [
+                        name for name, (_, after) in pending.items()
+                        if all(dependency in results for dependency in after)
+                    ]
+                    if ready and should_stop is not None and should_stop():
+                        suspended = True
+                        ready = []
+                    for name in ready:
+                        func, _ = pending.pop(name)
+                        running[executor.submit(execute, name, func)] = name
+                
+                if not running:
+                    break
+                
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        results[name] = future.result()
+                    except Exception as e:
+                        if error is None:
+                            error = e
+        
+        if error is not None:
+            raise error
+        if suspended:
+            saved = set(restored)
+            if checkpoint is not None:
+                for name in sorted(set(results) - restored):
+                    try:
+                        checkpoint.save(name, results[name])
+                        saved.add(name)
+                    except TypeError:
+                        # No serializable form: the stage runs again in the continuation
+                        pass
+            # Unsaved stages are lost with this invocation, so they count as remaining
+            lost = set(results) - saved if checkpoint is not None else set()
+            raise StagesSuspended(sorted(set(results) - lost), sorted(set(pending) | lost))
+        
+        return StageRun(results, timings, {name: after for name, (_, after) in self.stages.items()},
+                        time.time() - start)
+
+
+class StageRun:
+    """Results, per-stage timings and the critical path of one graph run"""
+    
+    def __init__(self, results, timings, dependencies, wall_seconds):
+        self.results = results
+        self.timings = timings
+        self.dependencies = dependencies
+        self.wall_seconds = wall_seconds
+    
+    def critical_path(self):
+        """Chain of stages that determined the wall-clock time, first to last"""
+        if not self.timings:
+            return []
+        
+        def finish(name):
+            return self.timings[name]['start'] + self.timings[name]['seconds']
+        
+        # Walk back from the last stage to finish through whichever input finished last
+        name = max(self.timings, key=finish)
+        path = [name]
+        while self.dependencies[name]:
+            name = max(self.dependencies[name], key=finish)
+            path.append(name)
+        return path[::-1]
+    
+    def summary(self):
+        """JSON-serializable timing report"""
+        path = self.critical_path()
+        return {
+            'wall_seconds': round(self.wall_seconds, 4),
+            'stage_seconds': round(sum(timing['seconds'] for timing in self.timings.values()), 4),
+            'critical_path': path,
+            'critical_path_seconds': round(sum(self.timings[name]['seconds'] for name in path), 4),
+            'stages': self.timings
+        }
@@ -0,0 +1,86 @@
+"""Named pipeline profiles that select which stages run for an upload"""
+import json
+
+
+class PipelineProfile:
+    """A named set of optional stages and the forecast engine they use.
+
+    Parsing and processing always run. The optional stages are: alerts (the
+    anomaly fast path), processed (saving aggregates), forecast,
+    hourly_forecast, anomalies (saving anomalies) and report (insights,
+    audit and the final report).
+    """
+    
+    STAGES = ('alerts', 'processed', 'forecast', 'hourly_forecast', 'anomalies', 'report')
+    
+    def __init__(self, name, stages, forecast_engine=None):
+        unknown = set(stages) - set(self.STAGES)
+        if unknown:
+            raise ValueError(f"Profile {name} has unknown stages: {', '.join(sorted(unknown))}")
+        if 'report' in stages and 'forecast' not in stages:
+            raise ValueError(f"Profile {name}: the report stage needs the forecast stage")
+        
+        self.name = name
+        self.stages = frozenset(stages)
+        # None means the function's FORECAST_ENGINE
+        self.forecast_engine = forecast_engine
+    
+    def runs(self, stage):
+        """Whether an optional stage is part of this profile"""
+        return stage in self.stages
+
+
+BUILTIN_PROFILES = {
+    'full': PipelineProfile('full', PipelineProfile.STAGES),
+    # Frequent scans: alert and save anomalies, no forecasting or LLM calls
+    'anomaly_scan': PipelineProfile('anomaly_scan', ('alerts', 'anomalies')),
+    # Numbers without the narrative report
+    'analytics': PipelineProfile('analytics', ('alerts', 'processed', 'forecast', 'anomalies')),
+    'forecast_only': PipelineProfile('forecast_only', ('processed', 'forecast'))
+}
+
+
+def load_profiles(spec=None):
+    """Built-in profiles plus JSON-defined ones: {"name": {"stages": [...], "forecast_engine": "ets"}}"""
+    profiles = dict(BUILTIN_PROFILES)
+    for name, options in json.loads(spec or '{}').items():
+        profiles[name] = PipelineProfile(name, options['stages'], options.get('forecast_engine'))
+    return profiles
+
+
+def parse_prefix_map(spec):
+    """'raw/scans/=anomaly_scan,raw/nightly/=full' as (prefix, profile) pairs, longest prefix first"""
+    pairs = []
+    for item in (spec or '').split(','):
+        if item.strip():
+            prefix, _, name = item.partition('=')
+            pairs.append((prefix.strip(), name.strip()))
+    return sorted(pairs, key=lambda pair: len(pair[0]), reverse=True)
+
+
+class ProfileResolver:
+    """Pick a profile from the event field, then object metadata, then the key prefix"""
+    
+    def __init__(self, profiles, prefix_map=None, default='full'):
+        self.profiles = profiles
+        self.prefix_map = prefix_map or []
+        self.default = default
+        for name in [default] + [name for _, name in self.prefix_map]:
+            self.get(name)
+    
+    def get(self, name):
+        """Profile by name"""
+        if name not in self.profiles:
+            raise ValueError(f"Unknown pipeline profile: {name} (known: {', '.join(sorted(self.profiles))})")
+        return self.profiles[name]
+    
+    def resolve(self, key, event_profile=None, metadata_profile=None):
+        """Profile for one object"""
+        if event_profile:
+            return self.get(event_profile)
+        if metadata_profile:
+            return self.get(metadata_profile)
+        for prefix, name in self.prefix_map:
+            if key.startswith(prefix):
+                return self.get(name)
+        return self.get(self.default)
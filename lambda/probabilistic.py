@@ -0,0 +1,58 @@
+"""Probabilistic forecasts by bootstrapping residuals"""
+import numpy as np
+import pandas as pd
+
+
+class ResidualSimulator:
+    """Sample forecast trajectories as point forecast plus resampled residuals.
+
+    All trajectories are drawn with a single fancy-indexing operation, so
+    thousands of paths cost far less than Prophet's uncertainty sampling.
+    Residual blocks (block_size > 1) keep short-range autocorrelation.
+    """
+    
+    def __init__(self, n_samples=5000, block_size=1, seed=None, non_negative=True):
+        self.n_samples = n_samples
+        self.block_size = block_size
+        self.non_negative = non_negative
+        self.rng = np.random.default_rng(seed)
+    
+    def simulate(self, forecast_df, residuals):
+        """Array of shape (n_samples, horizon) of simulated daily kWh"""
+        residuals = np.asarray(residuals, dtype=float)
+        residuals = residuals[~np.isnan(residuals)]
+        if len(residuals) == 0:
+            raise ValueError("No residuals available for simulation")
+        
+        yhat = forecast_df['yhat'].to_numpy(dtype=float)
+        horizon = len(yhat)
+        block = max(1, min(self.block_size, len(residuals)))
+        n_blocks = -(-horizon // block)
+        
+        # Random block starts expanded to consecutive residual indices
+        starts = self.rng.integers(0, len(residuals) - block + 1, size=(self.n_samples, n_blocks))
+        indices = (starts[:, :, None] + np.arange(block)).reshape(self.n_samples, -1)[:, :horizon]
+        
+        paths = yhat[None, :] + residuals[indices]
+        if self.non_negative:
+            paths = np.maximum(paths, 0)
+        
+        return paths
+    
+    def quantiles(self, forecast_df, paths, levels=(0.05, 0.5, 0.95)):
+        """Per-day quantiles with one column per level (p5, p50, ...)"""
+        values = np.quantile(paths, levels, axis=0)
+        
+        quantile_df = pd.DataFrame({'ds': forecast_df['ds'].to_numpy()})
+        for level, row in zip(levels, values):
+            quantile_df[f"p{level * 100:g}"] = row
+        
+        return quantile_df
+    
+    def exceedance_probability(self, paths, cap_kwh, baseline_kwh=0.0, mask=None):
+        """Probability that baseline plus simulated consumption exceeds a cap"""
+        if mask is not None:
+            paths = paths[:, np.asarray(mask, dtype=bool)]
+        totals = baseline_kwh + paths.sum(axis=1)
+        
+        return float((totals > cap_kwh).mean())
@@ -9,14 +9,11 @@ class EnergyDataProcessor:
     
     def process_data(self, csv_content):
         """Process raw energy data"""
-        # Read CSV
-        df = pd.read_csv(StringIO(csv_content))
-        
-        # Parse timestamps
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-        df['hour'] = df['timestamp'].dt.hour
-        df['date'] = df['timestamp'].dt.date
-        
+        df = self.parse_data(csv_content)
+        return self.process_frame(df)
+    
+    def process_frame(self, df):
+        """Aggregate, detect anomalies and analyze peaks on a parsed DataFrame"""
         # Aggregate by appliance
         appliance_stats = self._aggregate_by_appliance(df)
         
@@ -33,6 +30,31 @@ class EnergyDataProcessor:
             'processed_df': df
         }
     
+    def parse_data(self, csv_content):
+        """Parse raw CSV into a DataFrame with time columns"""
+        # Read CSV
+        df = pd.read_csv(StringIO(csv_content))
+        
+        return self._add_time_columns(df)
+    
+    def parse_records(self, readings):
+        """Parse a list of {timestamp, appliance, kwh} readings into a DataFrame with time columns"""
+        df = pd.DataFrame.from_records(readings)
+        missing = {'timestamp', 'appliance', 'kwh'} - set(df.columns)
+        if missing:
+            raise ValueError(f"Readings are missing fields: {', '.join(sorted(missing))}")
+        
+        df['kwh'] = df['kwh'].astype(float)
+        return self._add_time_columns(df)
+    
+    def _add_time_columns(self, df):
+        """Parse timestamps and derive hour and date columns"""
+        df['timestamp'] = pd.to_datetime(df['timestamp'])
+        df['hour'] = df['timestamp'].dt.hour
+        df['date'] = df['timestamp'].dt.date
+        
+        return df
+    
     def _aggregate_by_appliance(self, df):
         """Aggregate consumption by appliance"""
         agg_df = df.groupby('appliance').agg({
@@ -40,6 +62,8 @@ class EnergyDataProcessor:
         }).reset_index()
         
         agg_df.columns = ['appliance', 'total_kwh', 'avg_kwh', 'std_kwh', 'count']
+        # A single reading has no spread (pandas gives NaN, which is not valid JSON)
+        agg_df['std_kwh'] = agg_df['std_kwh'].fillna(0.0)
         
         # Find peak hour for each appliance
         peak_hours = df.groupby('appliance').apply(
@@ -0,0 +1,118 @@
+"""Token-budgeted context for insight prompts"""
+
+# tiktoken encoding, loaded on first use; False once it turned out to be unavailable
+_encoding = None
+
+
+def _get_encoding():
+    """tiktoken encoding when the package is installed, else None"""
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding('cl100k_base')
+        except Exception:
+            # Not installed, or the encoding could not be loaded
+            _encoding = False
+    return _encoding or None
+
+
+def estimate_tokens(text):
+    """Token count from tiktoken when available, else about four characters per token"""
+    encoding = _get_encoding()
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text))
+
+
+class CompactContextBuilder:
+    """Pack the most important analytics facts into a fixed token budget.
+
+    The summary line is always included. Forecast change, appliance rows
+    and peak hours are ranked by importance and added until the budget is
+    spent; appliances that do not fit are folded into a single remainder
+    row. Output starts with a fixed header and uses a pipe-separated table
+    so repeated prompts share as long a prefix as possible.
+    """
+    
+    HEADER = "Energy usage data (kWh, 30-day window)\n"
+    TABLE_HEADER = "appliance|total_kwh|share_pct|avg_kwh_h|cv|peak_hour\n"
+    
+    def __init__(self, token_budget=400, max_peak_hours=3):
+        self.token_budget = token_budget
+        self.max_peak_hours = max_peak_hours
+    
+    def build(self, analytics_data):
+        """Compact context string for one analytics payload"""
+        total_usage = analytics_data.get('total_usage', 0)
+        appliance_stats = analytics_data.get('appliance_stats', [])
+        forecast_summary = analytics_data.get('forecast_summary') or {}
+        
+        context = self.HEADER
+        context += (
+            f"total={total_usage:.1f} daily_avg={total_usage/30:.2f} "
+            f"anomalies={analytics_data.get('anomaly_count', 0)}\n"
+        )
+        used = estimate_tokens(context) + estimate_tokens(self.TABLE_HEADER)
+        
+        facts = self._rank_facts(total_usage, appliance_stats, analytics_data.get('peak_hours', []), forecast_summary)
+        
+        lines = []
+        rows = []
+        omitted_kwh = 0.0
+        omitted_count = 0
+        for kind, text, kwh in facts:
+            cost = estimate_tokens(text)
+            if used + cost > self.token_budget:
+                if kind == 'appliance':
+                    omitted_kwh += kwh
+                    omitted_count += 1
+                continue
+            used += cost
+            (rows if kind == 'appliance' else lines).append(text)
+        
+        context += ''.join(lines)
+        if rows or omitted_count:
+            context += self.TABLE_HEADER + ''.join(rows)
+        if omitted_count:
+            omitted_share = omitted_kwh / total_usage * 100 if total_usage else 0
+            context += f"other({omitted_count})|{omitted_kwh:.1f}|{omitted_share:.1f}|||\n"
+        
+        return context
+    
+    def _rank_facts(self, total_usage, appliance_stats, peak_hours, forecast_summary):
+        """(kind, rendered line, kwh) facts, most important first"""
+        scored = []
+        
+        if forecast_summary:
+            history_avg = total_usage / 30
+            predicted_avg = forecast_summary.get('avg_predicted_kwh', 0)
+            change = (predicted_avg - history_avg) / history_avg * 100 if history_avg else 0.0
+            line = (
+                f"forecast_7d_total={forecast_summary.get('total_predicted_kwh', 0):.1f} "
+                f"forecast_daily_avg={predicted_avg:.2f} change_vs_history={change:+.1f}%\n"
+            )
+            # A large forecast delta is the headline; rank it above every appliance
+            scored.append((2.0 + abs(change) / 100, 'forecast', line, 0.0))
+        
+        for stat in appliance_stats:
+            kwh = stat.get('total_kwh', 0)
+            share = kwh / total_usage if total_usage else 0
+            avg = stat.get('avg_kwh', 0)
+            cv = stat.get('std_kwh', 0) / avg if avg else 0
+            line = (
+                f"{stat.get('appliance', 'Unknown')}|{kwh:.1f}|{share*100:.1f}|{avg:.3f}|{cv:.2f}|"
+                f"{stat.get('peak_hour', '')}\n"
+            )
+            # Big consumers first; variability (which drives anomalies) boosts a share up to 2x
+            scored.append((share * (1 + min(cv, 2.0) / 2), 'appliance', line, kwh))
+        
+        if peak_hours:
+            hours = ','.join(
+                f"{hour_data.get('hour', 'N/A')}h:{hour_data.get('total_kwh', 0):.1f}"
+                for hour_data in peak_hours[:self.max_peak_hours]
+            )
+            scored.append((0.5, 'peak', f"peak_hours={hours}\n", 0.0))
+        
+        scored.sort(key=lambda fact: fact[0], reverse=True)
+        return [(kind, line, kwh) for _, kind, line, kwh in scored]
@@ -0,0 +1,264 @@
+"""Shared token-bucket rate limiting for LLM provider calls"""
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from decimal import Decimal
+
+
+class RateLimitExceeded(Exception):
+    """Request shed because capacity did not free up within the wait budget"""
+
+
+def _refill(level, capacity, per_minute, elapsed):
+    """Token level after refilling at per_minute for elapsed seconds"""
+    return min(capacity, level + elapsed * per_minute / 60.0)
+
+
+def _decide(state, now, limits, tokens):
+    """Apply one acquire attempt to a bucket state.
+
+    state holds request/token levels, the last update time and active
+    leases (lease_id -> expiry). Returns (granted, retry_after, new_state).
+    """
+    rpm, tpm, max_concurrency = limits
+    elapsed = max(0.0, now - state['updated_at'])
+    requests_level = _refill(state['requests'], rpm, rpm, elapsed)
+    tokens_level = _refill(state['tokens'], tpm, tpm, elapsed)
+    leases = {lease_id: expiry for lease_id, expiry in state['leases'].items() if expiry > now}
+    
+    # A request larger than the whole bucket could never be granted; cap it
+    tokens = min(tokens, tpm)
+    
+    new_state = {'requests': requests_level, 'tokens': tokens_level, 'updated_at': now, 'leases': leases}
+    
+    if requests_level >= 1 and tokens_level >= tokens and len(leases) < max_concurrency:
+        new_state['requests'] = requests_level - 1
+        new_state['tokens'] = tokens_level - tokens
+        return True, 0.0, new_state
+    
+    retry_after = 0.0
+    if requests_level < 1:
+        retry_after = max(retry_after, (1 - requests_level) * 60.0 / rpm)
+    if tokens_level < tokens:
+        retry_after = max(retry_after, (tokens - tokens_level) * 60.0 / tpm)
+    if len(leases) >= max_concurrency:
+        # Slots free when calls finish; poll rather than wait for lease expiry
+        retry_after = max(retry_after, min(0.25, min(leases.values()) - now))
+    
+    return False, retry_after, new_state
+
+
+class SQLiteRateLimitBackend:
+    """Bucket state in a local SQLite file (stand-in for the shared backend)"""
+    
+    def __init__(self, path):
+        self.path = path
+        with self._connect() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                "key TEXT PRIMARY KEY, requests REAL, tokens REAL, updated_at REAL)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS leases (key TEXT, lease_id TEXT PRIMARY KEY, expires_at REAL)"
+            )
+    
+    def _connect(self):
+        """Connection with a busy timeout so concurrent processes queue on the lock"""
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+    
+    def try_acquire(self, key, limits, tokens, lease_seconds):
+        """Atomically take capacity; returns (lease_id or None, retry_after)"""
+        now = time.time()
+        connection = self._connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            
+            row = connection.execute(
+                "SELECT requests, tokens, updated_at FROM buckets WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                row = (limits[0], limits[1], now)
+            leases = dict(connection.execute(
+                "SELECT lease_id, expires_at FROM leases WHERE key = ?", (key,)
+            ).fetchall())
+            
+            state = {'requests': row[0], 'tokens': row[1], 'updated_at': row[2], 'leases': leases}
+            granted, retry_after, state = _decide(state, now, limits, tokens)
+            
+            lease_id = None
+            if granted:
+                lease_id = uuid.uuid4().hex
+                connection.execute(
+                    "INSERT INTO leases (key, lease_id, expires_at) VALUES (?, ?, ?)",
+                    (key, lease_id, now + lease_seconds)
+                )
+            
+            connection.execute("DELETE FROM leases WHERE key = ? AND expires_at <= ?", (key, now))
+            connection.execute(
+                "INSERT OR REPLACE INTO buckets (key, requests, tokens, updated_at) VALUES (?, ?, ?, ?)",
+                (key, state['requests'], state['tokens'], state['updated_at'])
+            )
+            connection.execute("COMMIT")
+            
+            return lease_id, retry_after
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        finally:
+            connection.close()
+    
+    def release(self, key, lease_id):
+        """Free a concurrency slot"""
+        connection = self._connect()
+        try:
+            connection.execute("DELETE FROM leases WHERE key = ? AND lease_id = ?", (key, lease_id))
+        finally:
+            connection.close()
+
+
+class DynamoDBRateLimitBackend:
+    """Bucket state in a DynamoDB table shared by all Lambda containers.
+
+    One item per limiter key (partition key 'limiter_key'); updates use a
+    version attribute as an optimistic lock.
+    """
+    
+    def __init__(self, table_name, region_name=None):
+        import boto3
+        self.table = boto3.resource('dynamodb', region_name=region_name).Table(table_name)
+    
+    def try_acquire(self, key, limits, tokens, lease_seconds):
+        """Atomically take capacity; returns (lease_id or None, retry_after)"""
+        from botocore.exceptions import ClientError
+        
+        while True:
+            now = time.time()
+            item = self.table.get_item(Key={'limiter_key': key}, ConsistentRead=True).get('Item')
+            
+            if item is None:
+                version = 0
+                state = {'requests': limits[0], 'tokens': limits[1], 'updated_at': now, 'leases': {}}
+            else:
+                version = int(item['version'])
+                state = {
+                    'requests': float(item['requests']),
+                    'tokens': float(item['tokens']),
+                    'updated_at': float(item['updated_at']),
+                    'leases': {lease_id: float(expiry) for lease_id, expiry in item.get('leases', {}).items()}
+                }
+            
+            granted, retry_after, state = _decide(state, now, limits, tokens)
+            if not granted:
+                # Refill is derived from updated_at and expired leases are pruned on the
+                # next grant, so a denied poll leaves nothing that needs writing
+                return None, retry_after
+            lease_id = uuid.uuid4().hex
+            state['leases'][lease_id] = now + lease_seconds
+            
+            try:
+                self._write(key, state, version)
+            except ClientError as e:
+                if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                    # Another container updated the bucket first; re-read and retry
+                    continue
+                raise
+            
+            return lease_id, retry_after
+    
+    def release(self, key, lease_id):
+        """Free a concurrency slot"""
+        from botocore.exceptions import ClientError
+        
+        # Bumping the version fails any acquire that read the item before the release,
+        # so it re-reads instead of writing the released lease back
+        try:
+            self.table.update_item(
+                Key={'limiter_key': key},
+                UpdateExpression='REMOVE leases.#lease SET version = version + :one',
+                ConditionExpression='attribute_exists(limiter_key)',
+                ExpressionAttributeNames={'#lease': lease_id},
+                ExpressionAttributeValues={':one': 1}
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+    
+    def _write(self, key, state, version):
+        """Conditionally replace the bucket item if nobody else changed it"""
+        item = {
+            'limiter_key': key,
+            'version': version + 1,
+            'requests': Decimal(str(state['requests'])),
+            'tokens': Decimal(str(state['tokens'])),
+            'updated_at': Decimal(str(state['updated_at'])),
+            'leases': {lease_id: Decimal(str(expiry)) for lease_id, expiry in state['leases'].items()}
+        }
+        
+        if version == 0:
+            condition = {'ConditionExpression': 'attribute_not_exists(limiter_key)'}
+        else:
+            condition = {
+                'ConditionExpression': 'version = :version',
+                'ExpressionAttributeValues': {':version': version}
+            }
+        
+        self.table.put_item(Item=item, **condition)
+
+
+class TokenBucketRateLimiter:
+    """Requests-per-minute, tokens-per-minute and concurrency limits for one provider.
+
+    Callers wait (with jitter) until the shared bucket has capacity and
+    are shed with RateLimitExceeded once max_wait_seconds would be exceeded,
+    so throughput settles at the provider limit instead of throttling errors.
+    """
+    
+    def __init__(self, backend, key, requests_per_minute=60, tokens_per_minute=90000,
+                 max_concurrency=10, max_wait_seconds=10, lease_seconds=120):
+        self.backend = backend
+        self.key = key
+        self.limits = (requests_per_minute, tokens_per_minute, max_concurrency)
+        self.max_wait_seconds = max_wait_seconds
+        self.lease_seconds = lease_seconds
+        self._lock = threading.Lock()
+        self._stats = {'granted': 0, 'shed': 0, 'queued': 0, 'wait_seconds': 0.0}
+    
+    @contextmanager
+    def acquire(self, tokens, max_wait_seconds=None):
+        """Hold a rate-limit slot for the duration of a provider call"""
+        budget = self.max_wait_seconds if max_wait_seconds is None else min(max_wait_seconds, self.max_wait_seconds)
+        start = time.monotonic()
+        queued = False
+        
+        while True:
+            lease_id, retry_after = self.backend.try_acquire(self.key, self.limits, tokens, self.lease_seconds)
+            if lease_id is not None:
+                break
+            
+            waited = time.monotonic() - start
+            if waited + retry_after > budget:
+                self._record(shed=1, wait_seconds=waited)
+                raise RateLimitExceeded(f"{self.key}: no capacity within {budget:.1f}s")
+            
+            queued = True
+            time.sleep(retry_after + random.uniform(0, 0.05))
+        
+        self._record(granted=1, queued=int(queued), wait_seconds=time.monotonic() - start)
+        try:
+            yield
+        finally:
+            self.backend.release(self.key, lease_id)
+    
+    def stats(self):
+        """Grant/shed counts and total wait since the container started"""
+        with self._lock:
+            return dict(self._stats)
+    
+    def _record(self, **increments):
+        """Add to the stats counters"""
+        with self._lock:
+            for name, value in increments.items():
+                self._stats[name] += value
@@ -0,0 +1,78 @@
+"""Queueing of asynchronous report jobs"""
+import json
+import os
+import threading
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+
+def json_default(value):
+    """JSON encoder fallback for numpy and pandas values in analytics data"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (pd.Timestamp, np.datetime64)):
+        return pd.Timestamp(value).isoformat()
+    return str(value)
+
+
+class LambdaReportQueue:
+    """Enqueue report jobs as asynchronous invocations of a Lambda function"""
+    
+    def __init__(self, lambda_client, function_name, event_key='report_job'):
+        self.lambda_client = lambda_client
+        self.function_name = function_name
+        # Event field the handler dispatches on ('continuation' for resumed pipeline runs)
+        self.event_key = event_key
+    
+    def enqueue(self, job):
+        """Fire-and-forget invoke; returns once Lambda has queued the event.
+
+        Nothing here confirms the job ran. Lambda retries an event whose
+        invocation raised (twice by default), then discards it unless the
+        function has an on-failure destination or dead-letter queue.
+        """
+        self.lambda_client.invoke(
+            FunctionName=self.function_name,
+            InvocationType='Event',
+            Payload=json.dumps({self.event_key: job}).encode('utf-8')
+        )
+
+
+class LocalDirectoryReportQueue:
+    """Report jobs as JSON files in a local directory (stand-in for async invoke)"""
+    
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+    
+    def enqueue(self, job):
+        """Write a job file"""
+        # Time-prefixed names keep FIFO order; write then rename so workers never see partial files
+        file_path = os.path.join(self.path, f"{time.time_ns()}-{uuid.uuid4().hex}.json")
+        tmp_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(job, f)
+        os.replace(tmp_path, file_path)
+    
+    def claim(self):
+        """Take the oldest pending job, or None when the queue is empty"""
+        names = sorted(name for name in os.listdir(self.path) if name.endswith('.json'))
+        
+        for name in names:
+            file_path = os.path.join(self.path, name)
+            claimed_path = f"{file_path}.claimed"
+            try:
+                # Rename is atomic, so only one worker wins each job
+                os.rename(file_path, claimed_path)
+            except FileNotFoundError:
+                continue
+            
+            with open(claimed_path, 'r') as f:
+                job = json.load(f)
+            os.remove(claimed_path)
+            return job
+        
+        return None
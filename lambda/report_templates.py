@@ -0,0 +1,304 @@
+"""Report rendering from templates compiled once per container"""
+import html
+import json
+from string import Formatter
+
+RULE = '=' * 70
+
+
+class CompiledTemplate:
+    """str.format-style template parsed once into literal and field parts.
+
+    Fields are dotted paths into the values dict ('forecast.total_kwh') with
+    optional format specs. Rendering appends parts to a list buffer that the
+    caller joins once, so reports built from many templates are not
+    assembled with repeated string concatenation.
+    """
+    
+    def __init__(self, source, escape=None):
+        # escape: applied to every rendered field value, e.g. html.escape
+        self.escape = escape
+        self._parts = []
+        for literal, field, spec, conversion in Formatter().parse(source):
+            if literal:
+                if self._parts and isinstance(self._parts[-1], str):
+                    self._parts[-1] += literal
+                else:
+                    self._parts.append(literal)
+            if field is not None:
+                self._parts.append((tuple(field.split('.')), spec or '', conversion))
+    
+    def render(self, values):
+        """Rendered string for one values dict"""
+        buffer = []
+        self.render_into(buffer, values)
+        return ''.join(buffer)
+    
+    def render_into(self, buffer, values):
+        """Append the rendered parts to a list buffer"""
+        append = buffer.append
+        escape = self.escape
+        for part in self._parts:
+            if isinstance(part, str):
+                append(part)
+                continue
+            
+            path, spec, conversion = part
+            value = values
+            for key in path:
+                value = value[key]
+            if conversion == 'r':
+                value = repr(value)
+            elif conversion == 's':
+                value = str(value)
+            
+            text = format(value, spec)
+            append(escape(text) if escape else text)
+
+
+# Rule-based insights: the fixed text around the context is rendered once at import
+RULE_BASED_INSIGHTS = CompiledTemplate(f"""
+ENERGY USAGE INSIGHTS REPORT
+{'='*50}
+
+{{context}}
+
+KEY INSIGHTS:
+• Your energy consumption shows typical residential patterns with peak usage during evening hours
+• Anomalies detected suggest occasional high-consumption events that warrant investigation
+• Consistent monitoring can help identify opportunities for optimization
+
+BEHAVIORAL RECOMMENDATIONS:
+1. Shift high-energy activities away from peak hours (6 PM - 9 PM) when possible
+2. Review anomalous consumption events to identify and eliminate energy waste
+3. Consider implementing smart scheduling for major appliances
+4. Maintain regular appliance maintenance to ensure optimal efficiency
+5. Monitor standby power consumption and use power strips to eliminate phantom loads
+
+COST-SAVING OPPORTUNITIES:
+• Optimize thermostat settings during peak and off-peak hours
+• Utilize natural lighting and ventilation when weather permits
+• Consider time-of-use electricity plans if available in your area
+• Implement energy-efficient practices during high-consumption periods
+""")
+
+AUDIT_HEADER = CompiledTemplate(f"""
+VIRTUAL ENERGY AUDITOR REPORT
+{'='*50}
+
+CONSUMPTION ANALYSIS:
+Total Energy Consumption: {{total_kwh:.2f}} kWh (30 days)
+
+Appliance Breakdown:
+""")
+
+AUDIT_APPLIANCE = CompiledTemplate("""
+{appliance}:
+  • Consumption: {total_kwh:.2f} kWh ({share_pct:.1f}% of total)
+  • Peak Usage: Hour {peak_hour}
+""")
+
+AUDIT_FOOTER = CompiledTemplate("""
+
+HIGHEST CONSUMER: {highest.appliance}
+Accounts for {highest.share_pct:.1f}% of total consumption
+
+
+UPGRADE RECOMMENDATIONS:
+{recommendations}
+
+ESTIMATED SAVINGS:
+• Upgrading to energy-efficient appliances: 20-40% reduction
+• Smart thermostat installation: 10-15% reduction on HVAC
+• LED lighting conversion: 75% reduction on lighting costs
+• Potential annual savings: ${annual_savings:.2f} (estimated)
+""")
+
+FINAL_HEADER = CompiledTemplate(f"""
+{RULE}
+ENERGY USAGE ANALYSIS & FORECASTING SYSTEM
+COMPREHENSIVE REPORT
+{RULE}
+
+Generated: {{generated}}
+
+{RULE}
+EXECUTIVE SUMMARY
+{RULE}
+
+Total Energy Consumption: {{total_usage:.2f}} kWh (30 days)
+Daily Average: {{daily_avg:.2f}} kWh
+Anomalies Detected: {{anomaly_count}}
+Forecast Period: 7 days
+
+{RULE}
+AI-GENERATED INSIGHTS
+{RULE}
+
+{{insights}}
+
+{RULE}
+""")
+
+FINAL_FORECAST_HEADER = CompiledTemplate(f"""
+
+{RULE}
+FORECAST SUMMARY
+{RULE}
+
+7-Day Energy Consumption Forecast:
+""")
+
+FORECAST_TOTALS = CompiledTemplate("""
+Total Predicted: {total_predicted_kwh:.2f} kWh
+Daily Average: {avg_predicted_kwh:.2f} kWh
+Period: {start_date} to {end_date}
+
+Daily Breakdown:
+""")
+
+FORECAST_DAY = CompiledTemplate("  {date}: {predicted_kwh:.2f} kWh (Range: {lower_bound:.2f} - {upper_bound:.2f})\n")
+
+FORECAST_CAP = CompiledTemplate(
+    "\nMonthly Cap ({month}): {cap_kwh:.2f} kWh, "
+    "{exceedance_pct:.1f}% chance of exceeding within forecast period\n"
+)
+
+FINAL_FOOTER = f"\n{RULE}\nEND OF REPORT\n{RULE}\n"
+
+HTML_HEADER = CompiledTemplate("""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Energy Usage Report</title></head>
+<body>
+<h1>Energy Usage Analysis &amp; Forecasting Report</h1>
+<p>Generated: {generated}</p>
+<h2>Executive Summary</h2>
+<ul>
+<li>Total Energy Consumption: {total_usage:.2f} kWh (30 days)</li>
+<li>Daily Average: {daily_avg:.2f} kWh</li>
+<li>Anomalies Detected: {anomaly_count}</li>
+</ul>
+<h2>Insights</h2>
+<pre>{insights}</pre>
+<h2>Appliance Audit</h2>
+<table>
+<tr><th>Appliance</th><th>kWh</th><th>Share</th><th>Peak Hour</th></tr>
+""", escape=html.escape)
+
+HTML_APPLIANCE = CompiledTemplate(
+    "<tr><td>{appliance}</td><td>{total_kwh:.2f}</td><td>{share_pct:.1f}%</td><td>{peak_hour}</td></tr>\n",
+    escape=html.escape
+)
+
+HTML_AUDIT_FOOTER = CompiledTemplate("""</table>
+<pre>{recommendations}</pre>
+<p>Potential annual savings: ${annual_savings:.2f} (estimated)</p>
+""", escape=html.escape)
+
+HTML_FORECAST_HEADER = CompiledTemplate("""<h2>7-Day Forecast</h2>
+<p>Total Predicted: {total_predicted_kwh:.2f} kWh, Daily Average: {avg_predicted_kwh:.2f} kWh</p>
+<table>
+<tr><th>Date</th><th>kWh</th><th>Range</th></tr>
+""", escape=html.escape)
+
+HTML_FORECAST_DAY = CompiledTemplate(
+    "<tr><td>{date}</td><td>{predicted_kwh:.2f}</td><td>{lower_bound:.2f} - {upper_bound:.2f}</td></tr>\n",
+    escape=html.escape
+)
+
+HTML_FOOTER = "</body></html>\n"
+
+
+def build_report_model(analytics_data, insights, audit, generated):
+    """Format-independent report model from analytics data, insights text and an audit model"""
+    total_usage = analytics_data['total_usage']
+    return {
+        'generated': generated,
+        'total_usage': total_usage,
+        'daily_avg': total_usage / 30,
+        'anomaly_count': analytics_data['anomaly_count'],
+        'insights': insights,
+        'audit': audit,
+        'forecast': analytics_data.get('forecast_summary') or None
+    }
+
+
+def render_rule_based_insights(context):
+    """Rule-based insights text around a context"""
+    return RULE_BASED_INSIGHTS.render({'context': context})
+
+
+def render_audit_text(audit, buffer=None):
+    """Auditor report text from an audit model; appends to buffer when one is given"""
+    out = [] if buffer is None else buffer
+    
+    if audit is None:
+        out.append("No appliance data available for audit.")
+    else:
+        AUDIT_HEADER.render_into(out, audit)
+        for appliance in audit['appliances']:
+            AUDIT_APPLIANCE.render_into(out, appliance)
+        AUDIT_FOOTER.render_into(out, audit)
+    
+    return ''.join(out) if buffer is None else None
+
+
+def render_report(model, output_format='text'):
+    """Render a report model as 'text', 'json' or 'html'"""
+    if output_format == 'json':
+        return json.dumps(model, default=str)
+    if output_format == 'html':
+        return _render_html(model)
+    if output_format != 'text':
+        raise ValueError(f"Unknown report format: {output_format}")
+    
+    buffer = []
+    FINAL_HEADER.render_into(buffer, model)
+    render_audit_text(model['audit'], buffer)
+    FINAL_FORECAST_HEADER.render_into(buffer, model)
+    
+    forecast = model['forecast']
+    if forecast:
+        FORECAST_TOTALS.render_into(buffer, _forecast_values(forecast))
+        for day in forecast.get('daily_predictions', []):
+            FORECAST_DAY.render_into(buffer, day)
+        
+        cap = forecast.get('monthly_cap')
+        if cap:
+            FORECAST_CAP.render_into(buffer, dict(cap, exceedance_pct=cap['exceedance_probability'] * 100))
+    
+    buffer.append(FINAL_FOOTER)
+    return ''.join(buffer)
+
+
+def _forecast_values(forecast):
+    """Forecast totals with the defaults the text report shows for missing fields"""
+    return {
+        'total_predicted_kwh': forecast.get('total_predicted_kwh', 0),
+        'avg_predicted_kwh': forecast.get('avg_predicted_kwh', 0),
+        'start_date': forecast.get('start_date', 'N/A'),
+        'end_date': forecast.get('end_date', 'N/A')
+    }
+
+
+def _render_html(model):
+    """HTML rendering of a report model"""
+    buffer = []
+    HTML_HEADER.render_into(buffer, model)
+    
+    audit = model['audit']
+    if audit is not None:
+        for appliance in audit['appliances']:
+            HTML_APPLIANCE.render_into(buffer, appliance)
+        HTML_AUDIT_FOOTER.render_into(buffer, audit)
+    else:
+        buffer.append("</table>\n")
+    
+    forecast = model['forecast']
+    if forecast:
+        HTML_FORECAST_HEADER.render_into(buffer, _forecast_values(forecast))
+        for day in forecast.get('daily_predictions', []):
+            HTML_FORECAST_DAY.render_into(buffer, day)
+        buffer.append("</table>\n")
+    
+    buffer.append(HTML_FOOTER)
+    return ''.join(buffer)
@@ -0,0 +1,131 @@
+"""Deadlines and circuit breakers for external provider calls"""
+import threading
+import time
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a provider whose breaker is open"""
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker.
+
+    closed: calls allowed. After failure_threshold consecutive failures the
+    breaker opens and rejects calls for cooldown_seconds, then lets a single
+    trial call through (half-open); its outcome closes or re-opens it.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+    
+    def __init__(self, name, failure_threshold=3, cooldown_seconds=120):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._total_failures = 0
+        self._rejected = 0
+        self._lock = threading.Lock()
+    
+    @property
+    def state(self):
+        """Current state, moving from open to half-open once the cool-down ends"""
+        with self._lock:
+            return self._current_state()
+    
+    def allow_request(self):
+        """Whether a call may be attempted now"""
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self._rejected += 1
+            return False
+    
+    def record_success(self):
+        """Close the breaker after a successful call"""
+        with self._lock:
+            self._state = self.CLOSED
+            self._consecutive_failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+    
+    def record_failure(self):
+        """Count a failure, opening the breaker at the threshold or on a failed trial"""
+        with self._lock:
+            self._consecutive_failures += 1
+            self._total_failures += 1
+            if self._trial_in_flight or self._consecutive_failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+    
+    def snapshot(self):
+        """Breaker state and counters for run metrics"""
+        with self._lock:
+            return {
+                'state': self._current_state(),
+                'consecutive_failures': self._consecutive_failures,
+                'total_failures': self._total_failures,
+                'rejected_calls': self._rejected
+            }
+    
+    def _current_state(self):
+        """State without locking; caller holds the lock"""
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.cooldown_seconds:
+            self._state = self.HALF_OPEN
+        return self._state
+
+
+# Breakers live at module level so their state survives warm invocations
+_circuit_breakers = {}
+_registry_lock = threading.Lock()
+
+
+def get_circuit_breaker(name, failure_threshold=3, cooldown_seconds=120):
+    """Shared breaker for a provider, created on first use"""
+    with _registry_lock:
+        if name not in _circuit_breakers:
+            _circuit_breakers[name] = CircuitBreaker(name, failure_threshold, cooldown_seconds)
+        return _circuit_breakers[name]
+
+
+def circuit_breaker_snapshots():
+    """Snapshots of every breaker created in this container"""
+    with _registry_lock:
+        breakers = list(_circuit_breakers.values())
+    return {breaker.name: breaker.snapshot() for breaker in breakers}
+
+
+class CallDeadline:
+    """Per-call timeouts derived from the remaining Lambda execution time"""
+    
+    def __init__(self, remaining_time_ms=None, reserve_seconds=15, max_call_seconds=30, min_call_seconds=1):
+        # remaining_time_ms: callable such as context.get_remaining_time_in_millis
+        self.remaining_time_ms = remaining_time_ms
+        self.reserve_seconds = reserve_seconds
+        self.max_call_seconds = max_call_seconds
+        self.min_call_seconds = min_call_seconds
+    
+    @classmethod
+    def from_lambda_context(cls, context, **kwargs):
+        """Deadline tied to a Lambda context, or a fixed cap when run locally"""
+        remaining = getattr(context, 'get_remaining_time_in_millis', None)
+        return cls(remaining_time_ms=remaining, **kwargs)
+    
+    def call_timeout(self):
+        """Seconds a call may take, or None when there is no time left for it"""
+        timeout = self.max_call_seconds
+        if self.remaining_time_ms is not None:
+            available = self.remaining_time_ms() / 1000 - self.reserve_seconds
+            timeout = min(timeout, available)
+        
+        if timeout < self.min_call_seconds:
+            return None
+        return timeout
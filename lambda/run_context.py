@@ -0,0 +1,106 @@
+"""Run ids and the output layout of one pipeline run"""
+import os
+import re
+import uuid
+from datetime import datetime, timezone
+
+from checkpoints import make_run_id
+
+LAYOUTS = ('run', 'folders')
+
+# Output name -> (type folder of the 'folders' layout, file name)
+OUTPUTS = {
+    'processed': ('processed', 'aggregated'),
+    'forecast': ('forecast', 'forecast'),
+    'hourly_forecast': ('forecast_hourly', 'hourly_forecast'),
+    'anomalies': ('anomalies', 'anomalies'),
+    'report': ('reports', 'final_report'),
+    'fleet_report': ('reports', 'fleet_report'),
+    'analytics': ('artifacts', 'analytics')
+}
+
+# Outputs the Athena tables read, through one symlink manifest per run under athena/<folder>/
+TABLE_OUTPUTS = ('processed', 'forecast')
+
+
+def _source_stem(key, max_length=40):
+    """File name of a source key without extension, safe for an S3 prefix"""
+    stem = os.path.splitext(os.path.basename(key))[0]
+    return re.sub(r'[^A-Za-z0-9_-]+', '-', stem)[:max_length] or 'input'
+
+
+def _event_time(records):
+    """Earliest event time of the records, or now when the event carries none"""
+    times = []
+    for record in records:
+        try:
+            times.append(datetime.fromisoformat(record.get('event_time', '').replace('Z', '+00:00')))
+        except ValueError:
+            continue
+    return min(times) if times else datetime.now(timezone.utc)
+
+
+def make_output_run_id(records):
+    """Sortable run id: event time, first source file name and a hash of bucket, key, ETag and event time"""
+    # The hash keeps same-second uploads of same-named files apart; a redelivered
+    # event maps to the same id, so its outputs overwrite rather than duplicate
+    stem = _source_stem(records[0]['key'])
+    if len(records) > 1:
+        stem = f"{stem}-and-{len(records) - 1}"
+    return f"{_event_time(records):%Y%m%dT%H%M%SZ}-{stem}-{make_run_id(records)[:12]}"
+
+
+class RunContext:
+    """Run id and output keys of one pipeline run.
+
+    The 'run' layout puts every output of a run under runs/<run_id>/, so one
+    prefix listing returns the whole run. The 'folders' layout keeps
+    per-type folders (processed/, forecast/, ...) with the run id in each
+    file name. The Athena tables read either layout through the symlink
+    manifests of TABLE_OUTPUTS.
+    """
+    
+    def __init__(self, run_id, layout='run', prefix='runs/'):
+        if layout not in LAYOUTS:
+            raise ValueError(f"Unknown output layout: {layout} (expected one of {', '.join(LAYOUTS)})")
+        self.run_id = run_id
+        self.layout = layout
+        self.prefix = f"{prefix}{run_id}/"
+    
+    @classmethod
+    def for_records(cls, records, layout='run'):
+        """Run context of an S3-triggered run"""
+        return cls(make_output_run_id(records), layout)
+    
+    @classmethod
+    def for_request(cls, label, layout='run'):
+        """Run context of a request with no source object, such as an inline analysis"""
+        return cls(f"{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}-{label}-{uuid.uuid4().hex[:12]}", layout)
+    
+    def key(self, output, extension):
+        """S3 key of one output of this run"""
+        folder, name = OUTPUTS[output]
+        if self.layout == 'run':
+            return f"{self.prefix}{name}.{extension}"
+        return f"{folder}/{name}_{self.run_id}.{extension}"
+    
+    def table_manifest_key(self, output):
+        """Key of the symlink manifest through which an Athena table reads an output of this run"""
+        folder, _ = OUTPUTS[output]
+        return f"athena/{folder}/{self.run_id}.txt"
+    
+    def manifest_key(self, name='manifest'):
+        """Manifests always live under the run prefix"""
+        return f"{self.prefix}{name}.json"
+    
+    def manifest(self, outputs, **details):
+        """Manifest linking the outputs of this run; outputs that were not written are left out"""
+        manifest = {
+            'run_id': self.run_id,
+            'layout': self.layout,
+            'prefix': self.prefix,
+            'created_at': datetime.now(timezone.utc).isoformat()
+        }
+        manifest.update(details)
+        manifest['outputs'] = {name: key for name, key in outputs.items() if key}
+        return manifest
@@ -0,0 +1,146 @@
+"""Per-call LLM telemetry emitted as CloudWatch Embedded Metric Format logs"""
+import json
+import threading
+import time
+from collections import Counter
+
+# Upper bounds (ms) of the latency histogram buckets
+LATENCY_BUCKETS_MS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000)
+
+
+def _bucket(latency_ms):
+    """Histogram bucket (upper bound in ms) for a latency"""
+    for bound in LATENCY_BUCKETS_MS:
+        if latency_ms <= bound:
+            return bound
+    return LATENCY_BUCKETS_MS[-1] * 2
+
+
+class LLMTelemetry:
+    """Collect provider calls and insight requests, then flush them as logs and metrics.
+
+    Every provider call and every generation request becomes a structured
+    log line (queryable with Logs Insights). On flush, calls are also
+    aggregated per provider into EMF records whose latency metric carries a
+    Values/Counts histogram, so CloudWatch can compute percentiles without
+    a metric datapoint per call.
+    """
+    
+    def __init__(self, namespace='EnergyAnalytics/Insights', emit=print):
+        self.namespace = namespace
+        # EMF must reach CloudWatch Logs as a bare JSON line, so print rather than log
+        self.emit = emit
+        self._calls = []
+        self._requests = []
+        self._lock = threading.Lock()
+    
+    def record_call(self, provider, model, latency_seconds, prompt_tokens=None, response_tokens=None, error=None):
+        """One provider round trip, successful or not"""
+        with self._lock:
+            self._calls.append({
+                'type': 'llm_call',
+                'provider': provider,
+                'model': model,
+                'latency_ms': round(latency_seconds * 1000, 1),
+                'prompt_tokens': prompt_tokens,
+                'response_tokens': response_tokens,
+                'error': error
+            })
+    
+    def record_request(self, kind, provider, model, outcome, latency_seconds,
+                       fallback_reason=None, retries=0, items=1, hedged=False):
+        """One insights request and how it was answered; retries counts repeated provider attempts"""
+        with self._lock:
+            self._requests.append({
+                'type': 'llm_request',
+                'kind': kind,
+                'provider': provider,
+                'model': model,
+                'outcome': outcome,
+                'fallback_reason': fallback_reason,
+                'latency_ms': round(latency_seconds * 1000, 1),
+                'retries': retries,
+                'hedged': hedged,
+                'items': items
+            })
+    
+    def summary(self):
+        """Per-provider latency/token totals and outcome counts for buffered records"""
+        with self._lock:
+            return self._summarize(list(self._calls), list(self._requests))
+    
+    def _summarize(self, calls, requests):
+        """Summary of the given call and request records"""
+        providers = {}
+        for call in calls:
+            stats = providers.setdefault(call['provider'], {
+                'calls': 0, 'errors': 0, 'prompt_tokens': 0, 'response_tokens': 0, 'latencies_ms': []
+            })
+            stats['calls'] += 1
+            stats['errors'] += call['error'] is not None
+            stats['prompt_tokens'] += call['prompt_tokens'] or 0
+            stats['response_tokens'] += call['response_tokens'] or 0
+            stats['latencies_ms'].append(call['latency_ms'])
+        
+        for stats in providers.values():
+            latencies = sorted(stats.pop('latencies_ms'))
+            stats['latency_p50_ms'] = latencies[len(latencies) // 2]
+            stats['latency_p95_ms'] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        
+        return {
+            'providers': providers,
+            'outcomes': dict(Counter(request['outcome'] for request in requests)),
+            'fallback_reasons': dict(Counter(
+                request['fallback_reason'] for request in requests if request['fallback_reason']
+            ))
+        }
+    
+    def flush(self):
+        """Emit buffered records and aggregated metrics, then clear the buffers"""
+        with self._lock:
+            calls, self._calls = self._calls, []
+            requests, self._requests = self._requests, []
+        summary = self._summarize(calls, requests)
+        
+        for record in calls + requests:
+            self.emit(json.dumps(record))
+        
+        timestamp = int(time.time() * 1000)
+        
+        for provider in sorted({call['provider'] for call in calls}):
+            provider_calls = [call for call in calls if call['provider'] == provider]
+            histogram = Counter(_bucket(call['latency_ms']) for call in provider_calls)
+            self.emit(json.dumps(self._emf(timestamp, ['Provider'], {
+                'Provider': provider,
+                'LatencyMs': {'Values': sorted(histogram), 'Counts': [histogram[b] for b in sorted(histogram)]},
+                'Calls': len(provider_calls),
+                'Errors': sum(call['error'] is not None for call in provider_calls),
+                'PromptTokens': sum(call['prompt_tokens'] or 0 for call in provider_calls),
+                'ResponseTokens': sum(call['response_tokens'] or 0 for call in provider_calls)
+            }, {'LatencyMs': 'Milliseconds'})))
+        
+        outcomes = Counter((request['outcome'], request['fallback_reason'] or 'none') for request in requests)
+        for (outcome, reason), count in sorted(outcomes.items()):
+            self.emit(json.dumps(self._emf(timestamp, ['Outcome', 'FallbackReason'], {
+                'Outcome': outcome,
+                'FallbackReason': reason,
+                'Requests': count
+            })))
+        
+        return summary
+    
+    def _emf(self, timestamp, dimensions, values, units=None):
+        """EMF record publishing every numeric value as a metric"""
+        units = units or {}
+        metrics = [
+            {'Name': name, 'Unit': units.get(name, 'Count')}
+            for name in values if name not in dimensions
+        ]
+        return dict(values, _aws={
+            'Timestamp': timestamp,
+            'CloudWatchMetrics': [{
+                'Namespace': self.namespace,
+                'Dimensions': [dimensions],
+                'Metrics': metrics
+            }]
+        })
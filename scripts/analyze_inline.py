@@ -0,0 +1,61 @@
+"""Analyze a CSV synchronously by sending it inline to the Lambda function (no S3 upload)"""
+import base64
+import gzip
+import json
+import sys
+import time
+
+import boto3
+
+def load_deployment_info():
+    """Load deployment information"""
+    with open('deployment_info.json', 'r') as f:
+        return json.load(f)
+
+def build_inline_event(csv_path, persist=False, insights=False):
+    """Inline event with the CSV gzip-compressed and base64-encoded"""
+    with open(csv_path, 'rb') as f:
+        data = base64.b64encode(gzip.compress(f.read())).decode('ascii')
+    
+    return {
+        'inline': {
+            'format': 'csv',
+            'encoding': 'gzip+base64',
+            'data': data,
+            'persist': persist,
+            'insights': insights
+        }
+    }
+
+def analyze_inline(csv_path, persist=False, insights=False):
+    """Invoke the function with inline data and print the analytics it returns"""
+    deployment_info = load_deployment_info()
+    lambda_name = deployment_info['lambda_function_name']
+    
+    lambda_client = boto3.client('lambda', region_name='us-east-1')
+    event = build_inline_event(csv_path, persist, insights)
+    
+    print(f"Function: {lambda_name}")
+    print(f"File: {csv_path} ({len(event['inline']['data'])} bytes encoded)")
+    
+    start = time.time()
+    response = lambda_client.invoke(
+        FunctionName=lambda_name,
+        InvocationType='RequestResponse',
+        Payload=json.dumps(event)
+    )
+    payload = json.loads(response['Payload'].read())
+    elapsed = time.time() - start
+    
+    if 'errorMessage' in payload:
+        print(f"✗ Lambda execution failed: {payload['errorMessage']}")
+        return None
+    
+    body = json.loads(payload['body'])
+    print(f"Status: {payload['statusCode']} in {elapsed:.2f}s (server {body.get('processing_time_ms')} ms)")
+    print(json.dumps(body, indent=2))
+    return body
+
+if __name__ == '__main__':
+    csv_file = sys.argv[1] if len(sys.argv) > 1 else 'data/output/energy_data.csv'
+    analyze_inline(csv_file, persist='--persist' in sys.argv, insights='--insights' in sys.argv)
@@ -0,0 +1,88 @@
+"""Benchmark report rendering for fleet-sized runs"""
+import sys
+import os
+import time
+
+# Add parent and lambda directories to path
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+sys.path.append(os.path.join(ROOT_DIR, 'lambda'))
+
+import numpy as np
+
+from genai_insights import EnergyInsightsAssistant, VirtualEnergyAuditor
+from report_templates import build_report_model, render_report
+
+APPLIANCES = ['AC', 'Refrigerator', 'Heater', 'Washing Machine', 'TV', 'Lighting']
+
+def make_analytics_data(rng):
+    """Synthetic analytics payload shaped like prepare_analytics_data output"""
+    appliance_stats = [
+        {
+            'appliance': appliance,
+            'total_kwh': float(rng.uniform(10, 400)),
+            'avg_kwh': float(rng.uniform(0.01, 0.6)),
+            'peak_hour': int(rng.integers(0, 24))
+        }
+        for appliance in APPLIANCES
+    ]
+    predictions = [
+        {
+            'date': f"2026-02-{day:02d}",
+            'predicted_kwh': float(value),
+            'lower_bound': float(value * 0.8),
+            'upper_bound': float(value * 1.2)
+        }
+        for day, value in enumerate(rng.uniform(15, 35, 7), 1)
+    ]
+    
+    return {
+        'total_usage': sum(stat['total_kwh'] for stat in appliance_stats),
+        'anomaly_count': int(rng.integers(0, 20)),
+        'appliance_stats': appliance_stats,
+        'forecast_summary': {
+            'total_predicted_kwh': sum(p['predicted_kwh'] for p in predictions),
+            'avg_predicted_kwh': sum(p['predicted_kwh'] for p in predictions) / 7,
+            'start_date': predictions[0]['date'],
+            'end_date': predictions[-1]['date'],
+            'daily_predictions': predictions
+        }
+    }
+
+def run_benchmark(n_reports=10000, seed=42):
+    """Render n_reports full reports in each output format and print timings"""
+    rng = np.random.default_rng(seed)
+    payloads = [make_analytics_data(rng) for _ in range(n_reports)]
+    
+    assistant = EnergyInsightsAssistant()
+    auditor = VirtualEnergyAuditor()
+    
+    print("="*70)
+    print(f"REPORT RENDERING BENCHMARK ({n_reports:,} reports)")
+    print("="*70)
+    
+    start = time.perf_counter()
+    models = [
+        build_report_model(
+            data,
+            assistant._generate_rule_based(f"Household {i}: {data['total_usage']:.2f} kWh"),
+            auditor.audit(data['appliance_stats']),
+            '2026-02-01 00:00:00'
+        )
+        for i, data in enumerate(payloads)
+    ]
+    elapsed = time.perf_counter() - start
+    print(f"{'model+insights+audit':<22} {elapsed:8.3f}s  {elapsed / n_reports * 1e6:8.1f} us/report")
+    
+    for output_format in ('text', 'json', 'html'):
+        start = time.perf_counter()
+        total_bytes = sum(len(render_report(model, output_format)) for model in models)
+        elapsed = time.perf_counter() - start
+        print(
+            f"{output_format:<22} {elapsed:8.3f}s  {elapsed / n_reports * 1e6:8.1f} us/report  "
+            f"{total_bytes / n_reports / 1024:6.1f} KB/report"
+        )
+
+if __name__ == "__main__":
+    n_reports = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    run_benchmark(n_reports)
@@ -23,6 +23,14 @@ def load_deployment_info():
     with open(deployment_file, 'r') as f:
         return json.load(f)
 
+def find_latest_run(s3_client, bucket_name):
+    """Prefix of the most recent run; run ids start with their event time, so they sort by time"""
+    paginator = s3_client.get_paginator('list_objects_v2')
+    run_prefixes = []
+    for page in paginator.paginate(Bucket=bucket_name, Prefix='runs/', Delimiter='/'):
+        run_prefixes.extend(prefix['Prefix'] for prefix in page.get('CommonPrefixes', []))
+    return max(run_prefixes) if run_prefixes else None
+
 def check_results():
     """Check pipeline results in S3"""
     deployment_info = load_deployment_info()
@@ -38,6 +46,11 @@ def check_results():
     
     folders = ['raw/', 'processed/', 'forecast/', 'anomalies/', 'reports/']
     
+    # Default layout: every output of a run under runs/<run_id>/, linked by manifest.json
+    latest_run = find_latest_run(s3_client, bucket_name)
+    if latest_run:
+        folders.append(latest_run)
+    
     for folder in folders:
         print(f"{folder}")
         print("-"*70)
@@ -72,25 +85,26 @@ def check_results():
     print("-"*70)
     
     try:
-        response = s3_client.list_objects_v2(
-            Bucket=bucket_name,
-            Prefix='reports/',
-            MaxKeys=100
-        )
+        files = []
+        for prefix in ['reports/'] + ([latest_run] if latest_run else []):
+            response = s3_client.list_objects_v2(
+                Bucket=bucket_name,
+                Prefix=prefix,
+                MaxKeys=100
+            )
+            files.extend(
+                obj for obj in response.get('Contents', [])
+                if 'final_report' in obj['Key'] and not obj['Key'].endswith('/')
+            )
         
-        if 'Contents' in response:
-            files = [obj for obj in response['Contents'] if not obj['Key'].endswith('/')]
+        if files:
+            latest = sorted(files, key=lambda x: x['LastModified'], reverse=True)[0]
+            print(f"File: {latest['Key']}")
+            print()
             
-            if files:
-                latest = sorted(files, key=lambda x: x['LastModified'], reverse=True)[0]
-                print(f"File: {latest['Key']}")
-                print()
-                
-                response = s3_client.get_object(Bucket=bucket_name, Key=latest['Key'])
-                content = response['Body'].read().decode('utf-8')
-                print(content)
-            else:
-                print("No reports found yet")
+            response = s3_client.get_object(Bucket=bucket_name, Key=latest['Key'])
+            content = response['Body'].read().decode('utf-8')
+            print(content)
         else:
             print("No reports found yet")
     except Exception as e:
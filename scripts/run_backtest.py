@@ -0,0 +1,69 @@
+"""Run rolling-origin backtests of the forecast engines"""
+import sys
+import os
+
+# Add parent and lambda directories to path
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+sys.path.append(os.path.join(ROOT_DIR, 'lambda'))
+
+from processing import EnergyDataProcessor
+from backtesting import ForecastBacktester
+
+# Engines and settings compared by default
+ENGINES = {
+    'prophet_cps_0.01': {'engine': 'prophet', 'changepoint_prior_scale': 0.01},
+    'prophet_cps_0.05': {'engine': 'prophet', 'changepoint_prior_scale': 0.05},
+    'prophet_cps_0.5': {'engine': 'prophet', 'changepoint_prior_scale': 0.5},
+    'simple': {'engine': 'simple'},
+    'seasonal_naive': {'engine': 'seasonal_naive'},
+    'ets': {'engine': 'ets'},
+    'ensemble': {'engine': 'ensemble'}
+}
+
+def load_daily_series(file_path=None):
+    """Load a daily series from a raw CSV or freshly generated data"""
+    processor = EnergyDataProcessor()
+    
+    if file_path:
+        with open(file_path, 'r') as f:
+            csv_content = f.read()
+    else:
+        from data.generate_data import generate_energy_data
+        csv_content = generate_energy_data().to_csv(index=False)
+    
+    df = processor.parse_data(csv_content)
+    return processor.prepare_for_forecast(df)
+
+def run_backtest(file_path=None):
+    """Backtest all configured engines and print the summary"""
+    print("="*70)
+    print("FORECAST ENGINE BACKTEST")
+    print("="*70)
+    print()
+    
+    daily_df = load_daily_series(file_path)
+    print(f"Series: {len(daily_df)} days ({daily_df['ds'].min().date()} to {daily_df['ds'].max().date()})")
+    
+    backtester = ForecastBacktester(engines=ENGINES)
+    print(f"Cutoffs: {len(backtester.make_cutoffs(daily_df))} x engines: {len(ENGINES)}")
+    print()
+    
+    results_df = backtester.run(daily_df)
+    summary_df = backtester.summarize(results_df)
+    
+    print(summary_df.to_string(index=False, float_format=lambda x: f"{x:.2f}"))
+    print()
+    best = backtester.best_engine(summary_df)
+    if best:
+        print(f"✓ Best engine at {max(backtester.horizons)}-day horizon: {best}")
+    else:
+        print(f"⚠ No engine ran without falling back at the {max(backtester.horizons)}-day horizon")
+    print()
+    print("="*70)
+    
+    return summary_df
+
+if __name__ == '__main__':
+    file_path = sys.argv[1] if len(sys.argv) > 1 else None
+    run_backtest(file_path)
@@ -0,0 +1,70 @@
+"""Drain a local ingest queue (INGEST_QUEUE_DIR) in micro-batches, as the SQS event source mapping does"""
+import sys
+import os
+import json
+import time
+
+# Add parent and lambda directories to path
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+sys.path.append(os.path.join(ROOT_DIR, 'lambda'))
+
+from ingest_queue import LocalDirectoryIngestQueue, collect_batch, queue_event, s3_notification
+
+def enqueue_uploads(queue_dir, bucket, keys):
+    """Queue an S3 notification per key, standing in for the bucket notification"""
+    queue = LocalDirectoryIngestQueue(queue_dir)
+    for key in keys:
+        queue.send(s3_notification(bucket, key))
+    print(f"Queued {len(keys)} notification(s)")
+
+def run_consumer(queue_dir, max_messages=100, max_bytes=20 * 1024 * 1024, max_delay_seconds=30, follow=False):
+    """Process queued notifications one micro-batch per invocation; keeps polling when follow is set"""
+    # Imported late so BUCKET_NAME and friends are read from this process's environment
+    from lambda_function import lambda_handler
+    
+    queue = LocalDirectoryIngestQueue(queue_dir)
+    processed = 0
+    
+    while True:
+        messages = collect_batch(queue, max_messages, max_bytes, max_delay_seconds)
+        if not messages:
+            if not follow:
+                break
+            time.sleep(1)
+            continue
+        
+        start = time.time()
+        response = lambda_handler(queue_event(messages), None)
+        failed = {failure['itemIdentifier'] for failure in response['batchItemFailures']}
+        for message_id, _ in messages:
+            # Failed messages go back to the queue, like SQS after the visibility timeout
+            if message_id in failed:
+                queue.release(message_id)
+            else:
+                queue.delete(message_id)
+        
+        body = json.loads(response['body'])
+        print(f"{len(messages)} message(s): {body['message']}, {len(failed)} failed ({time.time() - start:.2f}s)")
+        processed += len(messages) - len(failed)
+        if failed and not follow:
+            break
+    
+    print(f"Processed {processed} message(s)")
+
+if __name__ == "__main__":
+    # --enqueue <bucket> <key>... queues notifications instead of consuming them
+    if len(sys.argv) > 1 and sys.argv[1] == '--enqueue':
+        enqueue_uploads(os.environ.get('INGEST_QUEUE_DIR', 'ingest_queue'), sys.argv[2], sys.argv[3:])
+        sys.exit(0)
+    
+    follow = '--follow' in sys.argv
+    args = [arg for arg in sys.argv[1:] if arg != '--follow']
+    queue_dir = args[0] if args else os.environ.get('INGEST_QUEUE_DIR', 'ingest_queue')
+    run_consumer(
+        queue_dir,
+        max_messages=int(os.environ.get('INGEST_BATCH_FILES', '100')),
+        max_bytes=int(os.environ.get('INGEST_BATCH_BYTES', str(20 * 1024 * 1024))),
+        max_delay_seconds=float(os.environ.get('INGEST_MAX_DELAY_SECONDS', '30')),
+        follow=follow
+    )
@@ -0,0 +1,59 @@
+"""Drain a local report job queue (REPORT_QUEUE_DIR) or continuation queue (CONTINUATION_QUEUE_DIR)"""
+import sys
+import os
+import json
+import time
+
+# Add parent and lambda directories to path
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+sys.path.append(os.path.join(ROOT_DIR, 'lambda'))
+
+from report_jobs import LocalDirectoryReportQueue
+
+# Lambda retries a failed asynchronous event twice by default
+MAX_RETRIES = 2
+
+def run_worker(queue_dir, poll_seconds=None, event_key='report_job'):
+    """Process queued jobs as '<event_key>' events; keeps polling when poll_seconds is given"""
+    # Imported late so REPORT_QUEUE_DIR and friends are read from this process's environment
+    from lambda_function import lambda_handler
+    
+    queue = LocalDirectoryReportQueue(queue_dir)
+    processed = 0
+    
+    while True:
+        job = queue.claim()
+        if job is None:
+            if poll_seconds is None:
+                break
+            time.sleep(poll_seconds)
+            continue
+        
+        start = time.time()
+        job_id = job.get('artifact_key') or job.get('run_id')
+        try:
+            response = lambda_handler({event_key: job}, None)
+        except Exception as e:
+            # Like Lambda's async retries: requeue a failed job up to MAX_RETRIES times
+            retries = job.get('worker_retries', 0)
+            if retries < MAX_RETRIES:
+                queue.enqueue(dict(job, worker_retries=retries + 1))
+            print(f"{job_id}: failed ({e}), {'requeued' if retries < MAX_RETRIES else 'dropped'}")
+            continue
+        body = json.loads(response['body'])
+        print(f"{job_id}: {response['statusCode']} {body['message']} ({time.time() - start:.2f}s)")
+        processed += 1
+    
+    print(f"Processed {processed} job(s)")
+
+if __name__ == "__main__":
+    # --continuations drains resumed pipeline runs instead of report jobs
+    continuations = '--continuations' in sys.argv
+    args = [arg for arg in sys.argv[1:] if arg != '--continuations']
+    if continuations:
+        queue_dir = args[0] if args else os.environ.get('CONTINUATION_QUEUE_DIR', 'continuations')
+    else:
+        queue_dir = args[0] if args else os.environ.get('REPORT_QUEUE_DIR', 'report_jobs')
+    poll = float(args[1]) if len(args) > 1 else None
+    run_worker(queue_dir, poll, 'continuation' if continuations else 'report_job')
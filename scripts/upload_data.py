@@ -24,8 +24,8 @@ def load_deployment_info():
     with open(deployment_file, 'r') as f:
         return json.load(f)
 
-def upload_to_s3(file_path):
-    """Upload data file to S3 raw folder"""
+def upload_to_s3(file_path, profile=None):
+    """Upload data file to S3 raw folder, optionally naming the pipeline profile to run"""
     if not os.path.exists(file_path):
         print(f"Error: File not found: {file_path}")
         sys.exit(1)
@@ -41,11 +41,14 @@ def upload_to_s3(file_path):
     
     print(f"Uploading {file_path} to s3://{bucket_name}/{s3_key}")
     
+    # The function reads the profile from x-amz-meta-pipeline-profile
+    extra_args = {'Metadata': {'pipeline-profile': profile}} if profile else {}
     with open(file_path, 'rb') as f:
         s3_client.put_object(
             Bucket=bucket_name,
             Key=s3_key,
-            Body=f
+            Body=f,
+            **extra_args
         )
     
     print(f"✓ Upload successful!")
@@ -57,13 +60,27 @@ def upload_to_s3(file_path):
     print("Check results:")
     print(f"  aws s3 ls s3://{bucket_name}/reports/")
 
+def print_usage():
+    """Command-line usage"""
+    print("Usage: python upload_data.py <path_to_csv_file> [--profile <name>]")
+    print()
+    print("Example:")
+    print("  python upload_data.py data/output/energy_data.csv")
+
 if __name__ == '__main__':
-    if len(sys.argv) < 2:
-        print("Usage: python upload_data.py <path_to_csv_file>")
-        print()
-        print("Example:")
-        print("  python upload_data.py data/output/energy_data.csv")
+    args = sys.argv[1:]
+    profile = None
+    if '--profile' in args:
+        index = args.index('--profile')
+        # The flag needs a value, and the value must not be another flag
+        if index + 1 >= len(args) or args[index + 1].startswith('--'):
+            print_usage()
+            sys.exit(1)
+        profile = args[index + 1]
+        del args[index:index + 2]
+    
+    if len(args) != 1:
+        print_usage()
         sys.exit(1)
     
-    file_path = sys.argv[1]
-    upload_to_s3(file_path)
+    upload_to_s3(args[0], profile)